@@ -5,9 +5,22 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import os
 import time
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-from realistic_patient_journey import run_realistic_simulation
+from realistic_patient_journey import SimulationRun
+from replications import (run_replications, run_sequential_replications, sequential_bounds, replication_kpis,
+                          VARIANCE_REDUCTION_MODES, DEFAULT_RQMC_RANDOMIZATIONS, DEFAULT_PRECISION_TARGETS)
+from background import BackgroundJob, COMPLETED, CANCELLED
+from flow_animation import compute_frame_states, frames_from_states, keyframe_times, DEFAULT_MAX_FRAMES
+from artifact_cache import ArtifactCache, results_fingerprint
+from result_cache import ResultCache, simulation_key
+from occupancy import occupancy_curves, utilization_series
+from sweep import run_staffing_sweep, heatmap_table, STAFFING_FACTORS
+from optimizer import optimize_staffing, DEFAULT_STAFF_COSTS, SLA_KPIS
+from queueing import estimate_clinic, is_hopeless, HOPELESS_UTILIZATION, NEAR_SATURATION_LOAD
+from metamodel import KPIMetamodel, RunHistory, run_settings, HISTORY_FILE
 
 # Configure page
 st.set_page_config(
@@ -176,6 +189,17 @@ def initialize_session_state():
         st.session_state.simulation_progress = 0
     if 'simulation_status' not in st.session_state:
         st.session_state.simulation_status = "Ready to run simulation"
+    if 'replication_results' not in st.session_state:
+        st.session_state.replication_results = None
+    if 'simulation_job' not in st.session_state:
+        st.session_state.simulation_job = None
+    if 'sweep_results' not in st.session_state:
+        st.session_state.sweep_results = None
+    if 'optimizer_results' not in st.session_state:
+        st.session_state.optimizer_results = None
+    if 'simulation_run' not in st.session_state:
+        # (resume_key, SimulationRun) of the latest run, for horizon extension
+        st.session_state.simulation_run = None
 
 def create_sidebar():
     st.sidebar.header("🏥 Simulation Settings")
@@ -205,12 +229,57 @@ def create_sidebar():
     st.sidebar.subheader("Simulation")
     duration = st.sidebar.slider("Duration (hours)", 1, 8, 2)
     random_seed = st.sidebar.number_input("Random Seed", 1, 1000, 42)
+    num_replications = st.sidebar.slider("Replications", 1, 200, 1)
+    sequential = st.sidebar.checkbox(
+        "Run until precision target",
+        help="Add replications in batches until mean wait, P90 total time and throughput "
+             "are within the target; the Replications slider is then the maximum "
+             "(raised to the few replications a confidence interval needs)"
+    )
+    precision_target = st.sidebar.slider("Target half-width (% of mean)", 1, 20, 5, disabled=not sequential)
+    # RQMC lattices have a fixed size, so they cannot grow batch by batch
+    modes = [mode for mode in VARIANCE_REDUCTION_MODES if not (sequential and mode == 'rqmc')]
+    variance_reduction = st.sidebar.selectbox(
+        "Variance reduction", [None, *modes], index=0,
+        format_func=lambda mode: VARIANCE_REDUCTION_LABELS[mode],
+        help="Applies to replication batches; antithetic pairs and RQMC lattices round the count up"
+    )
+    engine = st.sidebar.selectbox("Engine", ['simpy', 'heap'], index=0,
+                                  help="'heap' runs the same pathway on a faster event-heap engine")
+    skip_hopeless = st.sidebar.checkbox(
+        "Skip overloaded configurations", value=True,
+        help=f"When the queueing estimate puts the load at {HOPELESS_UTILIZATION:.0%} of capacity or more, "
+             "run a single simulation instead of replications and leave such cells out of sweeps"
+    )
     
     st.sidebar.markdown("---")
     
     # Run button
     run_sim = st.sidebar.button("🚀 Run Simulation")
     
+    # Staffing sweep: every combination in the ranges, same settings otherwise
+    with st.sidebar.expander("📊 Staffing Sweep"):
+        sweep_doctors = st.slider("Doctors range", 1, 8, (2, 5))
+        sweep_nurses = st.slider("Nurses range", 1, 6, (1, 4))
+        sweep_rooms = st.slider("Exam Rooms range", 1, 10, (3, 8))
+        sweep_registration = st.slider("Registration Staff range", 1, 4, (1, 2))
+        sweep_replications = st.slider("Replications per cell", 1, 20, 5)
+        run_sweep = st.button("📊 Run Sweep")
+    
+    # Staffing optimizer: searches the sweep ranges for the cheapest mix meeting a target
+    with st.sidebar.expander("🎯 Staffing Optimizer"):
+        st.caption("Searches the staffing ranges set under Staffing Sweep.")
+        sla_kpi = st.selectbox("Service-level KPI", SLA_KPIS, index=SLA_KPIS.index('p90_wait_time'),
+                               format_func=lambda kpi: KPI_LABELS[kpi])
+        sla_threshold = st.number_input("Target (minutes, at most)", 1.0, 240.0, 15.0, step=1.0)
+        st.caption("Cost per unit and hour")
+        staff_costs = {
+            factor: st.number_input(STAFFING_LABELS[factor], 0.0, 1000.0, DEFAULT_STAFF_COSTS[factor],
+                                    step=5.0, key=f"cost_{factor}")
+            for factor in STAFFING_FACTORS
+        }
+        run_optimizer = st.button("🎯 Find Cheapest Staffing")
+    
     return {
         'num_doctors': num_doctors,
         'num_rooms': num_rooms,
@@ -222,14 +291,31 @@ def create_sidebar():
         'arrival_rate': arrival_rate,
         'duration': duration * 60,  # Convert to minutes
         'random_seed': random_seed,
-        'run_simulation': run_sim
+        'num_replications': num_replications,
+        'variance_reduction': variance_reduction,
+        'sequential': sequential,
+        'precision_target': precision_target / 100,
+        'engine': engine,
+        'skip_hopeless': skip_hopeless,
+        'run_simulation': run_sim,
+        'sweep_grid': {
+            'NUM_DOCTORS': list(range(sweep_doctors[0], sweep_doctors[1] + 1)),
+            'NUM_NURSES': list(range(sweep_nurses[0], sweep_nurses[1] + 1)),
+            'NUM_EXAM_ROOMS': list(range(sweep_rooms[0], sweep_rooms[1] + 1)),
+            'NUM_REGISTRATION_STAFF': list(range(sweep_registration[0], sweep_registration[1] + 1))
+        },
+        'sweep_replications': sweep_replications,
+        'run_sweep': run_sweep,
+        'sla_kpi': sla_kpi,
+        'sla_threshold': sla_threshold,
+        'staff_costs': staff_costs,
+        'run_optimizer': run_optimizer
     }
 
 
-@st.cache_data
-def run_simulation_with_config(config):
-    # Create clinic configuration
-    clinic_config = {
+def build_clinic_config(config):
+    """Create clinic configuration from sidebar settings."""
+    return {
         'NUM_DOCTORS': config['num_doctors'],
         'NUM_NURSES': config['num_nurses'],
         'NUM_REGISTRATION_STAFF': config['num_registration'],
@@ -242,44 +328,398 @@ def run_simulation_with_config(config):
         'SIMULATION_TIME': config['duration'],
         'RANDOM_SEED': config['random_seed']
     }
-    
-    # Service times for realistic simulation (from user input)
-    service_time_config = {
+
+def build_service_time_config(config):
+    """Service times for realistic simulation (from user input)."""
+    return {
         'registration': {'mean': config['registration_time'], 'std': config['registration_time'] * 0.3},
         'nurse_visit': {'mean': config['nurse_time'], 'std': config['nurse_time'] * 0.25},
         'doctor_visit': {'mean': config['doctor_time'], 'std': config['doctor_time'] * 0.3}
     }
-    
-    # Run simulation
-    results = run_realistic_simulation(
-        clinic_config=clinic_config,
-        service_time_config=service_time_config,
-        simulation_duration=config['duration'],
-        arrival_rate=config['arrival_rate'],
-        random_seed=config['random_seed']
-    )
+
+# Seconds between progress refreshes while a background run is active
+PROGRESS_POLL_SECONDS = 0.25
+
+# Results kept in this process on top of the shared disk cache
+MEMORY_CACHE_ENTRIES = 16
+
+@st.cache_resource
+def get_result_cache():
+    """Disk cache shared with other app processes (see result_cache.py)."""
+    return ResultCache.from_environment()
+
+@st.cache_resource
+def get_metamodel():
+    """Process-wide KPI metamodel fed by the run history next to the disk cache."""
+    return KPIMetamodel(RunHistory(os.path.join(get_result_cache().directory, HISTORY_FILE)))
+
+def record_run_history(config, kpi_rows, staffing=None):
+    """Add finished runs to the shared history the metamodel learns from."""
+    clinic_config = {**build_clinic_config(config), **(staffing or {})}
+    settings = run_settings(clinic_config, build_service_time_config(config),
+                            config['arrival_rate'], config['duration'])
+    get_metamodel().history.append(settings, kpi_rows)
+
+def queueing_estimate(config):
+    """Analytic estimate for the sidebar settings (a millisecond or two, see queueing.py)."""
+    return estimate_clinic(build_clinic_config(config), build_service_time_config(config),
+                           config['arrival_rate'], config['duration'])
+
+def skip_replications(config):
+    """Whether to run only the single simulation: more runs of an overloaded clinic only confirm it."""
+    return config['skip_hopeless'] and is_hopeless(queueing_estimate(config))
+
+def resume_key(config):
+    """Settings a run can be extended under: everything except the duration."""
+    clinic_config = {key: value for key, value in build_clinic_config(config).items() if key != 'SIMULATION_TIME'}
+    return simulation_key(clinic_config, build_service_time_config(config), config['random_seed'],
+                          None, config['arrival_rate'], config['engine'])
+
+def new_simulation_run(config):
+    return SimulationRun(build_clinic_config(config), build_service_time_config(config),
+                         config['arrival_rate'], config['random_seed'], engine=config['engine'],
+                         expected_duration=config['duration'])
+
+@st.cache_data(show_spinner=False, max_entries=MEMORY_CACHE_ENTRIES)
+def run_simulation_with_config(config, _progress_callback=None, _cancel_event=None, _run=None):
+    """Run the single simulation for the sidebar settings.
+    
+    Results come from the shared disk cache when any app process has run
+    the same settings before. Otherwise ``_run`` (a SimulationRun for the
+    same settings at a shorter horizon, see resume_key) is advanced to the
+    new duration, so only the added time is simulated. The underscore
+    arguments are not part of the cache key; they also let a background job
+    follow and cancel the run.
+    """
+    clinic_config = build_clinic_config(config)
+    service_time_config = build_service_time_config(config)
+    key = simulation_key(clinic_config, service_time_config, config['random_seed'],
+                         config['duration'], config['arrival_rate'], config['engine'])
+    result_cache = get_result_cache()
+    results = result_cache.get(key)
+    if results is not None:
+        return results
+    
+    # Run (or extend) the simulation
+    run = _run if _run is not None else new_simulation_run(config)
+    run.advance(config['duration'], _progress_callback, _cancel_event)
+    results = run.results()
     
     # Add compatibility data
     results['log_dataframe'] = pd.DataFrame()  # Will be populated by logging
     results['resource_utilization_summary'] = pd.DataFrame()  # Will be populated by logging
-    results['kpi_summary'] = calculate_kpis_from_journey(results['patient_journey_summary'])
+    results['kpi_summary'] = calculate_kpis_from_journey(results['patient_journey_summary'],
+                                                         results['resource_statistics'],
+                                                         results['journey_stats'])
     results['num_doctors'] = config['num_doctors']
     results['num_nurses'] = config['num_nurses']
     results['num_rooms'] = config['num_rooms']
     results['num_registration'] = config['num_registration']
+    results['fingerprint'] = results_fingerprint(results)
     
+    result_cache.put(key, results)
+    record_run_history(config, [replication_kpis(results)])
     return results
 
-def calculate_kpis_from_journey(journey_df):
-    """Calculate KPIs from patient journey data."""
+@st.cache_resource
+def get_artifact_cache():
+    """Process-wide LRU cache of derived visualization artifacts."""
+    return ArtifactCache()
+
+VARIANCE_REDUCTION_LABELS = {
+    None: 'None',
+    'antithetic': 'Antithetic variates',
+    'control': 'Control variate (arrivals)',
+    'rqmc': 'Randomized quasi-Monte Carlo'
+}
+
+def replication_count(config):
+    """Replications to run, rounded up to whole antithetic pairs or RQMC lattices.
+    
+    A sequential run is also raised to the fewest replications it accepts.
+    """
+    n = config['num_replications']
+    if n <= 1:
+        return n
+    if config['sequential']:
+        step, minimum = sequential_bounds(config['variance_reduction'])
+        return max(-(-n // step) * step, minimum)
+    block = {'antithetic': 2, 'rqmc': DEFAULT_RQMC_RANDOMIZATIONS}.get(config['variance_reduction'], 1)
+    return -(-n // block) * block
+
+@st.cache_data(show_spinner=False, max_entries=MEMORY_CACHE_ENTRIES)
+def run_replications_with_config(config, _progress_callback=None, _cancel_event=None):
+    """Run a batch of replications for the sidebar settings."""
+    clinic_config = build_clinic_config(config)
+    service_time_config = build_service_time_config(config)
+    n_replications = replication_count(config)
+    key = simulation_key(clinic_config, service_time_config, config['random_seed'],
+                         config['duration'], config['arrival_rate'], config['engine'],
+                         kind='replications', n_replications=n_replications,
+                         variance_reduction=config['variance_reduction'],
+                         precision_target=config['precision_target'] if config['sequential'] else None)
+    result_cache = get_result_cache()
+    replication_results = result_cache.get(key)
+    if replication_results is not None:
+        return replication_results
+    
+    run_kwargs = dict(
+        clinic_config=clinic_config,
+        service_time_config=service_time_config,
+        simulation_duration=config['duration'],
+        arrival_rate=config['arrival_rate'],
+        random_seed=config['random_seed'],
+        engine=config['engine'],
+        progress_callback=_progress_callback,
+        cancel_event=_cancel_event,
+        variance_reduction=config['variance_reduction']
+    )
+    if config['sequential']:
+        replication_results = run_sequential_replications(
+            targets={name: config['precision_target'] for name in DEFAULT_PRECISION_TARGETS},
+            initial_replications=min(10, n_replications),
+            max_replications=n_replications,
+            **run_kwargs
+        )
+    else:
+        replication_results = run_replications(n_replications=n_replications, **run_kwargs)
+    result_cache.put(key, replication_results)
+    record_run_history(config, replication_results['replications'].to_dict('records'))
+    return replication_results
+
+@st.cache_data(show_spinner=False, max_entries=MEMORY_CACHE_ENTRIES)
+def run_sweep_with_config(config, _progress_callback=None, _cancel_event=None):
+    """Run the staffing sweep for the sidebar settings."""
+    clinic_config = build_clinic_config(config)
+    service_time_config = build_service_time_config(config)
+    # Swept factors replace the sidebar staffing, so it is not part of the key
+    base_config = {key: value for key, value in clinic_config.items()
+                   if key not in STAFFING_FACTORS and key != 'SIMULATION_TIME'}
+    key = simulation_key(base_config, service_time_config, config['random_seed'],
+                         config['duration'], config['arrival_rate'], config['engine'],
+                         kind='sweep', grid=config['sweep_grid'], n_replications=config['sweep_replications'],
+                         skip_hopeless=config['skip_hopeless'])
+    result_cache = get_result_cache()
+    sweep_results = result_cache.get(key)
+    if sweep_results is not None:
+        return sweep_results
+    
+    sweep_results = run_staffing_sweep(
+        grid=config['sweep_grid'],
+        n_replications=config['sweep_replications'],
+        clinic_config=clinic_config,
+        service_time_config=service_time_config,
+        simulation_duration=config['duration'],
+        arrival_rate=config['arrival_rate'],
+        random_seed=config['random_seed'],
+        engine=config['engine'],
+        progress_callback=_progress_callback,
+        cancel_event=_cancel_event,
+        skip_hopeless=config['skip_hopeless']
+    )
+    result_cache.put(key, sweep_results)
+    runs = sweep_results['runs']
+    factors = [factor for factor in STAFFING_FACTORS if factor in runs.columns]
+    for cell, group in runs.groupby(factors):
+        cell = cell if isinstance(cell, tuple) else (cell,)
+        record_run_history(config, group.to_dict('records'), dict(zip(factors, cell)))
+    return sweep_results
+
+@st.cache_data(show_spinner=False, max_entries=MEMORY_CACHE_ENTRIES)
+def run_optimizer_with_config(config, _progress_callback=None, _cancel_event=None):
+    """Find the cheapest staffing mix in the sweep ranges meeting the target."""
+    clinic_config = build_clinic_config(config)
+    service_time_config = build_service_time_config(config)
+    base_config = {key: value for key, value in clinic_config.items()
+                   if key not in STAFFING_FACTORS and key != 'SIMULATION_TIME'}
+    key = simulation_key(base_config, service_time_config, config['random_seed'],
+                         config['duration'], config['arrival_rate'], config['engine'],
+                         kind='optimizer', bounds=config['sweep_grid'], sla_kpi=config['sla_kpi'],
+                         sla_threshold=config['sla_threshold'], costs=config['staff_costs'])
+    result_cache = get_result_cache()
+    optimizer_results = result_cache.get(key)
+    if optimizer_results is not None:
+        return optimizer_results
+    
+    optimizer_results = optimize_staffing(
+        bounds=config['sweep_grid'],
+        sla_threshold=config['sla_threshold'],
+        sla_kpi=config['sla_kpi'],
+        costs=config['staff_costs'],
+        clinic_config=clinic_config,
+        service_time_config=service_time_config,
+        simulation_duration=config['duration'],
+        arrival_rate=config['arrival_rate'],
+        random_seed=config['random_seed'],
+        engine=config['engine'],
+        progress_callback=_progress_callback,
+        cancel_event=_cancel_event
+    )
+    result_cache.put(key, optimizer_results)
+    return optimizer_results
+
+def start_optimizer_job(config):
+    """Start the staffing optimizer on a background thread."""
+    def target(job):
+        job.report(0.0, "🔄 Searching for the cheapest staffing mix...")
+        optimizer_results = run_optimizer_with_config(
+            config,
+            _progress_callback=lambda done, total: job.report(
+                done / total, f"🔄 Optimizing... {done} / {total} staffing mixes settled"),
+            _cancel_event=job.cancel_event
+        )
+        return {'optimizer_results': optimizer_results}
+    
+    return _start_job(target, 'optimizer')
+
+def _start_job(target, name):
+    job = BackgroundJob(target, name=name)
+    # Lets the cached functions find this session's Streamlit runtime from the worker
+    add_script_run_ctx(job.thread, get_script_run_ctx())
+    return job.start()
+
+def start_sweep_job(config):
+    """Start the staffing sweep on a background thread."""
+    cells = int(np.prod([len(values) for values in config['sweep_grid'].values()]))
+    
+    def target(job):
+        job.report(0.0, f"🔄 Sweeping {cells} staffing combinations...")
+        sweep_results = run_sweep_with_config(
+            config,
+            _progress_callback=lambda done, total: job.report(
+                done / total, f"🔄 Sweep... {done} / {total} staffing combinations"),
+            _cancel_event=job.cancel_event
+        )
+        return {'sweep_results': sweep_results}
+    
+    return _start_job(target, 'sweep')
+
+def start_simulation_job(config, resume=True):
+    """Start the single run (and replications, if requested) on a background thread.
+    
+    With ``resume``, a run kept from earlier with the same settings and a
+    shorter (or equal) duration is extended instead of starting at time 0.
+    Pass False while a previous job may still be advancing that run.
+    """
+    key = resume_key(config)
+    saved = st.session_state.simulation_run
+    if resume and saved is not None and saved[0] == key and saved[1].now <= config['duration']:
+        run = saved[1]
+    else:
+        run = new_simulation_run(config)
+    # Keep the longest run for these settings (a shorter duration starts a new run)
+    if saved is None or saved[0] != key or saved[1].now <= config['duration']:
+        st.session_state.simulation_run = (key, run)
+    num_replications = replication_count(config)
+    if num_replications > 1 and skip_replications(config):
+        num_replications = 1
+    # Share of the progress bar for the single run; each replication costs about as much
+    share = 1.0 if num_replications <= 1 else 1.0 / (1 + num_replications)
+    
+    def target(job):
+        start = run.now
+        job.report(share * start / config['duration'],
+                   f"🔄 Extending simulation from {start:,.0f} min..." if start else "🔄 Running patient simulation...")
+        results = run_simulation_with_config(
+            config,
+            _progress_callback=lambda now, horizon: job.report(
+                share * now / horizon, f"🔄 Simulating... {now:,.0f} / {horizon:,.0f} min"),
+            _cancel_event=job.cancel_event,
+            _run=run
+        )
+        replication_results = None
+        if num_replications > 1:
+            job.report(share, f"🔄 Running {num_replications} replications...")
+            replication_results = run_replications_with_config(
+                config,
+                _progress_callback=lambda done, total: job.report(
+                    share + (1 - share) * done / total, f"🔄 Replications... {done} / {total} done"),
+                _cancel_event=job.cancel_event
+            )
+        return {'simulation_results': results, 'replication_results': replication_results}
+    
+    return _start_job(target, 'simulation')
+
+JOB_TITLES = {'simulation': 'Simulation', 'sweep': 'Sweep', 'optimizer': 'Optimization'}
+
+def finish_simulation_job(job):
+    """Publish a finished job's outcome to the session state."""
+    if job.state == COMPLETED:
+        for name, value in job.result.items():
+            st.session_state[name] = value
+        st.session_state.simulation_progress = 100
+        st.session_state.simulation_status = f"✅ {JOB_TITLES[job.name]} completed successfully! ({job.elapsed:.1f}s)"
+    elif job.state == CANCELLED:
+        # Keep showing the previous results
+        st.session_state.simulation_progress = 0
+        st.session_state.simulation_status = f"⏹️ {job.message}"
+    elif job.name != 'simulation':
+        st.session_state.simulation_progress = 0
+        st.session_state.simulation_status = f"❌ {JOB_TITLES[job.name]} failed: {str(job.error)}"
+    else:
+        st.session_state.simulation_progress = 0
+        st.session_state.simulation_status = f"❌ Simulation failed: {str(job.error)}"
+        st.session_state.simulation_results = None
+        st.session_state.replication_results = None
+
+@st.fragment(run_every=PROGRESS_POLL_SECONDS)
+def display_job_progress():
+    """Progress and a cancel button for the active run, refreshed on a timer.
+    
+    Only this fragment reruns while the job is active; once it finishes the
+    outcome is published and the whole page reruns to show it.
+    """
+    job = st.session_state.simulation_job
+    if job is None:
+        return
+    if job.running:
+        st.progress(job.progress)
+        col1, col2 = st.columns([5, 1])
+        col1.text(job.message)
+        if col2.button("Cancel", key='cancel_simulation', disabled=job.cancel_event.is_set()):
+            job.cancel()
+        return
+    finish_simulation_job(job)
+    st.session_state.simulation_job = None
+    st.rerun()
+
+def calculate_kpis_from_journey(journey_df, resource_statistics=None, journey_stats=None):
+    """Calculate KPIs from patient journey data.
+    
+    Utilization comes from the time-weighted resource statistics collected
+    during the run, when available. With the run's streaming
+    ``journey_stats`` the patient KPIs come from its accumulators, and
+    ``journey_df`` may be None.
+    """
+    resource_statistics = resource_statistics or {}
+    doctor_utilization = resource_statistics.get('doctors', {}).get('utilization', 0)
+    room_utilization = resource_statistics.get('exam_rooms', {}).get('utilization', 0)
+    
+    if journey_stats is not None:
+        summary = journey_stats.summary()
+        wait, total = summary['waiting_time'], summary['total_time']
+        served = total['count']
+        return {
+            'patients_served': served,
+            'avg_wait_time': wait['mean'] if served else 0,
+            'p90_wait_time': wait['p90'] if served else 0,
+            'avg_total_time': total['mean'] if served else 0,
+            'p90_total_time': total['p90'] if served else 0,
+            'service_completion_rate': 1.0 if served else 0,
+            'avg_doctor_utilization': doctor_utilization,
+            'avg_room_utilization': room_utilization,
+            'max_wait_time': wait['max'] if served else 0,
+            'patients_balked': 0
+        }
+    
     if journey_df.empty:
         return {
             'patients_served': 0,
             'avg_wait_time': 0,
             'avg_total_time': 0,
             'service_completion_rate': 0,
-            'avg_doctor_utilization': 0,
-            'avg_room_utilization': 0,
+            'avg_doctor_utilization': doctor_utilization,
+            'avg_room_utilization': room_utilization,
             'max_wait_time': 0,
             'patients_balked': 0
         }
@@ -291,12 +731,76 @@ def calculate_kpis_from_journey(journey_df):
         'avg_wait_time': completed['waiting_time'].mean() if not completed.empty else 0,
         'avg_total_time': completed['total_time'].mean() if not completed.empty else 0,
         'service_completion_rate': len(completed) / len(journey_df) if not journey_df.empty else 0,
-        'avg_doctor_utilization': 0.5,
-        'avg_room_utilization': 0.4,
+        'avg_doctor_utilization': doctor_utilization,
+        'avg_room_utilization': room_utilization,
         'max_wait_time': completed['waiting_time'].max() if not completed.empty else 0,
         'patients_balked': 0
     }
 
+# Stages of the queueing estimate
+STAGE_LABELS = {
+    'registration': 'Registration',
+    'nurses': 'Nurses',
+    'doctors': 'Doctors',
+    'exam_rooms': 'Exam Rooms'
+}
+
+def display_queueing_estimate(config):
+    """Analytic waits and utilizations for the sidebar settings, with an overload warning."""
+    estimate = queueing_estimate(config)
+    kpis = estimate['kpis']
+    
+    st.subheader("⚡ Queueing Estimate")
+    if not estimate['stable']:
+        st.warning(f"Overloaded: {STAGE_LABELS[estimate['bottleneck']]} at {estimate['load']:.0%} of capacity; "
+                   f"the queue grows by about {estimate['backlog_per_hour']:.1f} patients per hour.")
+        if config['num_replications'] > 1 and skip_replications(config):
+            st.caption("Replications are skipped for these settings; a single simulation is run.")
+    rough = estimate['load'] >= NEAR_SATURATION_LOAD
+    if rough and estimate['stable']:
+        st.info(f"Close to capacity: {STAGE_LABELS[estimate['bottleneck']]} at {estimate['load']:.0%}. "
+                "Waits are very sensitive to the load here; the wait estimates can be off by half.")
+    wait_help = "Rough close to capacity; run the simulation for waits" if rough else None
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Avg Wait Time", f"{'~' if rough else ''}{kpis['avg_wait_time']:.1f} min", help=wait_help)
+    col2.metric("Avg Total Time", f"{'~' if rough else ''}{kpis['avg_total_time']:.1f} min", help=wait_help)
+    col3.metric("Throughput", f"{kpis['throughput_per_hour']:.1f} /hr")
+    col4.metric("Doctor Utilization", f"{kpis['doctor_utilization']:.0%}")
+    col5.metric("Room Utilization", f"{kpis['room_utilization']:.0%}")
+    loads = " · ".join(f"{STAGE_LABELS[stage]} {values['utilization']:.0%}"
+                       for stage, values in estimate['stages'].items())
+    st.caption(f"Load (arrivals / capacity): {loads}. Erlang-C / Allen–Cunneen approximation for a "
+               f"{config['duration']:g}-minute run starting with the clinic empty.")
+
+# Metamodel preview metrics: KPI, label, format
+PREVIEW_METRICS = [
+    ('avg_wait_time', 'Avg Wait Time', '{:.1f} min'),
+    ('p90_wait_time', 'P90 Wait Time', '{:.1f} min'),
+    ('avg_total_time', 'Avg Total Time', '{:.1f} min'),
+    ('throughput_per_hour', 'Throughput', '{:.1f} /hr'),
+    ('doctor_utilization', 'Doctor Utilization', '{:.0%}')
+]
+
+def display_metamodel_preview(config):
+    """Instant KPI estimates for the sidebar settings from past runs."""
+    metamodel = get_metamodel()
+    metamodel.refresh()
+    settings = run_settings(build_clinic_config(config), build_service_time_config(config),
+                            config['arrival_rate'], config['duration'])
+    prediction = metamodel.predict(settings)
+    if prediction is None:
+        return
+    
+    st.subheader("🔮 Instant Preview")
+    columns = st.columns(len(PREVIEW_METRICS))
+    for column, (kpi, label, fmt) in zip(columns, PREVIEW_METRICS):
+        estimate = prediction[kpi]
+        with column:
+            st.metric(label, fmt.format(estimate['mean']))
+            st.caption(f"90% band: {fmt.format(estimate['lower'])} – {fmt.format(estimate['upper'])}")
+    st.caption(f"Estimated from {metamodel.count} past runs across all sessions; "
+               "run the simulation to confirm.")
+
 def display_main_results(results):
     if results is None:
         st.title("🏥 Clinic Simulation Tool")
@@ -323,10 +827,12 @@ def display_main_results(results):
         st.metric("Patients Served", f"{kpis.get('patients_served', 0)}")
     
     with col2:
-        st.metric("Avg Wait Time", f"{kpis.get('avg_wait_time', 0):.1f} min")
+        st.metric("Avg Wait Time", f"{kpis.get('avg_wait_time', 0):.1f} min",
+                  help=f"90th percentile: {kpis.get('p90_wait_time', 0):.1f} min")
     
     with col3:
-        st.metric("Avg Total Time", f"{kpis.get('avg_total_time', 0):.1f} min")
+        st.metric("Avg Total Time", f"{kpis.get('avg_total_time', 0):.1f} min",
+                  help=f"90th percentile: {kpis.get('p90_total_time', 0):.1f} min")
     
     with col4:
         st.metric("Service Rate", f"{kpis.get('service_completion_rate', 0):.1%}")
@@ -347,6 +853,148 @@ def display_main_results(results):
         st.metric("Patients Left", f"{kpis.get('patients_balked', 0)}")
 
 
+# Display names of the replication KPIs
+KPI_LABELS = {
+    'patients_served': 'Patients Served',
+    'avg_wait_time': 'Avg Wait Time (min)',
+    'p90_wait_time': 'P90 Wait Time (min)',
+    'max_wait_time': 'Max Wait Time (min)',
+    'avg_total_time': 'Avg Total Time (min)',
+    'p90_total_time': 'P90 Total Time (min)',
+    'throughput_per_hour': 'Throughput (patients/hr)',
+    'doctor_utilization': 'Doctor Utilization',
+    'room_utilization': 'Room Utilization'
+}
+
+# Labels for the staffing factors in sweep charts
+STAFFING_LABELS = {
+    'NUM_DOCTORS': 'Doctors',
+    'NUM_NURSES': 'Nurses',
+    'NUM_EXAM_ROOMS': 'Exam Rooms',
+    'NUM_REGISTRATION_STAFF': 'Registration Staff'
+}
+
+def display_sweep_results(sweep_results):
+    """Heatmaps of wait time and throughput over two staffing factors."""
+    if sweep_results is None:
+        return
+    
+    summary = sweep_results['summary']
+    grid = sweep_results['grid']
+    st.subheader(f"📊 Staffing Sweep ({len(summary)} combinations × {sweep_results['n_replications']} replications)")
+    
+    factors = [factor for factor in STAFFING_FACTORS if len(grid.get(factor, [])) > 1] or list(grid)
+    col1, col2 = st.columns(2)
+    x = col1.selectbox("Columns", factors, index=0, format_func=STAFFING_LABELS.get, key='sweep_x')
+    y_options = [factor for factor in factors if factor != x] or [x]
+    y = col2.selectbox("Rows", y_options, index=0, format_func=STAFFING_LABELS.get, key='sweep_y')
+    
+    # Hold the remaining factors at a chosen value
+    others = [factor for factor in grid if factor not in (x, y)]
+    fixed = {}
+    if others:
+        columns = st.columns(len(others))
+        for column, factor in zip(columns, others):
+            values = grid[factor]
+            fixed[factor] = column.selectbox(STAFFING_LABELS[factor], values, index=len(values) // 2,
+                                             key=f"sweep_fixed_{factor}")
+    
+    charts = [
+        ('avg_wait_time', 'Avg Wait Time (min)', 'RdYlGn_r'),
+        ('throughput_per_hour', 'Throughput (patients/hr)', 'RdYlGn')
+    ]
+    skipped = sweep_results.get('skipped', [])
+    if skipped:
+        st.caption(f"{len(skipped)} overloaded combinations were not simulated (blank cells).")
+    for column, (kpi, label, scale) in zip(st.columns(len(charts)), charts):
+        # Keep rows and columns whose cells were all skipped
+        table = heatmap_table(summary, kpi, x, y, fixed).reindex(index=grid[y][::-1], columns=grid[x])
+        fig = px.imshow(table, text_auto='.1f', aspect='auto', color_continuous_scale=scale,
+                        labels={'x': STAFFING_LABELS[x], 'y': STAFFING_LABELS[y], 'color': label})
+        axis_style = get_axis_style()
+        fig.update_layout(
+            **get_chart_theme(),
+            height=400,
+            title={'text': label, 'font': {'color': '#000000'}},
+            xaxis={**axis_style, 'title': {'text': STAFFING_LABELS[x], 'font': {'color': '#000000'}}, 'dtick': 1},
+            yaxis={**axis_style, 'title': {'text': STAFFING_LABELS[y], 'font': {'color': '#000000'}}, 'dtick': 1}
+        )
+        column.plotly_chart(fig, use_container_width=True, theme="streamlit")
+
+def display_optimizer_results(optimizer_results):
+    """Cheapest staffing mix found and the mixes simulated on the way."""
+    if optimizer_results is None:
+        return
+    
+    kpi_label = KPI_LABELS[optimizer_results['sla_kpi']]
+    threshold = optimizer_results['sla_threshold']
+    st.subheader(f"🎯 Cheapest Staffing with {kpi_label} ≤ {threshold:g}")
+    
+    best = optimizer_results['best']
+    if best is None:
+        st.warning("No staffing mix in the searched ranges meets the target; widen the ranges or relax the target.")
+    else:
+        columns = st.columns(len(best['mix']) + 1)
+        for column, (factor, count) in zip(columns, best['mix'].items()):
+            column.metric(STAFFING_LABELS[factor], count)
+        columns[-1].metric("Cost per hour", f"{best['cost']:,.0f}")
+        kpi = best['kpis'][optimizer_results['sla_kpi']]
+        note = " (marginal: the interval still straddles the target)" if best['marginal'] else ""
+        st.caption(f"{kpi_label}: {kpi['mean']:.1f} ± {kpi['half_width']:.1f} over "
+                   f"{best['replications']} replications{note}")
+    
+    st.caption(f"Simulated {optimizer_results['simulated']} of {optimizer_results['candidates']} mixes "
+               f"({optimizer_results['replications_run']:,} runs). Bisection bounds ruled out "
+               f"{optimizer_results['pruned_by_bounds']}, dominance by infeasible mixes "
+               f"{optimizer_results['pruned_by_dominance']}; the rest cost more than the best mix.")
+    evaluations = optimizer_results['evaluations']
+    if len(evaluations):
+        with st.expander("Evaluated mixes"):
+            table = evaluations.rename(columns={**STAFFING_LABELS, 'cost': 'Cost', 'stage': 'Stage',
+                                                'replications': 'Runs', 'kpi_mean': kpi_label,
+                                                'kpi_half_width': '± Half-width', 'status': 'Status',
+                                                'marginal': 'Marginal'})
+            st.dataframe(table, use_container_width=True, hide_index=True)
+
+def display_replication_summary(replication_results):
+    """Show KPI confidence intervals across replications."""
+    if replication_results is None:
+        return
+    
+    n = replication_results['n_replications']
+    confidence = replication_results['confidence']
+    st.subheader(f"📈 Across {n} Replications ({confidence:.0%} confidence intervals)")
+    
+    summary = replication_results['summary']
+    table = pd.DataFrame({
+        'Mean': summary['mean'],
+        '± Half-width': summary['half_width'],
+        'CI Lower': summary['ci_lower'],
+        'CI Upper': summary['ci_upper']
+    })
+    mode = replication_results.get('variance_reduction')
+    if mode is not None:
+        table['Variance Reduction (×)'] = summary['variance_reduction']
+    st.dataframe(table.rename(index=KPI_LABELS).style.format('{:.2f}'), use_container_width=True)
+    if mode is not None:
+        st.caption(f"{VARIANCE_REDUCTION_LABELS[mode]}: variance reduction is the estimated variance of a "
+                   f"plain Monte Carlo mean over the same {n} runs divided by that of this estimate.")
+    
+    if 'converged' in replication_results:
+        target = max(replication_results['targets'].values())
+        if replication_results['converged']:
+            st.caption(f"✅ Stopped after {n} replications: mean wait, P90 total time and throughput "
+                       f"are within ±{target:.0%} of their means.")
+        else:
+            st.caption(f"⚠️ Precision target ±{target:.0%} not reached within {n} replications; "
+                       f"raise the Replications maximum or relax the target.")
+    
+    pooled = replication_results['pooled_stats'].summary()['total_time']
+    if pooled['count']:
+        st.caption(f"Total time over all {pooled['count']:,} patients: "
+                   f"p50 {pooled['p50']:.1f}, p90 {pooled['p90']:.1f}, p99 {pooled['p99']:.1f} min")
+
+
 def get_chart_theme():
     """Return consistent chart theme for all plots with transparent backgrounds"""
     return {
@@ -372,504 +1020,105 @@ def get_axis_style():
         'zerolinecolor': '#000000'
     }
 
-def get_room_position(room_id):
-    """Get the x, y position for a room based on its ID in 2-column layout"""
-    if room_id < 5:
-        # First column (left side)
-        room_x = 3.5
-        room_y = 3.5 - room_id * 0.7
+def create_animation_frames(journey_df, max_time, num_rooms=5, num_doctors=3, num_nurses=2,
+                            adaptive=True, max_frames=DEFAULT_MAX_FRAMES):
+    """Create animation frames data for Plotly built-in animation
+    
+    With ``adaptive`` (the default) frames are keyframes where the clinic
+    state changes, on a time step that coarsens for long horizons, and at
+    most ``max_frames`` of them; otherwise there is one frame per minute.
+    Patient time-in-system labels only update at keyframes.
+    """
+    if adaptive:
+        time_points = keyframe_times(journey_df, max_time, max_frames)
     else:
-        # Second column (right side)
-        room_x = 4.5
-        room_y = 3.5 - (room_id - 5) * 0.7
-    return room_x, room_y
+        time_points = np.arange(0, max_time + 1, 1)
+    states = compute_frame_states(journey_df, time_points, num_rooms)
+    return frames_from_states(states, num_doctors, num_nurses)
 
-def create_animation_frames(journey_df, max_time, num_rooms=5, num_doctors=3, num_nurses=2):
-    """Create animation frames data for Plotly built-in animation"""
-    import numpy as np
-    
-    # Create time points (every minute)
-    time_points = np.arange(0, max_time + 1, 1)
-    
-    # Define station positions dynamically based on number of rooms
-    stations = {
-        'Unregistered Waiting': (1.5, 2),
-        'Registered Waiting': (2.5, 2),
-        'Discharged': (6, 2)
-    }
-    
-    # Add exam rooms dynamically
-    for i in range(num_rooms):
-        room_y = 3 - i * 0.8  # Spread rooms vertically
-        stations[f'Exam Room {i+1}'] = (4, room_y)
-    
-    animation_frames = []
-    
-    for time_point in time_points:
-        frame_data = {
-            'time': time_point,
-            'patients': [],
-            'staff': [],
-            'annotations': []  # Add annotations for dynamic text
+def _frame_trace_data(frame_data):
+    """Compact per-trace arrays for one frame: patients, nurses, doctors, waiting counts"""
+    patients = frame_data['patients']
+    doctors = [s for s in frame_data['staff'] if 'Doctor' in s['staff_type']]
+    nurses = [s for s in frame_data['staff'] if 'Doctor' not in s['staff_type']]
+    counts = frame_data['waiting_counts']
+    
+    def markers(items, text_key, hover_key):
+        return {
+            'x': np.array([item['x'] for item in items], dtype=np.float32),
+            'y': np.array([item['y'] for item in items], dtype=np.float32),
+            'text': [item[text_key] for item in items] if text_key else None,
+            'hovertext': [item[hover_key] for item in items]
         }
-        
-        # Get patients active at this time
-        current_patients = journey_df[
-            (journey_df['arrival_time'] <= time_point) & 
-            ((journey_df['departure_time'] > time_point) | (journey_df['departure_time'].isna()))
-        ]
-        
-        # Patient colors (consistent across time)
-        patient_colors = ['red', 'blue', 'green', 'orange', 'purple', 'brown', 'pink', 'gray', 'yellow', 'cyan']
-        
-        # Count patients in different waiting states
-        unregistered_patients = current_patients[
-            (pd.isna(current_patients['registration_start']) | (current_patients['registration_start'] > time_point)) &
-            (pd.isna(current_patients['departure_time']) | (current_patients['departure_time'] > time_point))
-        ]
-        
-        registered_waiting_patients = current_patients[
-            (~pd.isna(current_patients['registration_end']) & (current_patients['registration_end'] <= time_point)) &
-            (pd.isna(current_patients['exam_room_assigned']) | (current_patients['exam_room_assigned'] > time_point)) &
-            (pd.isna(current_patients['departure_time']) | (current_patients['departure_time'] > time_point))
-        ]
-        
-        unregistered_count = len(unregistered_patients)
-        registered_waiting_count = len(registered_waiting_patients)
-        
-        # Add unregistered waiting count annotation
-        frame_data['annotations'].append({
-            'x': 1.5, 'y': 2.35,
-            'text': f'Unregistered: {unregistered_count}',
-            'showarrow': False,
-            'font': {'color': 'darkred', 'size': 12, 'weight': 'bold'},
-            'bgcolor': 'rgba(255,255,255,0.8)',
-            'bordercolor': 'darkred',
-            'borderwidth': 1
-        })
-        
-        # Add registered waiting count annotation
-        frame_data['annotations'].append({
-            'x': 2.5, 'y': 2.35,
-            'text': f'Registered: {registered_waiting_count}',
-            'showarrow': False,
-            'font': {'color': 'darkgreen', 'size': 12, 'weight': 'bold'},
-            'bgcolor': 'rgba(255,255,255,0.8)',
-            'bordercolor': 'darkgreen',
-            'borderwidth': 1
-        })
-        
-        # Track room occupancy to prevent overlaps
-        room_occupancy = {i: None for i in range(num_rooms)}
-        
-        # Categorize patients by state
-        for idx, patient in current_patients.iterrows():
-            color = patient_colors[idx % len(patient_colors)]
-            patient_id = patient['patient_id']
-            
-            # Determine patient location at current time
-            if pd.isna(patient['departure_time']) or patient['departure_time'] > time_point:
-                if pd.isna(patient['exam_room_assigned']) or patient['exam_room_assigned'] > time_point:
-                    # Determine if patient is registered or unregistered
-                    is_registered = (~pd.isna(patient['registration_end']) and patient['registration_end'] <= time_point)
-                    
-                    if is_registered:
-                        # Patient in registered waiting area (right side)
-                        registered_idx = len([p for p in frame_data['patients'] if p.get('location') == 'Registered Waiting'])
-                        row = registered_idx // 3  # 3 patients per row
-                        col = registered_idx % 3
-                        offset_x = -0.2 + col * 0.13  # Spread horizontally
-                        offset_y = 0.15 - row * 0.1   # Stack vertically
-                        
-                        base_x = 2.5  # Right side of waiting room
-                        location = 'Registered Waiting'
-                        label_color = 'darkgreen'
-                    else:
-                        # Patient in unregistered waiting area (left side)
-                        unregistered_idx = len([p for p in frame_data['patients'] if p.get('location') == 'Unregistered Waiting'])
-                        row = unregistered_idx // 3  # 3 patients per row
-                        col = unregistered_idx % 3
-                        offset_x = -0.2 + col * 0.13  # Spread horizontally
-                        offset_y = 0.15 - row * 0.1   # Stack vertically
-                        
-                        base_x = 1.5  # Left side of waiting room
-                        location = 'Unregistered Waiting'
-                        label_color = 'darkred'
-                    
-                    # Add patient total time in system label
-                    total_time_in_system = time_point - patient['arrival_time']
-                    
-                    frame_data['patients'].append({
-                        'patient_id': patient_id,
-                        'x': base_x + offset_x,
-                        'y': 2 + offset_y,
-                        'color': color,
-                        'location': location,
-                        'size': 10
-                    })
-                    
-                    # Add total time label for patient
-                    frame_data['annotations'].append({
-                        'x': base_x + offset_x, 'y': 2 + offset_y - 0.15,
-                        'text': f'{total_time_in_system:.0f}m',
-                        'showarrow': False,
-                        'font': {'color': 'darkgreen', 'size': 9, 'weight': 'bold'},  # Always green for patients
-                        'bgcolor': 'rgba(255,255,255,0.8)',
-                        'bordercolor': 'darkgreen',
-                        'borderwidth': 1
-                    })
-                else:
-                    # Patient in exam room - position on top of exam room area
-                    room_id = patient.get('room_id', 0)
-                    if room_id < num_rooms and room_occupancy.get(room_id) is None:
-                        room_occupancy[room_id] = patient_id  # Mark room as occupied
-                        x, y = get_room_position(room_id)  # Use 2-column layout positioning
-                        
-                        # Calculate time in room
-                        room_entry_time = patient.get('exam_room_assigned', time_point)
-                        time_in_room = max(0, time_point - room_entry_time)
-                        
-                        frame_data['patients'].append({
-                            'patient_id': patient_id,
-                            'x': x,
-                            'y': y + 0.1,  # Positioned on top of room area
-                            'color': color,
-                            'location': f'Exam Room {room_id}',
-                            'size': 12  # Increased size for better visibility
-                        })
-                        
-                        # Add patient total time in system label
-                        total_time_in_system = time_point - patient['arrival_time']
-                        frame_data['annotations'].append({
-                            'x': x, 'y': y - 0.25,
-                            'text': f'{total_time_in_system:.0f}m',
-                            'showarrow': False,
-                            'font': {'color': 'darkgreen', 'size': 10, 'weight': 'bold'},
-                            'bgcolor': 'rgba(255,255,255,0.8)',
-                            'bordercolor': 'darkgreen',
-                            'borderwidth': 1
-                        })
-        
-        # Add mobile staff
-        # Registration nurse
-        active_registrations = current_patients[
-            (current_patients['registration_start'] <= time_point) & 
-            (current_patients['registration_end'] > time_point)
-        ]
-        
-        if not active_registrations.empty:
-            frame_data['staff'].append({
-                'staff_type': 'Registration Nurse',
-                'x': 1.5,
-                'y': 2.2,  # Positioned on top of unregistered waiting area
-                'color': 'purple',  # Always purple
-                'symbol': 'diamond',  # Consistent shape with other nurses
-                'size': 12  # Consistent size
-            })
-        
-        # Track staff to prevent overlap and simultaneous service
-        staff_positions = {}
-        
-        # Nurses in exam rooms
-        active_nurse_visits = current_patients[
-            (current_patients['nurse_visit_start'] <= time_point) & 
-            (current_patients['nurse_visit_end'] > time_point)
-        ]
-        
-        for idx, patient in active_nurse_visits.iterrows():
-            room_id = patient.get('room_id', 0)
-            if room_id < num_rooms and f'room_{room_id}' not in staff_positions:
-                staff_positions[f'room_{room_id}'] = 'nurse'
-                x, y = get_room_position(room_id)  # Use 2-column layout positioning
-                frame_data['staff'].append({
-                    'staff_type': f'Nurse (Room {room_id})',
-                    'x': x - 0.15,  # Positioned on left side of room
-                    'y': y + 0.05,  # Positioned on top of room area
-                    'color': 'purple',  # Always purple for nurses
-                    'symbol': 'diamond',
-                    'size': 14  # Increased size for better visibility
-                })
-        
-        # Doctors in exam rooms (only if nurse is not currently serving)
-        active_doctor_visits = current_patients[
-            (current_patients['doctor_visit_start'] <= time_point) & 
-            (current_patients['doctor_visit_end'] > time_point)
-        ]
-        
-        for idx, patient in active_doctor_visits.iterrows():
-            room_id = patient.get('room_id', 0)
-            # Only allow doctor if no nurse is currently serving in the room
-            if (room_id < num_rooms and 
-                f'room_{room_id}' not in staff_positions):
-                staff_positions[f'room_{room_id}'] = 'doctor'
-                x, y = get_room_position(room_id)  # Use 2-column layout positioning
-                frame_data['staff'].append({
-                    'staff_type': f'Doctor (Room {room_id})',
-                    'x': x + 0.15,  # Positioned on right side of room
-                    'y': y + 0.05,  # Positioned on top of room area
-                    'color': 'blue',  # Always blue for doctors
-                    'symbol': 'triangle-up',
-                    'size': 14  # Increased size for better visibility
-                })
-        
-        # Add unused staff display by discharge area
-        add_unused_staff_display(frame_data, current_patients, time_point, num_rooms, num_doctors, num_nurses)
-        
-        animation_frames.append(frame_data)
     
-    return animation_frames
-
-def add_unused_staff_display(frame_data, current_patients, time_point, num_rooms, num_doctors=3, num_nurses=2):
-    """Add unused staff display by discharge area"""
-    # Use actual configuration
-    total_doctors = num_doctors
-    total_nurses = num_nurses
-    
-    # Count active staff
-    active_doctors = len(current_patients[
-        (current_patients['doctor_visit_start'] <= time_point) & 
-        (current_patients['doctor_visit_end'] > time_point)
-    ])
-    
-    active_nurses = len(current_patients[
-        (current_patients['nurse_visit_start'] <= time_point) & 
-        (current_patients['nurse_visit_end'] > time_point)
-    ])
-    
-    # Calculate unused staff
-    unused_doctors = total_doctors - active_doctors
-    unused_nurses = total_nurses - active_nurses
-    
-    # Position unused staff by discharge area in rows
-    discharge_x = 6.5
-    discharge_y = 2
-    
-    # Display unused doctors
-    for i in range(unused_doctors):
-        row = i // 3  # 3 per row
-        col = i % 3
-        frame_data['staff'].append({
-            'staff_type': f'Available Doctor {i+1}',
-            'x': discharge_x + col * 0.2,
-            'y': discharge_y + 0.4 + row * 0.2,
-            'color': 'blue',  # Always blue
-            'symbol': 'triangle-up',
-            'size': 12  # Consistent size
-        })
-    
-    # Display unused nurses
-    for i in range(unused_nurses):
-        row = i // 3  # 3 per row
-        col = i % 3
-        frame_data['staff'].append({
-            'staff_type': f'Available Nurse {i+1}',
-            'x': discharge_x + col * 0.2,
-            'y': discharge_y - 0.4 - row * 0.2,
-            'color': 'purple',  # Always purple
-            'symbol': 'diamond',
-            'size': 12  # Consistent size
-        })
+    return [
+        markers(patients, 'label', 'patient_id'),
+        markers(nurses, None, 'staff_type'),
+        markers(doctors, None, 'staff_type'),
+        {'text': [f"Unregistered: {counts['unregistered']}", f"Registered: {counts['registered']}"]}
+    ]
 
 def create_animated_figure(animation_data, max_time, num_rooms=3):
-    """Create Plotly figure with built-in animation"""
-    
-    # Prepare data for Plotly animation
-    all_patients = []
-    all_staff = []
+    """Create Plotly figure with built-in animation
     
-    for frame_data in animation_data:
-        time_point = frame_data['time']
-        
-        # Add patients for this frame
-        for patient in frame_data['patients']:
-            all_patients.append({
-                'time': time_point,
-                'patient_id': patient['patient_id'],
-                'x': patient['x'],
-                'y': patient['y'],
-                'color': patient['color'],
-                'location': patient['location'],
-                'size': patient['size'],
-                'type': 'patient'
-            })
-        
-        # Add staff for this frame
-        for staff in frame_data['staff']:
-            all_staff.append({
-                'time': time_point,
-                'staff_id': staff['staff_type'],
-                'x': staff['x'],
-                'y': staff['y'],
-                'color': staff['color'],
-                'symbol': staff['symbol'],
-                'size': staff['size'],
-                'type': 'staff'
-            })
-    
-    # Convert to DataFrame for Plotly
-    import pandas as pd
-    df_patients = pd.DataFrame(all_patients)
-    df_staff = pd.DataFrame(all_staff)
-    
-    # Create the figure
+    Patients, nurses, doctors and the waiting-area counts are one trace each;
+    frames only carry the arrays that change, so the figure size depends on
+    the number of frames and markers on screen, not on how many patients or
+    staff ids the run produced.
+    """
     fig = go.Figure()
     
     # Add static elements (stations and arrows)
     add_static_elements(fig, num_rooms)
     
-    # Add animated patients
-    if not df_patients.empty:
-        # Group by patient for consistent colors
-        for patient_id in df_patients['patient_id'].unique():
-            patient_data = df_patients[df_patients['patient_id'] == patient_id]
-            
-            fig.add_trace(go.Scatter(
-                x=patient_data['x'],
-                y=patient_data['y'],
-                mode='markers',
-                marker=dict(
-                    size=12,  # Consistent size
-                    color='green',  # Always green
-                    symbol='circle',  # Consistent shape
-                    line=dict(color='black', width=1)  # Add border for better visibility
-                ),
-                name=patient_id,
-                showlegend=False,
-                text=patient_id,
-                hoverinfo='text'
-            ))
-    
-    # Add animated staff
-    if not df_staff.empty:
-        # Group by staff type for consistent styling
-        for staff_id in df_staff['staff_id'].unique():
-            staff_data = df_staff[df_staff['staff_id'] == staff_id]
-            
-            # Staff styling
-            if 'Doctor' in staff_id:
-                color = 'blue'
-                symbol = 'triangle-up'
-            elif 'Nurse' in staff_id:
-                color = 'purple'
-                symbol = 'diamond'
-            else:
-                color = staff_data['color'].iloc[0]
-                symbol = staff_data['symbol'].iloc[0]
-            
-            fig.add_trace(go.Scatter(
-                x=staff_data['x'],
-                y=staff_data['y'],
-                mode='markers',
-                marker=dict(
-                    size=12,  # Consistent size
-                    color=color,
-                    symbol=symbol,
-                    line=dict(color='black', width=1)  # Add border for better visibility
-                ),
-                name=staff_id,
-                showlegend=False,
-                text=staff_id,
-                hoverinfo='text'
-            ))
-    
-    # Create animation frames
-    frames = []
-    for i, frame_data in enumerate(animation_data):
-        frame_traces = []
-        
-        # Patient traces for this frame
-        if not df_patients.empty:
-            for patient_id in df_patients['patient_id'].unique():
-                patient_frame_data = df_patients[
-                    (df_patients['patient_id'] == patient_id) & 
-                    (df_patients['time'] == frame_data['time'])
-                ]
-                
-                if not patient_frame_data.empty:
-                    frame_traces.append(go.Scatter(
-                        x=patient_frame_data['x'],
-                        y=patient_frame_data['y'],
-                        mode='markers',
-                        marker=dict(
-                            size=12,  # Consistent size
-                            color='green',  # Always green
-                            symbol='circle',  # Consistent shape
-                            line=dict(color='black', width=1)  # Add border for better visibility
-                        ),
-                        name=patient_id,
-                        showlegend=False,
-                        text=patient_id,
-                        hoverinfo='text'
-                    ))
-                else:
-                    # Empty trace
-                    frame_traces.append(go.Scatter(
-                        x=[],
-                        y=[],
-                        mode='markers',
-                        name=patient_id,
-                        showlegend=False
-                    ))
-        
-        # Staff traces for this frame
-        if not df_staff.empty:
-            for staff_id in df_staff['staff_id'].unique():
-                staff_frame_data = df_staff[
-                    (df_staff['staff_id'] == staff_id) & 
-                    (df_staff['time'] == frame_data['time'])
-                ]
-                
-                if not staff_frame_data.empty:
-                    # Staff styling
-                    if 'Doctor' in staff_id:
-                        color = 'blue'
-                        symbol = 'triangle-up'
-                    elif 'Nurse' in staff_id:
-                        color = 'purple'
-                        symbol = 'diamond'
-                    else:
-                        color = staff_frame_data['color'].iloc[0]
-                        symbol = staff_frame_data['symbol'].iloc[0]
-                    
-                    frame_traces.append(go.Scatter(
-                        x=staff_frame_data['x'],
-                        y=staff_frame_data['y'],
-                        mode='markers',
-                        marker=dict(
-                            size=12,  # Consistent size
-                            color=color,
-                            symbol=symbol,
-                            line=dict(color='black', width=1)  # Add border for better visibility
-                        ),
-                        name=staff_id,
-                        showlegend=False
-                    ))
-                else:
-                    # Empty trace
-                    frame_traces.append(go.Scatter(
-                        x=[],
-                        y=[],
-                        mode='markers',
-                        name=staff_id,
-                        showlegend=False
-                    ))
-        
-        # Collect all annotations for this frame (removed red time text)
-        all_annotations = []
-        
-        # Add dynamic annotations from frame data
-        for annotation in frame_data.get('annotations', []):
-            all_annotations.append(annotation)
-        
-        frames.append(go.Frame(
-            data=frame_traces,
-            name=str(int(frame_data['time'])),
-            layout=go.Layout(
-                annotations=all_annotations
-            )
-        ))
-    
-    fig.frames = frames
+    marker_line = dict(color='black', width=1)  # Border for better visibility
+    first = _frame_trace_data(animation_data[0]) if animation_data else [
+        {'x': [], 'y': [], 'text': None, 'hovertext': []}] * 3 + [{'text': ['', '']}]
+    
+    fig.add_trace(go.Scatter(
+        **first[0],
+        mode='markers+text',
+        textposition='bottom center',
+        textfont=dict(color='darkgreen', size=9, weight='bold'),
+        marker=dict(size=12, color='green', symbol='circle', line=marker_line),
+        name='Patients',
+        hoverinfo='text'
+    ))
+    fig.add_trace(go.Scatter(
+        **first[1],
+        mode='markers',
+        marker=dict(size=12, color='purple', symbol='diamond', line=marker_line),
+        name='Nurses',
+        hoverinfo='text'
+    ))
+    fig.add_trace(go.Scatter(
+        **first[2],
+        mode='markers',
+        marker=dict(size=12, color='blue', symbol='triangle-up', line=marker_line),
+        name='Doctors',
+        hoverinfo='text'
+    ))
+    fig.add_trace(go.Scatter(
+        x=[1.5, 2.5], y=[2.35, 2.35],
+        **first[3],
+        mode='text',
+        textfont=dict(color=['darkred', 'darkgreen'], size=12, weight='bold'),
+        name='Waiting',
+        hoverinfo='skip'
+    ))
+    animated = list(range(len(fig.data) - 4, len(fig.data)))
+    
+    # Frames update only the changing arrays of the animated traces
+    # (plain dicts, so plotly validates each frame once when it is attached)
+    fig.frames = [
+        {
+            'data': [{'type': 'scatter', **arrays} for arrays in _frame_trace_data(frame_data)],
+            'traces': animated,
+            'name': f"{frame_data['time']:g}"
+        }
+        for frame_data in animation_data
+    ]
+    frames = fig.frames
     
     # Configure layout with animation controls
     fig.update_layout(
@@ -1064,10 +1313,114 @@ def add_static_elements(fig, num_rooms=3):
             arrowcolor="gray"
         )
 
+# Chart name -> resource_statistics key
+RESOURCE_STATISTICS_KEYS = {
+    'Registration': 'registration_staff',
+    'Nurses': 'nurses',
+    'Doctors': 'doctors',
+    'Exam Rooms': 'exam_rooms'
+}
+
+def prepare_resource_usage_data(journey_df, total_duration, num_registration, num_nurses, num_doctors, num_rooms,
+                                bin_minutes=None, in_progress=None, resource_statistics=None):
+    """Data behind the Resource Usage tab (no Streamlit or Plotly calls).
+    
+    ``in_progress`` (journeys not yet discharged) keeps patients still in
+    service at the horizon in the occupancy curves. The utilization bars
+    come from the engine's exact ``resource_statistics`` when given.
+    """
+    completed = journey_df[journey_df['service_completed'] == True]
+    data = {'completed': completed, 'utilization': None, 'service_times': None,
+            'occupancy': None, 'time_series': None}
+    if completed.empty:
+        return data
+    
+    if resource_statistics is not None:
+        data['utilization'] = [resource_statistics[key]['utilization'] * 100
+                               for key in RESOURCE_STATISTICS_KEYS.values()]
+    else:
+        data['utilization'] = _discharged_utilization(completed, total_duration, num_registration,
+                                                      num_nurses, num_doctors, num_rooms)
+    
+    data['service_times'] = {
+        'Registration': completed['registration_end'] - completed['registration_start'],
+        'Nurse Visit': completed['nurse_visit_end'] - completed['nurse_visit_start'],
+        'Doctor Visit': completed['doctor_visit_end'] - completed['doctor_visit_start']
+    }
+    
+    # Utilization over time: exact occupancy curves averaged over bins
+    capacities = {'Registration': num_registration, 'Nurses': num_nurses,
+                  'Doctors': num_doctors, 'Exam Rooms': num_rooms}
+    curves = occupancy_curves(journey_df, total_duration, in_progress)
+    if bin_minutes is None:
+        bin_minutes = max(5, total_duration // 20)  # Dynamic interval size
+    bin_starts, utilization = utilization_series(curves, capacities, total_duration, bin_minutes)
+    data['occupancy'] = curves
+    data['time_series'] = {'time': bin_starts.tolist(), **{name: values.tolist() for name, values in utilization.items()}}
+    return data
+
+def _discharged_utilization(completed, total_duration, num_registration, num_nurses, num_doctors, num_rooms):
+    """Utilization (%) from the service of discharged patients only (understates busy resources)."""
+    total_registration_time = (completed['registration_end'] - completed['registration_start']).sum()
+    total_nurse_time = (completed['nurse_visit_end'] - completed['nurse_visit_start']).sum()
+    total_doctor_time = (completed['doctor_visit_end'] - completed['doctor_visit_start']).sum()
+    total_room_time = (completed['doctor_visit_end'] - completed['exam_room_assigned']).sum()
+    return [
+        (total_registration_time / (total_duration * num_registration)) * 100,
+        (total_nurse_time / (total_duration * num_nurses)) * 100,
+        (total_doctor_time / (total_duration * num_doctors)) * 100,
+        (total_room_time / (total_duration * num_rooms)) * 100
+    ]
+
+def prepare_time_analysis_data(journey_df):
+    """Data behind the Time Analysis tab (no Streamlit or Plotly calls)."""
+    completed = journey_df[journey_df['service_completed'] == True]
+    data = {'completed': completed, 'breakdown': None, 'rolling_wait': None, 'overall_avg_wait': 0}
+    if completed.empty:
+        return data
+    
+    # Sort by discharge time; first 20 patients avoid overcrowding the breakdown
+    completed_sorted = completed.sort_values('departure_time')
+    display_patients = completed_sorted.head(20)
+    data['breakdown'] = {
+        'patient_id': display_patients['patient_id'],
+        'Registration': display_patients['registration_end'] - display_patients['registration_start'],
+        'Waiting': display_patients['waiting_time'],
+        'Nurse Visit': display_patients['nurse_visit_end'] - display_patients['nurse_visit_start'],
+        'Doctor Visit': display_patients['doctor_visit_end'] - display_patients['doctor_visit_start']
+    }
+    
+    # Rolling average wait time
+    window_size = max(5, len(completed_sorted) // 10)  # Dynamic window size
+    completed_sorted = completed_sorted.assign(
+        rolling_wait_time=completed_sorted['waiting_time'].rolling(window=window_size, min_periods=1).mean()
+    )
+    data['rolling_wait'] = completed_sorted
+    data['overall_avg_wait'] = completed_sorted['rolling_wait_time'].iloc[-1]
+    return data
+
+def prepare_chart_data(results):
+    """All data preparation done by display_charts, for reuse and benchmarking."""
+    journey_df = results['patient_journey_summary']
+    return {
+        'resource_usage': prepare_resource_usage_data(
+            journey_df, results['simulation_duration'],
+            results.get('num_registration', 1), results['num_nurses'],
+            results['num_doctors'], results['num_rooms'],
+            in_progress=results.get('in_progress_journeys'),
+            resource_statistics=results.get('resource_statistics')
+        ),
+        'time_analysis': prepare_time_analysis_data(journey_df)
+    }
+
 def display_charts(results, num_rooms=3):
     if results is None:
         return
     
+    # Derived artifacts are cached by results content, so reruns reuse them
+    cache = get_artifact_cache()
+    fingerprint = results.get('fingerprint') or results_fingerprint(results)
+    
     st.markdown("---")
     
     # Simple tabs for charts
@@ -1079,7 +1432,6 @@ def display_charts(results, num_rooms=3):
         journey_df = results['patient_journey_summary']
         
         if not journey_df.empty:
-            # Create animation data for Plotly
             max_time = results['simulation_duration']
             
             # Validate max_time and ensure float type
@@ -1089,13 +1441,21 @@ def display_charts(results, num_rooms=3):
                 max_time = float(max_time)  # Ensure it's a float
             
             
+            num_doctors = results.get('num_doctors', 3)
+            num_nurses = results.get('num_nurses', 2)
+            animation_key = (fingerprint, max_time, num_rooms, num_doctors, num_nurses)
+            
             # Create animation frames data
-            animation_data = create_animation_frames(journey_df, max_time, num_rooms, 
-                                                  results.get('num_doctors', 3), 
-                                                  results.get('num_nurses', 2))
+            animation_data = cache.get_or_compute(
+                ('animation_frames',) + animation_key,
+                lambda: create_animation_frames(journey_df, max_time, num_rooms, num_doctors, num_nurses)
+            )
             
             # Create animated figure using Plotly's built-in animation
-            fig = create_animated_figure(animation_data, max_time, num_rooms)
+            fig = cache.get_or_compute(
+                ('animated_figure',) + animation_key,
+                lambda: create_animated_figure(animation_data, max_time, num_rooms)
+            )
             
             # Display the animated chart
             st.plotly_chart(fig, use_container_width=True, theme="streamlit")
@@ -1121,47 +1481,34 @@ def display_charts(results, num_rooms=3):
         journey_df = results['patient_journey_summary']
         
         if not journey_df.empty:
+            usage = cache.get_or_compute(('resource_usage', fingerprint), lambda: prepare_resource_usage_data(
+                journey_df, results['simulation_duration'], results.get('num_registration', 1),
+                results['num_nurses'], results['num_doctors'], results['num_rooms'],
+                in_progress=results.get('in_progress_journeys'),
+                resource_statistics=results.get('resource_statistics')
+            ))
+            completed = usage['completed']
+            
             # Create resource utilization visualization
             col1, col2 = st.columns(2)
             
             with col1:
                 st.subheader("Resource Utilization")
                 
-                # Calculate average utilization rates
-                total_duration = results['simulation_duration']
-                num_doctors = results['num_doctors']
-                num_nurses = results['num_nurses']
-                num_rooms = results['num_rooms']
-                num_registration = results.get('num_registration', 1)
-                
-                # Calculate total time each resource was used
-                completed = journey_df[journey_df['service_completed'] == True]
-                if not completed.empty:
-                    total_registration_time = (completed['registration_end'] - completed['registration_start']).sum()
-                    total_nurse_time = (completed['nurse_visit_end'] - completed['nurse_visit_start']).sum()
-                    total_doctor_time = (completed['doctor_visit_end'] - completed['doctor_visit_start']).sum()
-                    total_room_time = (completed['doctor_visit_end'] - completed['exam_room_assigned']).sum()
-                    
-                    # Calculate utilization rates
-                    reg_utilization = (total_registration_time / (total_duration * num_registration)) * 100
-                    nurse_utilization = (total_nurse_time / (total_duration * num_nurses)) * 100
-                    doctor_utilization = (total_doctor_time / (total_duration * num_doctors)) * 100
-                    room_utilization = (total_room_time / (total_duration * num_rooms)) * 100
-                    
+                if usage['utilization'] is not None:
                     # Create bar chart
                     fig = go.Figure(data=[
                         go.Bar(
                             x=['Registration', 'Nurses', 'Doctors', 'Exam Rooms'],
-                            y=[reg_utilization, nurse_utilization, doctor_utilization, room_utilization],
+                            y=usage['utilization'],
                             marker_color=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728']
                         )
                     ])
                     
                     axis_style = get_axis_style()
                     fig.update_layout(
-                        **get_chart_theme(),
+                        **{**get_chart_theme(), 'showlegend': False},
                         height=400,
-                        showlegend=False,
                         xaxis={**axis_style, 'showticklabels': False},
                         yaxis={**axis_style, 'title': {'text': 'Utilization (%)', 'font': {'color': '#000000'}}, 'range': [0, 100]}
                     )
@@ -1172,18 +1519,12 @@ def display_charts(results, num_rooms=3):
             with col2:
                 st.subheader("Service Times")
                 
-                completed = journey_df[journey_df['service_completed'] == True]
-                if not completed.empty:
-                    # Calculate service times
-                    reg_times = completed['registration_end'] - completed['registration_start']
-                    nurse_times = completed['nurse_visit_end'] - completed['nurse_visit_start']
-                    doctor_times = completed['doctor_visit_end'] - completed['doctor_visit_start']
-                    
+                if usage['service_times'] is not None:
                     # Create box plot
                     fig = go.Figure()
-                    fig.add_trace(go.Box(y=reg_times, name='Registration', marker_color='#1f77b4'))
-                    fig.add_trace(go.Box(y=nurse_times, name='Nurse Visit', marker_color='#ff7f0e'))
-                    fig.add_trace(go.Box(y=doctor_times, name='Doctor Visit', marker_color='#2ca02c'))
+                    colors = ['#1f77b4', '#ff7f0e', '#2ca02c']
+                    for (name, times), color in zip(usage['service_times'].items(), colors):
+                        fig.add_trace(go.Box(y=times, name=name, marker_color=color))
                     
                     axis_style = get_axis_style()
                     fig.update_layout(
@@ -1199,64 +1540,19 @@ def display_charts(results, num_rooms=3):
             # Add resource utilization over time line chart
             st.subheader("Resource Utilization Over Time")
             
-            # Create time series data for resource utilization
             if not completed.empty:
-                # Group by time intervals (e.g., every 10 minutes)
-                time_intervals = []
-                reg_utils = []
-                nurse_utils = []
-                doctor_utils = []
-                room_utils = []
-                
-                max_time = total_duration
-                interval_size = max(5, max_time // 20)  # Dynamic interval size
-                
-                for t in range(0, int(max_time), interval_size):
-                    time_end = t + interval_size
-                    
-                    # Count active resources at this time
-                    active_at_time = completed[
-                        (completed['registration_start'] <= time_end) & 
-                        (completed['departure_time'] > t)
-                    ]
-                    
-                    if not active_at_time.empty:
-                        # Calculate utilization for this interval
-                        reg_active = active_at_time[
-                            (active_at_time['registration_start'] <= time_end) & 
-                            (active_at_time['registration_end'] > t)
-                        ]
-                        nurse_active = active_at_time[
-                            (active_at_time['nurse_visit_start'] <= time_end) & 
-                            (active_at_time['nurse_visit_end'] > t)
-                        ]
-                        doctor_active = active_at_time[
-                            (active_at_time['doctor_visit_start'] <= time_end) & 
-                            (active_at_time['doctor_visit_end'] > t)
-                        ]
-                        room_active = active_at_time[
-                            (active_at_time['exam_room_assigned'] <= time_end) & 
-                            (active_at_time['departure_time'] > t)
-                        ]
-                        
-                        time_intervals.append(t)
-                        reg_utils.append(len(reg_active) / num_registration * 100)
-                        nurse_utils.append(len(nurse_active) / num_nurses * 100)
-                        doctor_utils.append(len(doctor_active) / num_doctors * 100)
-                        room_utils.append(len(room_active) / num_rooms * 100)
-                
-                if time_intervals:
+                time_series = usage['time_series']
+                if time_series['time']:
                     fig = go.Figure()
-                    fig.add_trace(go.Scatter(x=time_intervals, y=reg_utils, name='Registration', line=dict(color='#1f77b4')))
-                    fig.add_trace(go.Scatter(x=time_intervals, y=nurse_utils, name='Nurses', line=dict(color='#ff7f0e')))
-                    fig.add_trace(go.Scatter(x=time_intervals, y=doctor_utils, name='Doctors', line=dict(color='#2ca02c')))
-                    fig.add_trace(go.Scatter(x=time_intervals, y=room_utils, name='Exam Rooms', line=dict(color='#d62728')))
+                    colors = {'Registration': '#1f77b4', 'Nurses': '#ff7f0e', 'Doctors': '#2ca02c', 'Exam Rooms': '#d62728'}
+                    for name, color in colors.items():
+                        fig.add_trace(go.Scatter(x=time_series['time'], y=time_series[name], name=name,
+                                                 line=dict(color=color, shape='hv')))
                     
                     axis_style = get_axis_style()
                     fig.update_layout(
-                        **get_chart_theme(),
+                        **{**get_chart_theme(), 'showlegend': False},
                         height=400,
-                        showlegend=False,
                         xaxis={**axis_style, 'title': {'text': 'Time (minutes)', 'font': {'color': '#000000'}}},
                         yaxis={**axis_style, 'title': {'text': 'Utilization (%)', 'font': {'color': '#000000'}}, 'range': [0, 100]}
                     )
@@ -1269,8 +1565,9 @@ def display_charts(results, num_rooms=3):
             st.info("No patient data to display resource utilization.")
     
     with tab3:
-        journey_df = results['patient_journey_summary']
-        completed = journey_df[journey_df['service_completed'] == True]
+        analysis = cache.get_or_compute(('time_analysis', fingerprint),
+                                        lambda: prepare_time_analysis_data(results['patient_journey_summary']))
+        completed = analysis['completed']
         
         if not completed.empty:
             # Create four columns for the time analysis tab
@@ -1279,23 +1576,13 @@ def display_charts(results, num_rooms=3):
             with col1:
                 st.subheader("Time Breakdown by Patient")
                 
-                # Sort by discharge time and show individual patient breakdown
-                completed_sorted = completed.sort_values('departure_time')
-                
-                # Take first 20 patients to avoid overcrowding
-                display_patients = completed_sorted.head(20)
-                
-                # Calculate durations for each patient
-                reg_times = display_patients['registration_end'] - display_patients['registration_start']
-                wait_times = display_patients['waiting_time']
-                nurse_times = display_patients['nurse_visit_end'] - display_patients['nurse_visit_start']
-                doctor_times = display_patients['doctor_visit_end'] - display_patients['doctor_visit_start']
+                # Individual breakdown for the first patients discharged
+                breakdown = analysis['breakdown']
                 
                 fig = go.Figure()
-                fig.add_trace(go.Bar(name='Registration', x=display_patients['patient_id'], y=reg_times, marker_color='#1f77b4'))
-                fig.add_trace(go.Bar(name='Waiting', x=display_patients['patient_id'], y=wait_times, marker_color='#ff7f0e'))
-                fig.add_trace(go.Bar(name='Nurse Visit', x=display_patients['patient_id'], y=nurse_times, marker_color='#2ca02c'))
-                fig.add_trace(go.Bar(name='Doctor Visit', x=display_patients['patient_id'], y=doctor_times, marker_color='#d62728'))
+                colors = {'Registration': '#1f77b4', 'Waiting': '#ff7f0e', 'Nurse Visit': '#2ca02c', 'Doctor Visit': '#d62728'}
+                for name, color in colors.items():
+                    fig.add_trace(go.Bar(name=name, x=breakdown['patient_id'], y=breakdown[name], marker_color=color))
                 
                 axis_style = get_axis_style()
                 fig.update_layout(
@@ -1345,15 +1632,9 @@ def display_charts(results, num_rooms=3):
                 st.plotly_chart(fig, use_container_width=True, theme="streamlit")
             
             with col4:
-                # Create time series of average wait times
-                completed_sorted = completed.sort_values('departure_time')
-                
-                # Calculate rolling average wait time
-                window_size = max(5, len(completed_sorted) // 10)  # Dynamic window size
-                completed_sorted['rolling_wait_time'] = completed_sorted['waiting_time'].rolling(window=window_size, min_periods=1).mean()
-                
-                # Calculate overall average for title
-                overall_avg_wait = completed_sorted['rolling_wait_time'].iloc[-1] if len(completed_sorted) > 0 else 0
+                # Time series of rolling average wait times
+                completed_sorted = analysis['rolling_wait']
+                overall_avg_wait = analysis['overall_avg_wait']
                 st.subheader(f"Average Wait Time Over Time ({overall_avg_wait:.1f} min avg)")
                 
                 fig = go.Figure()
@@ -1368,9 +1649,8 @@ def display_charts(results, num_rooms=3):
                 
                 axis_style = get_axis_style()
                 fig.update_layout(
-                    **get_chart_theme(),
+                    **{**get_chart_theme(), 'showlegend': False},
                     height=400,
-                    showlegend=False,
                     xaxis={**axis_style, 'title': {'text': 'Discharge Time (minutes)', 'font': {'color': '#000000'}}},
                     yaxis={**axis_style, 'title': {'text': 'Average Wait Time (minutes)', 'font': {'color': '#000000'}}}
                 )
@@ -1384,61 +1664,41 @@ def main():
     # Create sidebar
     config = create_sidebar()
     
-    # Always show progress bar
-    progress_bar = st.progress(st.session_state.simulation_progress)
-    status_text = st.empty()
+    # A new run replaces (and cancels) one still in progress
+    if config['run_simulation'] or config['run_sweep'] or config['run_optimizer']:
+        job = st.session_state.simulation_job
+        busy = job is not None and job.running
+        if busy:
+            job.cancel()
+        if config['run_sweep']:
+            st.session_state.simulation_job = start_sweep_job(config)
+        elif config['run_optimizer']:
+            st.session_state.simulation_job = start_optimizer_job(config)
+        else:
+            st.session_state.simulation_job = start_simulation_job(config, resume=not busy)
     
-    # Run simulation if button clicked
-    if config['run_simulation']:
-        try:
-            # Update progress during simulation
-            st.session_state.simulation_progress = 10
-            st.session_state.simulation_status = "🔄 Initializing simulation..."
-            status_text.text(st.session_state.simulation_status)
-            progress_bar.progress(st.session_state.simulation_progress)
-            
-            st.session_state.simulation_progress = 30
-            st.session_state.simulation_status = "🔄 Running patient simulation..."
-            status_text.text(st.session_state.simulation_status)
-            progress_bar.progress(st.session_state.simulation_progress)
-            
-            results = run_simulation_with_config(config)
-            
-            st.session_state.simulation_progress = 70
-            st.session_state.simulation_status = "🔄 Processing results..."
-            status_text.text(st.session_state.simulation_status)
-            progress_bar.progress(st.session_state.simulation_progress)
-            
-            st.session_state.simulation_results = results
-            
-            st.session_state.simulation_progress = 90
-            st.session_state.simulation_status = "🔄 Generating visualizations..."
-            status_text.text(st.session_state.simulation_status)
-            progress_bar.progress(st.session_state.simulation_progress)
-            
-            # Complete
-            st.session_state.simulation_progress = 100
-            st.session_state.simulation_status = "✅ Simulation completed successfully!"
-            status_text.success(st.session_state.simulation_status)
-            progress_bar.progress(st.session_state.simulation_progress)
-            
-        except Exception as e:
-            st.session_state.simulation_progress = 0
-            st.session_state.simulation_status = f"❌ Simulation failed: {str(e)}"
-            status_text.error(st.session_state.simulation_status)
-            progress_bar.progress(st.session_state.simulation_progress)
-            st.session_state.simulation_results = None
+    if st.session_state.simulation_job is not None:
+        display_job_progress()
     else:
         # Show current status when not running
+        st.progress(st.session_state.simulation_progress)
+        status_text = st.empty()
         if st.session_state.simulation_progress == 100:
             status_text.success(st.session_state.simulation_status)
         elif st.session_state.simulation_progress == 0 and "failed" in st.session_state.simulation_status:
             status_text.error(st.session_state.simulation_status)
+        elif st.session_state.simulation_progress == 0 and "cancelled" in st.session_state.simulation_status:
+            status_text.warning(st.session_state.simulation_status)
         else:
             status_text.text(st.session_state.simulation_status)
     
     # Display results
     display_main_results(st.session_state.simulation_results)
+    display_queueing_estimate(config)
+    display_metamodel_preview(config)
+    display_replication_summary(st.session_state.replication_results)
+    display_sweep_results(st.session_state.sweep_results)
+    display_optimizer_results(st.session_state.optimizer_results)
     display_charts(st.session_state.simulation_results, config['num_rooms'])
 
 if __name__ == "__main__":
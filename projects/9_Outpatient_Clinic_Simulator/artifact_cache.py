@@ -0,0 +1,98 @@
+"""Artifact Cache - Outpatient Clinic Simulation
+
+Bounded LRU cache for artifacts derived from simulation results: animation
+frames, the animated figure and the chart aggregations. Keys start with a
+content hash of the results, so reruns that do not change the results (tab
+switches, unrelated sliders) reuse every artifact instead of rebuilding it.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+import numpy as np
+import pandas as pd
+
+from kpi_stats import JourneyStats
+from tracing import ColumnarEventLog
+
+DEFAULT_MAX_ENTRIES = 32
+
+def _update_hash(digest, value):
+    """Feed a results value into ``digest`` by content."""
+    if isinstance(value, pd.DataFrame):
+        digest.update(b'DataFrame' + repr(list(value.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f'ndarray{value.dtype.str}{value.shape}'.encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, ColumnarEventLog):
+        _update_hash(digest, value.columns())
+    elif isinstance(value, JourneyStats):
+        _update_hash(digest, value.state())
+    elif isinstance(value, dict):
+        digest.update(b'dict')
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode())
+        for item in value:
+            _update_hash(digest, item)
+    else:
+        digest.update(repr(value).encode())
+
+def results_fingerprint(results: Dict[str, Any]) -> str:
+    """Content hash of a simulation results dict.
+
+    Equal results hash equal even when they are different objects (e.g.
+    copies returned by st.cache_data). A stored 'fingerprint' entry is
+    ignored so the hash can be kept alongside the results.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    _update_hash(digest, {key: value for key, value in results.items() if key != 'fingerprint'})
+    return digest.hexdigest()
+
+class ArtifactCache:
+    """Thread-safe LRU cache holding at most ``max_entries`` artifacts."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached artifact for ``key``, building it on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Build outside the lock so a slow artifact does not block other sessions
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,86 @@
+"""Background Jobs - Outpatient Clinic Simulation
+
+Runs simulation work on a daemon thread so the Streamlit script thread can
+keep rendering. The job function reports progress through ``job.report``
+and passes ``job.cancel_event`` on to run_realistic_simulation /
+run_replications, which stop between chunks once it is set.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from realistic_patient_journey import SimulationCancelled
+
+logger = logging.getLogger(__name__)
+
+# Job states
+RUNNING, COMPLETED, CANCELLED, FAILED = 'running', 'completed', 'cancelled', 'failed'
+
+class BackgroundJob:
+    """One run of ``target(job)`` on a daemon thread.
+
+    ``progress`` (0..1) and ``message`` are updated by the target through
+    ``report``; ``state`` becomes COMPLETED (with ``result``), CANCELLED or
+    FAILED (with ``error``) when it returns. Attributes are written by the
+    worker and only read elsewhere, so no lock is needed.
+    """
+
+    def __init__(self, target: Callable[['BackgroundJob'], Any], name: str = 'simulation-job'):
+        self._target = target
+        self.name = name
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.state = RUNNING
+        self.progress = 0.0
+        self.message = ''
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def start(self) -> 'BackgroundJob':
+        self.started_at = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def report(self, progress: float, message: Optional[str] = None):
+        """Called by the target: fraction done and an optional status line."""
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def cancel(self):
+        """Ask the target to stop at its next chunk boundary."""
+        self.cancel_event.set()
+
+    @property
+    def running(self) -> bool:
+        return self.state == RUNNING
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finishes; False if ``timeout`` ran out first."""
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def _run(self):
+        try:
+            self.result = self._target(self)
+            self.progress = 1.0
+            self.state = COMPLETED
+        except SimulationCancelled as e:
+            self.message = str(e)
+            self.state = CANCELLED
+        except Exception as e:
+            logger.exception("Background job failed")
+            self.error = e
+            self.state = FAILED
+        finally:
+            self.finished_at = time.perf_counter()
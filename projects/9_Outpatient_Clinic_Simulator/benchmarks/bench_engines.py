@@ -0,0 +1,73 @@
+"""Engine Speedup Benchmark
+
+End-to-end time of run_realistic_simulation (run, journey table, resource
+statistics) with the SimPy model and the heap engine on 24-hour runs at
+high arrival rates. Runs alternate between the engines so load on the
+machine affects both alike; each time is the best of ``--repeat``.
+
+The default clinic at one arrival every 3 minutes is shown for reference
+only: it discharges about 300 patients a day, so per-run costs both
+engines share (the journey DataFrame, input sampling) dominate, and it is
+left out of ``--min-speedup``.
+
+Usage: python benchmarks/bench_engines.py [--hours 24] [--repeat 15] [--min-speedup 10]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from realistic_patient_journey import run_realistic_simulation
+
+# (label, clinic config, mean minutes between arrivals)
+CASES = [
+    ('16 doctors, every 1 min', {'NUM_DOCTORS': 16, 'NUM_NURSES': 10, 'NUM_REGISTRATION_STAFF': 4, 'NUM_EXAM_ROOMS': 30}, 1.0),
+    ('30 doctors, every 30 s', {'NUM_DOCTORS': 30, 'NUM_NURSES': 20, 'NUM_REGISTRATION_STAFF': 7, 'NUM_EXAM_ROOMS': 50}, 0.5),
+    ('8 doctors, every 1 min', {'NUM_DOCTORS': 8, 'NUM_NURSES': 6, 'NUM_REGISTRATION_STAFF': 2, 'NUM_EXAM_ROOMS': 10}, 1.0)
+]
+REFERENCE_CASES = [
+    ('3 doctors, every 3 min', {'NUM_DOCTORS': 3, 'NUM_NURSES': 2, 'NUM_REGISTRATION_STAFF': 1, 'NUM_EXAM_ROOMS': 5}, 3.0)
+]
+
+def _best_times(kwargs, repeat):
+    """Best wall-clock time per engine, alternating the engines."""
+    best = {'simpy': float('inf'), 'heap': float('inf')}
+    for _ in range(repeat):
+        for engine in best:
+            start = time.perf_counter()
+            run_realistic_simulation(engine=engine, **kwargs)
+            best[engine] = min(best[engine], time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--min-speedup', type=float, help="exit with status 1 below this speedup")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{'case':<26}{'patients':>10}{'simpy s':>10}{'heap s':>10}{'speedup':>10}")
+    slowest = float('inf')
+    cases = [case + (False,) for case in CASES] + [case + (True,) for case in REFERENCE_CASES]
+    for label, clinic_config, arrival_rate, reference in cases:
+        kwargs = {'clinic_config': clinic_config, 'simulation_duration': args.hours * 60,
+                  'arrival_rate': arrival_rate, 'random_seed': 42}
+        patients = run_realistic_simulation(engine='heap', **kwargs)['total_patients']
+        best = _best_times(kwargs, args.repeat)
+        speedup = best['simpy'] / best['heap']
+        if not reference:
+            slowest = min(slowest, speedup)
+        print(f"{label:<26}{patients:>10,}{best['simpy']:>10.4f}{best['heap']:>10.4f}{speedup:>9.1f}x"
+              + ("  (reference)" if reference else ""))
+
+    if args.min_speedup is not None and slowest < args.min_speedup:
+        print(f"slowest speedup {slowest:.1f}x is below {args.min_speedup:g}x")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Journey Record Memory Benchmark
+
+Compares bytes per patient held by RealisticPatientJourney against the
+previous layout (one dict per patient in ``current_patients`` plus a merged
+copy in ``journey_data`` at discharge).
+
+Usage: python benchmarks/bench_journey_memory.py [--patients 50000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from realistic_patient_journey import RealisticPatientJourney, JOURNEY_TIME_FIELDS
+
+def _dict_layout(n_patients):
+    """Rebuild the dict-per-patient layout the tracker used to keep."""
+    current_patients, journey_data, patient_states = {}, [], {}
+    for i in range(1, n_patients + 1):
+        patient_id = f"Patient_{i:03d}"
+        journey = {'patient_id': patient_id, 'waiting_room_start': float(i), 'room_id': i % 5}
+        for offset, field in enumerate(JOURNEY_TIME_FIELDS):
+            journey[field] = float(i + offset)
+        current_patients[patient_id] = journey
+        patient_states[patient_id] = 'discharged'
+        journey_data.append({**journey, 'total_time': 8.0, 'waiting_time': 3.0, 'service_completed': True})
+    return current_patients, journey_data, patient_states
+
+def _tracker_layout(n_patients):
+    tracker = RealisticPatientJourney()
+    for i in range(1, n_patients + 1):
+        tracker.start_journey(i, float(i))
+        for offset, field in enumerate(JOURNEY_TIME_FIELDS[1:-1], start=1):
+            if field == 'exam_room_assigned':
+                tracker.move_to_exam_room(i, i % 5, float(i + offset))
+            else:
+                tracker.log_event(i, field, float(i + offset))
+        tracker.discharge_patient(i, float(i + len(JOURNEY_TIME_FIELDS)))
+    return tracker
+
+def _retained_bytes(build, n_patients):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(n_patients)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return retained
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=50000)
+    args = parser.parse_args()
+
+    dict_bytes = _retained_bytes(_dict_layout, args.patients)
+    tracker_bytes = _retained_bytes(_tracker_layout, args.patients)
+
+    print(f"{args.patients} discharged patients")
+    print(f"{'layout':<18}{'bytes/patient':>15}")
+    print(f"{'dict per patient':<18}{dict_bytes / args.patients:>15,.0f}")
+    print(f"{'struct of arrays':<18}{tracker_bytes / args.patients:>15,.0f}")
+    print(f"reduction: {dict_bytes / tracker_bytes:.1f}x")
+
+if __name__ == "__main__":
+    main()
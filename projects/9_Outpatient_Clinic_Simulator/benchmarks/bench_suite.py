@@ -0,0 +1,273 @@
+"""Benchmark Suite - Outpatient Clinic Simulation
+
+Times each pipeline stage and measures its peak traced memory, then compares
+the numbers with a stored JSON baseline:
+
+- run_realistic_simulation over arrival rates and horizons from 2 hours to 30 days
+- calculate_kpis_from_journey
+- create_animation_frames and create_animated_figure
+- the data preparation behind display_charts (prepare_chart_data)
+
+Baselines live in benchmarks/baselines/<profile>-<engine>.json. Every case
+uses a fixed seed, so the work done per case only changes when the model does
+(``items`` records its size: patients, frames, ...).
+
+Usage:
+    python benchmarks/bench_suite.py                      # compare with the baseline
+    python benchmarks/bench_suite.py --save               # store a new baseline
+    python benchmarks/bench_suite.py --profile quick --engine heap --check
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import simpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from realistic_patient_journey import run_realistic_simulation, ENGINES
+
+BASELINE_DIR = os.path.join(ROOT, 'benchmarks', 'baselines')
+
+# App sidebar defaults
+CLINIC_CONFIG = {'NUM_DOCTORS': 3, 'NUM_NURSES': 2, 'NUM_REGISTRATION_STAFF': 1, 'NUM_EXAM_ROOMS': 5}
+SERVICE_TIME_CONFIG = {
+    'registration': {'mean': 3.0, 'std': 0.9},
+    'nurse_visit': {'mean': 8.0, 'std': 2.0},
+    'doctor_visit': {'mean': 12.0, 'std': 3.6}
+}
+RANDOM_SEED = 42
+MAX_RUNS = 200
+
+# Horizons in minutes and mean minutes between arrivals
+PROFILES = {
+    'quick': {
+        'simulation_durations': [120, 480, 1440],
+        'arrival_rates': [5.0],
+        'visualization_durations': [60]
+    },
+    'full': {
+        'simulation_durations': [120, 480, 1440, 10080, 43200],
+        'arrival_rates': [10.0, 5.0, 3.0],
+        'visualization_durations': [60, 120, 480, 1440, 10080]
+    }
+}
+
+def _duration_label(minutes):
+    return f"{minutes / 1440:g}d" if minutes >= 1440 else f"{minutes / 60:g}h"
+
+def _import_app():
+    """Import app.py without Streamlit's bare-mode warnings."""
+    logging.disable(logging.WARNING)
+    try:
+        import app
+    finally:
+        logging.disable(logging.NOTSET)
+    return app
+
+def _simulate(duration, arrival_rate, engine):
+    return run_realistic_simulation(
+        clinic_config=CLINIC_CONFIG,
+        service_time_config=SERVICE_TIME_CONFIG,
+        simulation_duration=duration,
+        arrival_rate=arrival_rate,
+        random_seed=RANDOM_SEED,
+        engine=engine
+    )
+
+def build_cases(profile, engine):
+    """Return (name, params, function, size) tuples for every case.
+
+    ``function`` takes no arguments; inputs it needs are prepared here so
+    they are not part of the measurement. ``size(result)`` counts the items
+    the case produced.
+    """
+    settings = PROFILES[profile]
+    cases = []
+
+    for duration in settings['simulation_durations']:
+        for arrival_rate in settings['arrival_rates']:
+            cases.append((
+                f"simulation/{_duration_label(duration)}/every_{arrival_rate:g}min",
+                {'duration': duration, 'arrival_rate': arrival_rate, 'engine': engine},
+                lambda d=duration, a=arrival_rate: _simulate(d, a, engine),
+                lambda results: results['total_patients']
+            ))
+
+    app = _import_app()
+    for duration in settings['visualization_durations']:
+        label = _duration_label(duration)
+        params = {'duration': duration, 'arrival_rate': 5.0, 'engine': engine}
+        results = _simulate(duration, 5.0, engine)
+        results.update(num_doctors=CLINIC_CONFIG['NUM_DOCTORS'], num_nurses=CLINIC_CONFIG['NUM_NURSES'],
+                       num_rooms=CLINIC_CONFIG['NUM_EXAM_ROOMS'],
+                       num_registration=CLINIC_CONFIG['NUM_REGISTRATION_STAFF'])
+        journey_df = results['patient_journey_summary']
+        max_time = float(duration)
+        frames = app.create_animation_frames(journey_df, max_time, results['num_rooms'],
+                                             results['num_doctors'], results['num_nurses'])
+
+        cases += [
+            (f"kpis/{label}", params,
+             lambda df=journey_df, r=results: app.calculate_kpis_from_journey(df, r['resource_statistics']),
+             lambda kpis: len(kpis)),
+            (f"chart_data/{label}", params,
+             lambda r=results: app.prepare_chart_data(r),
+             lambda data: len(data['time_analysis']['completed'])),
+            (f"animation_frames/{label}", params,
+             lambda df=journey_df, r=results, t=max_time: app.create_animation_frames(
+                 df, t, r['num_rooms'], r['num_doctors'], r['num_nurses']),
+             len),
+            (f"animated_figure/{label}", params,
+             lambda f=frames, r=results, t=max_time: app.create_animated_figure(f, t, r['num_rooms']),
+             lambda figure: len(figure.frames))
+        ]
+    return cases
+
+def measure(function, size, repeat, min_time, time_budget, memory):
+    """Best wall-clock time over several runs, plus peak traced memory.
+
+    Runs at least ``repeat`` times, and short cases keep repeating (up to
+    MAX_RUNS) until ``min_time`` seconds have been measured, which steadies
+    millisecond timings. Slow cases stop once ``time_budget`` seconds have
+    been spent. Memory is measured on a separate run because tracemalloc
+    slows allocation down.
+    """
+    best, runs, spent = float('inf'), 0, 0.0
+    while runs == 0 or (spent < time_budget and
+                        (runs < repeat or (spent < min_time and runs < MAX_RUNS))):
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best, runs, spent = min(best, elapsed), runs + 1, spent + elapsed
+    measurement = {'seconds': best, 'runs': runs, 'items': int(size(result))}
+    del result
+
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        function()
+        measurement['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return measurement
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'simpy': simpy.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def compare(results, baseline, tolerance):
+    """Print results next to the baseline and return names of regressed cases."""
+    regressions = []
+    base_results = baseline.get('results', {}) if baseline else {}
+    print(f"{'case':<38}{'seconds':>10}{'baseline':>10}{'ratio':>8}{'peak KiB':>12}{'baseline':>12}  flag")
+    for name, current in results.items():
+        base = base_results.get(name)
+        flags = []
+        time_ratio = memory_ratio = float('nan')
+        if base:
+            time_ratio = current['seconds'] / base['seconds'] if base['seconds'] > 0 else float('nan')
+            if time_ratio > 1 + tolerance:
+                flags.append('slower')
+            if 'peak_kib' in current and base.get('peak_kib'):
+                memory_ratio = current['peak_kib'] / base['peak_kib']
+                if memory_ratio > 1 + tolerance:
+                    flags.append('memory')
+            if current['items'] != base.get('items'):
+                flags.append(f"items {base.get('items')}->{current['items']}")
+        else:
+            flags.append('new')
+        if 'slower' in flags or 'memory' in flags:
+            regressions.append(name)
+
+        base_seconds = f"{base['seconds']:.4f}" if base else '-'
+        base_memory = f"{base['peak_kib']:,.0f}" if base and base.get('peak_kib') else '-'
+        memory = f"{current['peak_kib']:,.0f}" if 'peak_kib' in current else '-'
+        print(f"{name:<38}{current['seconds']:>10.4f}{base_seconds:>10}{time_ratio:>8.2f}"
+              f"{memory:>12}{base_memory:>12}  {' '.join(flags)}")
+    return regressions
+
+def _write_report(path, report):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"wrote {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='full')
+    parser.add_argument('--engine', choices=ENGINES, default='simpy')
+    parser.add_argument('--filter', default='', help="only run cases whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=5, help="minimum runs per case")
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help="keep repeating short cases until this many seconds are measured")
+    parser.add_argument('--time-budget', type=float, default=2.0,
+                        help="stop repeating a case after this many seconds")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run")
+    parser.add_argument('--baseline', help="baseline JSON (default: baselines/<profile>-<engine>.json)")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="relative slowdown or memory growth reported as a regression")
+    parser.add_argument('--save', action='store_true',
+                        help="write the results as the new baseline (with --filter, only those cases)")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.profile}-{args.engine}.json")
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    results = {}
+    for name, params, function, size in build_cases(args.profile, args.engine):
+        if args.filter not in name:
+            continue
+        results[name] = {'params': params, **measure(function, size, args.repeat, args.min_time, args.time_budget,
+                                                     not args.no_memory)}
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'profile': args.profile,
+        'engine': args.engine,
+        'environment': environment_info(),
+        'results': results
+    }
+
+    print(f"profile {args.profile}, engine {args.engine}, baseline {os.path.relpath(baseline_path, ROOT)}"
+          f"{'' if baseline else ' (missing)'}")
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.output:
+        _write_report(args.output, report)
+    if args.save:
+        # A filtered run only replaces the cases it measured
+        if baseline and args.filter:
+            report['results'] = {**baseline['results'], **results}
+        _write_report(baseline_path, report)
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
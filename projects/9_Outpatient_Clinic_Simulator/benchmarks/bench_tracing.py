@@ -0,0 +1,88 @@
+"""Tracing Overhead Benchmark
+
+Measures simulated patient events per second with tracing off, recorded to
+a list of dicts or a columnar event log, and formatted through the logging
+module.
+
+Usage: python benchmarks/bench_tracing.py [--hours 24] [--arrival-rate 2] [--repeat 3]
+"""
+
+import argparse
+import gc
+import io
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from realistic_patient_journey import run_realistic_simulation
+from tracing import EventListSink, LoggingTraceSink, ColumnarEventLog
+
+def _time_run(kwargs, trace_sink, repeat):
+    """Best wall-clock time over ``repeat`` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_realistic_simulation(trace_sink=trace_sink() if trace_sink else None, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _sink_memory(kwargs, trace_sink):
+    """Bytes still held by the sink after one run."""
+    if trace_sink is None:
+        return 0
+    tracemalloc.start()
+    # Measure from before the sink exists, so its own buffers count too
+    before = tracemalloc.get_traced_memory()[0]
+    sink = trace_sink()
+    run_realistic_simulation(trace_sink=sink, **kwargs)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del sink
+    return max(retained, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--arrival-rate', type=float, default=2.0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    kwargs = {
+        'clinic_config': {'NUM_DOCTORS': 8, 'NUM_NURSES': 6, 'NUM_REGISTRATION_STAFF': 2, 'NUM_EXAM_ROOMS': 10},
+        'simulation_duration': args.hours * 60,
+        'arrival_rate': args.arrival_rate,
+        'random_seed': 42
+    }
+
+    # Same seed, so every mode processes exactly these events
+    counter = EventListSink()
+    run_realistic_simulation(trace_sink=counter, **kwargs)
+    n_events = len(counter)
+
+    # Route log lines to an in-memory handler so terminal I/O is not measured
+    trace_logger = logging.getLogger('bench_tracing')
+    trace_logger.addHandler(logging.StreamHandler(io.StringIO()))
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+    modes = [
+        ('off', None),
+        ('event list', EventListSink),
+        ('columnar', ColumnarEventLog),
+        ('logging', lambda: LoggingTraceSink(trace_logger))
+    ]
+
+    print(f"{n_events} events per run ({args.hours:g} h, arrival every {args.arrival_rate:g} min)")
+    print(f"{'mode':<12}{'seconds':>10}{'events/s':>14}{'sink KiB':>12}")
+    for name, sink in modes:
+        elapsed = _time_run(kwargs, sink, args.repeat)
+        memory = _sink_memory(kwargs, sink)
+        print(f"{name:<12}{elapsed:>10.3f}{n_events / elapsed:>14,.0f}{memory / 1024:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
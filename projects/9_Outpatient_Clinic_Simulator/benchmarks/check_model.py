@@ -0,0 +1,205 @@
+"""Model Checks - Outpatient Clinic Simulation
+
+Consistency checks between independently computed results, run over a few
+configurations and seeds:
+
+- occupancy: the time averages of the Resource Usage occupancy curves
+  (occupancy.py, built from discharged and in-progress journeys) equal each
+  resource's time-weighted ``avg_in_use``
+- animation: at a 1-minute step, every rendered per-minute animation frame
+  (positions, hover text, waiting counts) matches the preceding adaptive
+  keyframe; time-in-system labels match at the keyframes themselves
+- engines: the heap engine reproduces the SimPy model run for run -- the
+  same discharged and in-progress journey columns and resource statistics
+- queueing: on the default clinic, the analytic estimate (queueing.py) is
+  within QUEUEING_TOLERANCES of the mean KPIs of QUEUEING_REPLICATIONS runs
+
+Usage:
+    python benchmarks/check_model.py            # exit status 1 on a mismatch
+    python benchmarks/check_model.py --check engines
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flow_animation import frame_step
+from occupancy import occupancy_curves
+from queueing import estimate_clinic
+from realistic_patient_journey import run_realistic_simulation, ENGINES
+from replications import replication_kpis
+
+# (clinic config, mean minutes between arrivals, horizon in minutes)
+CONFIGURATIONS = [
+    ({'NUM_DOCTORS': 3, 'NUM_NURSES': 2, 'NUM_REGISTRATION_STAFF': 1, 'NUM_EXAM_ROOMS': 5}, 5.0, 120),
+    ({'NUM_DOCTORS': 3, 'NUM_NURSES': 2, 'NUM_REGISTRATION_STAFF': 1, 'NUM_EXAM_ROOMS': 5}, 3.0, 120),
+    ({'NUM_DOCTORS': 2, 'NUM_NURSES': 1, 'NUM_REGISTRATION_STAFF': 2, 'NUM_EXAM_ROOMS': 3}, 4.0, 480),
+    ({'NUM_DOCTORS': 5, 'NUM_NURSES': 3, 'NUM_REGISTRATION_STAFF': 1, 'NUM_EXAM_ROOMS': 8}, 2.5, 240)
+]
+SEEDS = [1, 42, 2024]
+
+# Occupancy curve name -> resource_statistics key
+CURVE_RESOURCES = {
+    'Registration': 'registration_staff',
+    'Nurses': 'nurses',
+    'Doctors': 'doctors',
+    'Exam Rooms': 'exam_rooms'
+}
+
+TOLERANCE = 1e-9
+
+def _runs(engines):
+    for (clinic_config, arrival_rate, duration), seed, engine in itertools.product(CONFIGURATIONS, SEEDS, engines):
+        label = (f"{engine} D{clinic_config['NUM_DOCTORS']} N{clinic_config['NUM_NURSES']} "
+                 f"R{clinic_config['NUM_EXAM_ROOMS']} every {arrival_rate:g}min {duration}min seed {seed}")
+        yield label, clinic_config, arrival_rate, duration, seed, engine
+
+def _simulate(clinic_config, arrival_rate, duration, seed, engine):
+    return run_realistic_simulation(clinic_config=clinic_config, simulation_duration=duration,
+                                    arrival_rate=arrival_rate, random_seed=seed, engine=engine)
+
+def check_occupancy(engines):
+    """Mismatches between occupancy curve averages and avg_in_use."""
+    failures = []
+    for label, clinic_config, arrival_rate, duration, seed, engine in _runs(engines):
+        results = _simulate(clinic_config, arrival_rate, duration, seed, engine)
+        curves = occupancy_curves(results['patient_journey_summary'], duration, results['in_progress_journeys'])
+        for name, key in CURVE_RESOURCES.items():
+            average = curves[name].average()
+            expected = results['resource_statistics'][key]['avg_in_use']
+            if not np.isclose(average, expected, rtol=TOLERANCE, atol=TOLERANCE):
+                failures.append(f"occupancy {label}: {name} curve {average:.6f} != avg_in_use {expected:.6f}")
+    return failures
+
+def _import_app():
+    """Import app.py without Streamlit's bare-mode warnings."""
+    logging.disable(logging.WARNING)
+    import app
+    return app
+
+def _same_trace(a, b, keys):
+    return all(np.array_equal(a[key], b[key]) if isinstance(a[key], np.ndarray) else a[key] == b[key]
+               for key in keys)
+
+def check_animation(engines):
+    """Per-minute frames whose rendered traces differ from the preceding keyframe."""
+    app = _import_app()
+    failures = []
+    for label, clinic_config, arrival_rate, duration, seed, engine in _runs(engines):
+        if frame_step(duration) != 1:
+            failures.append(f"animation {label}: horizon too long for a 1-minute step")
+            continue
+        journey_df = _simulate(clinic_config, arrival_rate, duration, seed, engine)['patient_journey_summary']
+        staffing = (clinic_config['NUM_EXAM_ROOMS'], clinic_config['NUM_DOCTORS'], clinic_config['NUM_NURSES'])
+        keyframes = app.create_animation_frames(journey_df, duration, *staffing)
+        minutes = app.create_animation_frames(journey_df, duration, *staffing, adaptive=False)
+        key_times = np.array([frame['time'] for frame in keyframes])
+        for frame in minutes:
+            keyframe = keyframes[np.searchsorted(key_times, frame['time'], side='right') - 1]
+            expected, actual = app._frame_trace_data(frame), app._frame_trace_data(keyframe)
+            # Labels count minutes in the system, so they only hold between keyframes
+            patient_keys = ['x', 'y', 'hovertext'] + (['text'] if keyframe['time'] == frame['time'] else [])
+            if not (_same_trace(expected[0], actual[0], patient_keys)
+                    and all(_same_trace(e, a, ['x', 'y', 'hovertext']) for e, a in zip(expected[1:3], actual[1:3]))
+                    and expected[3] == actual[3]):
+                failures.append(f"animation {label}: minute {frame['time']:g} differs from keyframe {keyframe['time']:g}")
+                break
+    return failures
+
+# Result entries that hold journey tables
+JOURNEY_TABLES = ['patient_journey_summary', 'in_progress_journeys']
+
+def check_engines(engines):
+    """Differences between each engine's results and the first engine's."""
+    failures = []
+    reference, *others = engines
+    if not others:
+        return [f"engines: need at least two engines, got {engines}"]
+    for label, clinic_config, arrival_rate, duration, seed, _ in _runs([reference]):
+        expected = _simulate(clinic_config, arrival_rate, duration, seed, reference)
+        for engine in others:
+            results = _simulate(clinic_config, arrival_rate, duration, seed, engine)
+            where = f"{engine} vs {label}"
+            for name in JOURNEY_TABLES:
+                try:
+                    pd.testing.assert_frame_equal(results[name].reset_index(drop=True),
+                                                  expected[name].reset_index(drop=True),
+                                                  check_exact=False, rtol=TOLERANCE, atol=TOLERANCE)
+                except AssertionError as error:
+                    failures.append(f"engines {where}: {name} differs: {str(error).splitlines()[0]}")
+            for key, statistics in expected['resource_statistics'].items():
+                actual = results['resource_statistics'].get(key, {})
+                for stat, value in statistics.items():
+                    if stat not in actual or not np.isclose(actual[stat], value, rtol=TOLERANCE, atol=TOLERANCE):
+                        failures.append(f"engines {where}: {key} {stat} {actual.get(stat)} != {value}")
+    return failures
+
+# Default clinic at (mean minutes between arrivals, horizon in minutes), all
+# below capacity; the default settings of app.py come first
+QUEUEING_SETTINGS = [(5.0, 120), (5.0, 480), (6.0, 120)]
+QUEUEING_REPLICATIONS = 40
+
+# KPI -> (tolerance, relative). Waits are loose: the default clinic runs
+# close to its room capacity, where they are most sensitive to the load
+QUEUEING_TOLERANCES = {
+    'avg_wait_time': (0.25, True),
+    'avg_total_time': (0.1, True),
+    'throughput_per_hour': (0.1, True),
+    'doctor_utilization': (0.05, False),
+    'room_utilization': (0.08, False)
+}
+
+def check_queueing(engines):
+    """Queueing estimates of the default clinic that are off the simulated mean KPIs."""
+    clinic_config = CONFIGURATIONS[0][0]
+    engine = 'heap' if 'heap' in engines else engines[0]
+    failures = []
+    for arrival_rate, duration in QUEUEING_SETTINGS:
+        runs = [replication_kpis(run_realistic_simulation(clinic_config=clinic_config, simulation_duration=duration,
+                                                          arrival_rate=arrival_rate, random_seed=seed,
+                                                          engine=engine, journey_table=False))
+                for seed in range(QUEUEING_REPLICATIONS)]
+        estimate = estimate_clinic(clinic_config, arrival_rate=arrival_rate, simulation_duration=duration)['kpis']
+        for name, (tolerance, relative) in QUEUEING_TOLERANCES.items():
+            simulated = float(np.mean([kpis[name] for kpis in runs]))
+            error = abs(estimate[name] - simulated)
+            if error > tolerance * (simulated if relative else 1.0):
+                failures.append(f"queueing every {arrival_rate:g}min {duration}min: {name} estimate "
+                                f"{estimate[name]:.3f} vs simulated {simulated:.3f}")
+    return failures
+
+CHECKS = {
+    'occupancy': check_occupancy,
+    'animation': check_animation,
+    'engines': check_engines,
+    'queueing': check_queueing
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--check', choices=sorted(CHECKS), action='append',
+                        help="run only this check (repeatable)")
+    parser.add_argument('--engine', choices=ENGINES, action='append', help="engines to run (default: all)")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    failed = False
+    for name in args.check or list(CHECKS):
+        failures = CHECKS[name](args.engine or list(ENGINES))
+        print(f"{name}: {'FAILED' if failures else 'ok'}")
+        for failure in failures:
+            print(f"  {failure}")
+        failed = failed or bool(failures)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""Heap Engine - Outpatient Clinic Simulation
+
+A specialized discrete-event engine for the fixed clinic pathway:
+
+    registration -> exam room (held) -> nurse -> doctor -> discharge
+
+Instead of SimPy generators and Resource request objects, it keeps a plain
+heap of (time, sequence, kind, patient) service completions plus the time
+of the next arrival, integer free-server counts, FIFO deques per stage and
+one Python list per journey column. It draws from the same ClinicInputs
+streams as the SimPy model, so both engines sample the same distributions
+(and, with the same seed, almost always the same paths).
+"""
+
+import heapq
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from input_streams import ClinicInputs
+from realistic_patient_journey import RealisticPatientJourney, JOURNEY_TIME_FIELDS
+from tracing import TraceSink
+
+# Kinds of heap event (arrivals are kept off the heap)
+REGISTRATION_END, NURSE_END, DOCTOR_END = 1, 2, 3
+
+# Resource name -> (config key, default capacity), mirroring ClinicModel
+RESOURCE_CAPACITIES = {
+    'doctors': ('NUM_DOCTORS', 3),
+    'nurses': ('NUM_NURSES', 2),
+    'registration_staff': ('NUM_REGISTRATION_STAFF', 1),
+    'lab_technicians': ('NUM_LAB_TECHNICIANS', 1),
+    'exam_rooms': ('NUM_EXAM_ROOMS', 4),
+    'lab_equipment': ('NUM_LAB_EQUIPMENT', 2),
+    'pharmacy_counter': ('NUM_PHARMACY_COUNTERS', 1)
+}
+
+_NAN = float('nan')
+
+# Journey rows are added in chunks, so arrivals do not append to every column
+ROW_CHUNK = 256
+
+class HeapClinicEngine:
+    """Event-heap simulation of the clinic pathway.
+
+    ``run(until)`` can be called repeatedly with increasing horizons; like
+    ``simpy.Environment.run`` it processes events strictly before ``until``.
+    Zero-delay transitions (a freed server taking the next patient, a
+    patient moving straight on to the next stage) are handled inline in the
+    event that causes them, in the same order SimPy resolves them.
+    An optional ``stats`` accumulator (kpi_stats.JourneyStats) receives
+    the timestamps of the patients discharged during each ``run`` call, in
+    one vectorized batch at its end rather than one call per discharge.
+    """
+
+    def __init__(self, clinic_config: Dict[str, Any], inputs: ClinicInputs,
+                 trace_sink: Optional[TraceSink] = None, stats=None):
+        self.config = clinic_config
+        self.inputs = inputs
+        self.trace_sink = trace_sink
+        self.stats = stats
+        self.now = 0.0
+
+        self.capacities = {
+            name: clinic_config.get(key, default) for name, (key, default) in RESOURCE_CAPACITIES.items()
+        }
+        # Free servers per stage; exam rooms are a heap of free room ids
+        self._free = {
+            'registration': self.capacities['registration_staff'],
+            'nurses': self.capacities['nurses'],
+            'doctors': self.capacities['doctors']
+        }
+        self._free_rooms = list(range(self.capacities['exam_rooms']))
+
+        self._registration_queue = deque()
+        self._room_queue = deque()
+        self._nurse_queue = deque()
+        self._doctor_queue = deque()
+
+        # Journey columns indexed by patient index (row 0 unused), with spare
+        # rows past the last arrival
+        self.columns = {field: [_NAN] * ROW_CHUNK for field in JOURNEY_TIME_FIELDS}
+        self.room_id = [-1] * ROW_CHUNK
+        self.discharge_order = []
+        self._stats_recorded = 0
+        self._arrays = None
+
+        self._heap = []
+        self._next_arrival = inputs.arrivals.draw()
+        self._sequence = 1
+        self._patient_count = 0
+
+    def run(self, until: float):
+        """Process all events strictly before ``until``."""
+        # Local aliases keep attribute lookups out of the hot loop
+        heap, push, pop = self._heap, heapq.heappush, heapq.heappop
+        free_rooms = self._free_rooms
+        registration_queue, room_queue = self._registration_queue, self._room_queue
+        nurse_queue, doctor_queue = self._nurse_queue, self._doctor_queue
+        inter_arrival = self.inputs.arrivals.draw
+        next_arrival = self._next_arrival
+        registration_time = self.inputs.registration.draw
+        nurse_time = self.inputs.nurse_visit.draw
+        doctor_time = self.inputs.doctor_visit.draw
+        columns = self.columns
+        arrival_time = columns['arrival_time']
+        registration_start = columns['registration_start']
+        registration_end = columns['registration_end']
+        exam_room_assigned = columns['exam_room_assigned']
+        nurse_start = columns['nurse_visit_start']
+        nurse_end = columns['nurse_visit_end']
+        doctor_start = columns['doctor_visit_start']
+        doctor_end = columns['doctor_visit_end']
+        departure = columns['departure_time']
+        room_of = self.room_id
+        discharge_order = self.discharge_order
+        trace = self.trace_sink
+        registration_free = self._free['registration']
+        nurses_free = self._free['nurses']
+        doctors_free = self._free['doctors']
+        sequence = self._sequence
+        patient_count = self._patient_count
+
+        while True:
+            # Arrivals are kept off the heap; the next one is just a time
+            if not heap or heap[0][0] >= next_arrival:
+                now = next_arrival
+                if now >= until:
+                    break
+                patient_count += 1
+                patient = patient_count
+                if patient == len(room_of):
+                    for column in columns.values():
+                        column.extend([_NAN] * ROW_CHUNK)
+                    room_of.extend([-1] * ROW_CHUNK)
+                arrival_time[patient] = now
+                if trace is not None:
+                    trace(now, 'arrival', patient, -1, _NAN)
+                if registration_free:
+                    registration_free -= 1
+                    registration_start[patient] = now
+                    sequence += 1
+                    push(heap, (now + registration_time(), sequence, REGISTRATION_END, patient))
+                    if trace is not None:
+                        trace(now, 'registration_start', patient, -1, _NAN)
+                else:
+                    registration_queue.append(patient)
+                next_arrival = now + inter_arrival()
+                continue
+
+            if heap[0][0] >= until:
+                break
+            now, _, kind, patient = pop(heap)
+            entering_room = -1
+
+            if kind == REGISTRATION_END:
+                registration_end[patient] = now
+                if trace is not None:
+                    trace(now, 'registration_complete', patient, -1, now - registration_start[patient])
+                    trace(now, 'exam_room_wait', patient, -1, _NAN)
+                if registration_queue:
+                    waiting = registration_queue.popleft()
+                    registration_start[waiting] = now
+                    sequence += 1
+                    push(heap, (now + registration_time(), sequence, REGISTRATION_END, waiting))
+                    if trace is not None:
+                        trace(now, 'registration_start', waiting, -1, _NAN)
+                else:
+                    registration_free += 1
+                if free_rooms:
+                    entering_room = patient
+                else:
+                    room_queue.append(patient)
+
+            elif kind == NURSE_END:
+                nurse_end[patient] = now
+                if trace is not None:
+                    trace(now, 'nurse_visit_complete', patient, room_of[patient], now - nurse_start[patient])
+                if nurse_queue:
+                    waiting = nurse_queue.popleft()
+                    nurse_start[waiting] = now
+                    sequence += 1
+                    push(heap, (now + nurse_time(), sequence, NURSE_END, waiting))
+                    if trace is not None:
+                        trace(now, 'nurse_visit_start', waiting, room_of[waiting], _NAN)
+                else:
+                    nurses_free += 1
+                if doctors_free:
+                    doctors_free -= 1
+                    doctor_start[patient] = now
+                    sequence += 1
+                    push(heap, (now + doctor_time(), sequence, DOCTOR_END, patient))
+                    if trace is not None:
+                        trace(now, 'doctor_visit_start', patient, room_of[patient], _NAN)
+                else:
+                    doctor_queue.append(patient)
+
+            else:  # DOCTOR_END, then discharge
+                doctor_end[patient] = now
+                if trace is not None:
+                    trace(now, 'doctor_visit_complete', patient, room_of[patient], now - doctor_start[patient])
+                if doctor_queue:
+                    waiting = doctor_queue.popleft()
+                    doctor_start[waiting] = now
+                    sequence += 1
+                    push(heap, (now + doctor_time(), sequence, DOCTOR_END, waiting))
+                    if trace is not None:
+                        trace(now, 'doctor_visit_start', waiting, room_of[waiting], _NAN)
+                else:
+                    doctors_free += 1
+                departure[patient] = now
+                discharge_order.append(patient)
+                if trace is not None:
+                    trace(now, 'discharge', patient, room_of[patient], _NAN)
+                heapq.heappush(free_rooms, room_of[patient])
+                if room_queue:
+                    entering_room = room_queue.popleft()
+
+            # A patient granted an exam room asks for a nurse straight away
+            if entering_room >= 0:
+                room = heapq.heappop(free_rooms)
+                room_of[entering_room] = room
+                exam_room_assigned[entering_room] = now
+                if trace is not None:
+                    trace(now, 'exam_room_assigned', entering_room, room, _NAN)
+                if nurses_free:
+                    nurses_free -= 1
+                    nurse_start[entering_room] = now
+                    sequence += 1
+                    push(heap, (now + nurse_time(), sequence, NURSE_END, entering_room))
+                    if trace is not None:
+                        trace(now, 'nurse_visit_start', entering_room, room, _NAN)
+                else:
+                    nurse_queue.append(entering_room)
+
+        self._free = {'registration': registration_free, 'nurses': nurses_free, 'doctors': doctors_free}
+        self._sequence = sequence
+        self._next_arrival = next_arrival
+        self._patient_count = patient_count
+        self.now = max(self.now, until)
+        self._arrays = None
+
+        if self.stats is not None and len(discharge_order) > self._stats_recorded:
+            column_arrays, order, _ = self.arrays()
+            discharged = order[self._stats_recorded:]
+            self.stats.record_columns({field: column[discharged] for field, column in column_arrays.items()})
+            self._stats_recorded = len(discharge_order)
+
+    def arrays(self):
+        """(journey columns, discharge order, room ids) as arrays over the arrived patients.
+
+        Built once per ``run`` call and shared by the journey view, the
+        resource statistics and the KPI accumulator.
+        """
+        if self._arrays is None:
+            rows = self._patient_count + 1
+            self._arrays = (
+                {field: np.array(values[:rows]) for field, values in self.columns.items()},
+                np.array(self.discharge_order, dtype=np.int32),
+                np.array(self.room_id[:rows], dtype=np.int16)
+            )
+        return self._arrays
+
+    def journey(self) -> RealisticPatientJourney:
+        """Journey tracker view of the recorded columns."""
+        columns, discharge_order, room_id = self.arrays()
+        return RealisticPatientJourney.from_columns(columns, room_id, discharge_order)
+
+    def get_resource_statistics(self) -> Dict[str, Dict[str, float]]:
+        """Time-weighted statistics matching MonitoredResource.get_statistics."""
+        return resource_statistics_from_columns(self.arrays()[0], self.capacities, self.now)
+
+def _interval_statistics(requests: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                         capacity: int, horizon: float) -> Dict[str, float]:
+    """Exact busy and queue integrals from per-patient request/start/end times.
+
+    Events are only recorded before ``horizon``, so unfinished intervals
+    (NaN start or end) are closed there; NaN requests never reached the stage.
+    """
+    requested = ~np.isnan(requests)
+    if horizon <= 0 or capacity <= 0 or not requested.any():
+        return {'utilization': 0.0, 'avg_in_use': 0.0, 'avg_queue_length': 0.0,
+                'max_utilization': 0.0, 'max_queue_length': 0, 'busy_time': 0.0}
+    queue_start, starts, ends = requests[requested], starts[requested], ends[requested]
+
+    busy = ~np.isnan(starts)
+    busy_start = starts[busy]
+    busy_end = ends[busy]
+    busy_end[np.isnan(busy_end)] = horizon
+    queue_end = np.where(busy, starts, horizon)
+
+    def peak(opens, closes):
+        # Zero-length intervals never raise the count, so only longer ones are sorted
+        longer = closes > opens
+        opens, closes = np.sort(opens[longer]), np.sort(closes[longer])
+        if len(opens) == 0:
+            return 0
+        # Count just after each open, releasing before granting at equal times as in SimPy
+        return int((np.arange(1, len(opens) + 1) - np.searchsorted(closes, opens, side='right')).max())
+
+    queued = queue_end > queue_start
+    busy_area = float((busy_end - busy_start).sum())
+    queue_area = float((queue_end - queue_start).sum())
+    return {
+        'utilization': busy_area / (capacity * horizon),
+        'avg_in_use': busy_area / horizon,
+        'avg_queue_length': queue_area / horizon,
+        # A request only queues while every server is busy
+        'max_utilization': 1.0 if queued.any() else peak(busy_start, busy_end) / capacity,
+        'max_queue_length': peak(queue_start, queue_end),
+        'busy_time': busy_area
+    }
+
+def resource_statistics_from_columns(columns: Dict[str, np.ndarray], capacities: Dict[str, int],
+                                     horizon: float) -> Dict[str, Dict[str, float]]:
+    """Per-resource statistics reconstructed from journey timestamp columns."""
+    stages = {
+        'registration_staff': ('arrival_time', 'registration_start', 'registration_end'),
+        'exam_rooms': ('registration_end', 'exam_room_assigned', 'departure_time'),
+        'nurses': ('exam_room_assigned', 'nurse_visit_start', 'nurse_visit_end'),
+        'doctors': ('nurse_visit_end', 'doctor_visit_start', 'doctor_visit_end')
+    }
+    empty = np.empty(0)
+    statistics = {}
+    for name, capacity in capacities.items():
+        request, start, end = (columns[field] for field in stages[name]) if name in stages else (empty,) * 3
+        statistics[name] = _interval_statistics(request, start, end, capacity, horizon)
+    return statistics
@@ -0,0 +1,282 @@
+"""Patient Flow Animation - Outpatient Clinic Simulation
+
+Frame data for the patient-flow animation, computed from the journey's
+interval arrays instead of re-filtering the journey DataFrame at every
+time point.
+
+Every patient state (unregistered or registered waiting, in an exam room,
+with a nurse or doctor) is an interval [start, end) of simulated time.
+``searchsorted`` maps each interval onto the range of frames it covers, and
+the resulting (frame, patient) pairs come out grouped by frame with patients
+in journey order. The cost grows with the number of patient-frames drawn,
+not with frames x patients.
+"""
+
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from realistic_patient_journey import JOURNEY_TIME_FIELDS
+
+# Patient marker kinds
+UNREGISTERED, REGISTERED, EXAM_ROOM = 0, 1, 2
+
+# Waiting area centres and marker grid (3 patients per row)
+WAITING_X = {UNREGISTERED: 1.5, REGISTERED: 2.5}
+WAITING_LOCATIONS = {UNREGISTERED: 'Unregistered Waiting', REGISTERED: 'Registered Waiting'}
+WAITING_Y = 2
+PER_ROW = 3
+
+# Idle staff are parked by the discharge area
+DISCHARGE_X, DISCHARGE_Y = 6.5, 2
+
+# Adaptive level of detail: frame budget and the grid steps (minutes) tried in order
+DEFAULT_MAX_FRAMES = 500
+FRAME_STEPS = [1, 2, 5, 10, 15, 30, 60, 120, 240, 360, 720, 1440]
+
+def room_positions(room_ids: np.ndarray):
+    """Vectorized exam room centres in the 2-column layout (rooms 0-4 left)."""
+    room_ids = np.asarray(room_ids)
+    left = room_ids < 5
+    x = np.where(left, 3.5, 4.5)
+    y = np.where(left, 3.5 - room_ids * 0.7, 3.5 - (room_ids - 5) * 0.7)
+    return x, y
+
+def frame_step(max_time: float, max_frames: int = DEFAULT_MAX_FRAMES) -> float:
+    """Finest grid step whose frames (plus the end point) fit in ``max_frames``."""
+    max_frames = max(int(max_frames), 3)
+    for step in FRAME_STEPS:
+        if math.floor(max_time / step) + 2 <= max_frames:
+            return step
+    return math.ceil(max_time / (max_frames - 2))
+
+def keyframe_times(journey_df: pd.DataFrame, max_time: float, max_frames: int = DEFAULT_MAX_FRAMES) -> np.ndarray:
+    """Frame times for the adaptive animation.
+
+    Every journey timestamp is snapped up to a grid whose step coarsens
+    with the horizon (see frame_step), and only grid points where the state
+    changed since the previous one become keyframes, plus the start and
+    ``max_time``. The result never exceeds ``max_frames`` frames.
+
+    At a 1-minute step, positions, hover text and waiting counts of every
+    per-minute frame equal those of the preceding keyframe. Time-in-system
+    labels are exact only at keyframes and hold in between, since they
+    change every minute while anyone is in the clinic.
+    """
+    step = frame_step(max_time, max_frames)
+    events = np.concatenate([journey_df[field].to_numpy(dtype=float) for field in JOURNEY_TIME_FIELDS])
+    events = events[(events >= 0) & (events <= max_time)]  # also drops NaN
+    snapped = np.minimum(np.ceil(events / step) * step, max_time)
+    return np.unique(np.concatenate([[0.0, float(max_time)], snapped]))
+
+def _column(journey_df: pd.DataFrame, name: str, missing: float) -> np.ndarray:
+    """Float column with NaN replaced by ``missing``."""
+    values = journey_df[name].to_numpy(dtype=float)
+    return np.where(np.isnan(values), missing, values)
+
+def _interval_frames(time_points: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    """(frame, row) pairs for every frame time t with start <= t < end.
+
+    Pairs are sorted by frame and, within a frame, by row. NaN starts never
+    match.
+    """
+    first = np.searchsorted(time_points, starts, side='left')
+    last = np.maximum(np.searchsorted(time_points, ends, side='left'), first)
+    counts = last - first
+    rows = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    frames = first[rows] + offsets
+    # Rows are generated in order, so a stable sort keeps them ordered per frame
+    order = np.argsort(frames, kind='stable')
+    return frames[order], rows[order]
+
+def _rank_in_frame(frames: np.ndarray) -> np.ndarray:
+    """Position of each pair within its frame (frames must be sorted)."""
+    return np.arange(len(frames)) - np.searchsorted(frames, frames, side='left')
+
+def _first_per_room(frames: np.ndarray, rooms: np.ndarray, num_rooms: int) -> np.ndarray:
+    """Indices of the first pair per (frame, room) among rooms below ``num_rooms``."""
+    candidates = np.flatnonzero((rooms >= 0) & (rooms < num_rooms))
+    _, first = np.unique(frames[candidates] * num_rooms + rooms[candidates], return_index=True)
+    return np.sort(candidates[first])
+
+def compute_frame_states(journey_df: pd.DataFrame, time_points: np.ndarray, num_rooms: int) -> Dict[str, Any]:
+    """Patient markers, staff positions and counts for every time point.
+
+    Returns per-frame count arrays and flat marker arrays (sorted by frame)
+    with the frame index of each marker.
+    """
+    time_points = np.asarray(time_points, dtype=float)
+    n_frames = len(time_points)
+    inf = np.inf
+
+    arrival = journey_df['arrival_time'].to_numpy(dtype=float)
+    departure = _column(journey_df, 'departure_time', inf)
+    registration_start = _column(journey_df, 'registration_start', inf)
+    registration_end = journey_df['registration_end'].to_numpy(dtype=float)
+    exam_room = journey_df['exam_room_assigned'].to_numpy(dtype=float)
+    exam_or_departure = np.minimum(_column(journey_df, 'exam_room_assigned', inf), departure)
+    rooms = journey_df['room_id'].to_numpy(dtype=np.int64)
+
+    # Waiting counts: not yet started registration, or registered and waiting for a room
+    frames, _ = _interval_frames(time_points, arrival, np.minimum(registration_start, departure))
+    unregistered_count = np.bincount(frames, minlength=n_frames)
+    registered_frames, registered_rows = _interval_frames(time_points, registration_end, exam_or_departure)
+    registered_count = np.bincount(registered_frames, minlength=n_frames)
+
+    # Patient markers: waiting until registration ends, then registered waiting, then in a room
+    unregistered_frames, unregistered_rows = _interval_frames(
+        time_points, arrival, np.minimum(_column(journey_df, 'registration_end', inf), exam_or_departure)
+    )
+    exam_frames, exam_rows = _interval_frames(time_points, exam_room, departure)
+    shown = _first_per_room(exam_frames, rooms[exam_rows], num_rooms)
+    exam_frames, exam_rows = exam_frames[shown], exam_rows[shown]
+
+    marker_frames = np.concatenate([unregistered_frames, registered_frames, exam_frames])
+    marker_rows = np.concatenate([unregistered_rows, registered_rows, exam_rows])
+    marker_kinds = np.concatenate([
+        np.full(len(unregistered_frames), UNREGISTERED, dtype=np.int8),
+        np.full(len(registered_frames), REGISTERED, dtype=np.int8),
+        np.full(len(exam_frames), EXAM_ROOM, dtype=np.int8)
+    ])
+    marker_slots = np.concatenate([
+        _rank_in_frame(unregistered_frames), _rank_in_frame(registered_frames), np.zeros(len(exam_frames), dtype=np.int64)
+    ])
+    order = np.lexsort((marker_rows, marker_frames))
+    marker_frames, marker_rows = marker_frames[order], marker_rows[order]
+    marker_kinds, marker_slots = marker_kinds[order], marker_slots[order]
+
+    # Waiting patients fill a grid in their area; room patients sit on their room
+    marker_rooms = rooms[marker_rows]
+    room_x, room_y = room_positions(np.where(marker_kinds == EXAM_ROOM, marker_rooms, 0))
+    in_room = marker_kinds == EXAM_ROOM
+    area_x = np.where(marker_kinds == REGISTERED, WAITING_X[REGISTERED], WAITING_X[UNREGISTERED])
+    waiting_x = area_x + (-0.2 + (marker_slots % PER_ROW) * 0.13)
+    waiting_y = WAITING_Y + (0.15 - (marker_slots // PER_ROW) * 0.1)
+    marker_x = np.where(in_room, room_x, waiting_x)
+    marker_y = np.where(in_room, room_y + 0.1, waiting_y)
+
+    # Staff: one registration nurse marker while anyone is being registered;
+    # a nurse or (if no nurse is there) a doctor marker on each busy room
+    frames, _ = _interval_frames(time_points, registration_start, _column(journey_df, 'registration_end', -inf))
+    registration_active = np.bincount(frames, minlength=n_frames) > 0
+
+    nurse_frames, nurse_rows = _interval_frames(
+        time_points, _column(journey_df, 'nurse_visit_start', inf), _column(journey_df, 'nurse_visit_end', -inf)
+    )
+    doctor_frames, doctor_rows = _interval_frames(
+        time_points, _column(journey_df, 'doctor_visit_start', inf), _column(journey_df, 'doctor_visit_end', -inf)
+    )
+    nurses_busy = np.bincount(nurse_frames, minlength=n_frames)
+    doctors_busy = np.bincount(doctor_frames, minlength=n_frames)
+
+    shown = _first_per_room(nurse_frames, rooms[nurse_rows], num_rooms)
+    nurse_frames, nurse_rows = nurse_frames[shown], nurse_rows[shown]
+    nurse_keys = nurse_frames * num_rooms + rooms[nurse_rows]
+    doctor_rooms = rooms[doctor_rows]
+    free_room = ~np.isin(doctor_frames * num_rooms + doctor_rooms, nurse_keys)
+    doctor_frames, doctor_rows = doctor_frames[free_room], doctor_rows[free_room]
+    shown = _first_per_room(doctor_frames, rooms[doctor_rows], num_rooms)
+    doctor_frames, doctor_rows = doctor_frames[shown], doctor_rows[shown]
+
+    return {
+        'time_points': time_points,
+        'unregistered_count': unregistered_count,
+        'registered_count': registered_count,
+        'registration_active': registration_active,
+        'nurses_busy': nurses_busy,
+        'doctors_busy': doctors_busy,
+        'patient_id': journey_df['patient_id'].to_numpy(),
+        'arrival_time': arrival,
+        'markers': {
+            'frame': marker_frames,
+            'row': marker_rows,
+            'kind': marker_kinds,
+            'room': marker_rooms,
+            'x': marker_x,
+            'y': marker_y
+        },
+        'nurses': {'frame': nurse_frames, 'room': rooms[nurse_rows]},
+        'doctors': {'frame': doctor_frames, 'room': rooms[doctor_rows]}
+    }
+
+def _frame_slices(frames: np.ndarray, n_frames: int) -> np.ndarray:
+    """Boundaries of each frame's run in a frame-sorted array."""
+    return np.searchsorted(frames, np.arange(n_frames + 1), side='left')
+
+def _available_staff(staff, count, staff_type, y_sign):
+    """Idle staff in rows of three above (doctors) or below (nurses) the discharge area."""
+    for i in range(count):
+        row, col = divmod(i, 3)
+        staff.append({
+            'staff_type': f'Available {staff_type} {i+1}',
+            'x': DISCHARGE_X + col * 0.2,
+            'y': DISCHARGE_Y + y_sign * 0.4 + y_sign * row * 0.2
+        })
+
+def frames_from_states(states: Dict[str, Any], num_doctors: int = 3, num_nurses: int = 2) -> List[Dict[str, Any]]:
+    """Expand frame states into the per-frame dicts used by create_animated_figure.
+
+    Each frame has its time, patient markers (with a time-in-system label),
+    staff markers and the two waiting-area counts. Marker colours and sizes
+    are fixed per trace by create_animated_figure.
+    """
+    time_points = states['time_points']
+    n_frames = len(time_points)
+    markers = states['markers']
+    patient_ids = states['patient_id'].tolist()
+    arrival = states['arrival_time'].tolist()
+
+    marker_bounds = _frame_slices(markers['frame'], n_frames).tolist()
+    rows, kinds, rooms = markers['row'].tolist(), markers['kind'].tolist(), markers['room'].tolist()
+    xs, ys = markers['x'].tolist(), markers['y'].tolist()
+
+    nurse_bounds = _frame_slices(states['nurses']['frame'], n_frames).tolist()
+    nurse_x, nurse_y = (v.tolist() for v in room_positions(states['nurses']['room']))
+    nurse_rooms = states['nurses']['room'].tolist()
+    doctor_bounds = _frame_slices(states['doctors']['frame'], n_frames).tolist()
+    doctor_x, doctor_y = (v.tolist() for v in room_positions(states['doctors']['room']))
+    doctor_rooms = states['doctors']['room'].tolist()
+
+    unregistered_count = states['unregistered_count'].tolist()
+    registered_count = states['registered_count'].tolist()
+    registration_active = states['registration_active'].tolist()
+    nurses_busy = states['nurses_busy'].tolist()
+    doctors_busy = states['doctors_busy'].tolist()
+
+    animation_frames = []
+    for k, time_point in enumerate(time_points.tolist()):
+        patients = []
+        staff = []
+
+        for m in range(marker_bounds[k], marker_bounds[k + 1]):
+            row, kind = rows[m], kinds[m]
+            in_room = kind == EXAM_ROOM
+            patients.append({
+                'patient_id': patient_ids[row],
+                'x': xs[m],
+                'y': ys[m],
+                'location': f'Exam Room {rooms[m]}' if in_room else WAITING_LOCATIONS[kind],
+                'label': f'{time_point - arrival[row]:.0f}m'  # Total time in system
+            })
+
+        if registration_active[k]:
+            staff.append({'staff_type': 'Registration Nurse', 'x': 1.5, 'y': 2.2})
+        for s in range(nurse_bounds[k], nurse_bounds[k + 1]):
+            staff.append({'staff_type': f'Nurse (Room {nurse_rooms[s]})', 'x': nurse_x[s] - 0.15,
+                          'y': nurse_y[s] + 0.05})
+        for s in range(doctor_bounds[k], doctor_bounds[k + 1]):
+            staff.append({'staff_type': f'Doctor (Room {doctor_rooms[s]})', 'x': doctor_x[s] + 0.15,
+                          'y': doctor_y[s] + 0.05})
+        _available_staff(staff, num_doctors - doctors_busy[k], 'Doctor', 1)
+        _available_staff(staff, num_nurses - nurses_busy[k], 'Nurse', -1)
+
+        animation_frames.append({
+            'time': time_point,
+            'patients': patients,
+            'staff': staff,
+            'waiting_counts': {'unregistered': unregistered_count[k], 'registered': registered_count[k]}
+        })
+    return animation_frames
@@ -0,0 +1,297 @@
+"""Streaming KPI Statistics - Outpatient Clinic Simulation
+
+Online accumulators for per-patient times, updated at each discharge:
+
+- RunningStats: Welford count, mean, variance, min and max
+- QuantileSketch: log-bucketed quantile sketch (DDSketch-style) with a fixed
+  relative accuracy; merging two sketches adds their bucket counts, so a
+  merged sketch is identical to one built from the pooled values
+- JourneyStats: one of each per journey metric, fed with a discharged
+  patient's timestamps
+
+Memory depends on the number of sketch buckets (logarithmic in the value
+range), not on the number of patients, so long runs and replication batches
+get full KPI sets without keeping per-patient tables.
+"""
+
+import math
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from realistic_patient_journey import JOURNEY_TIME_FIELDS
+
+DEFAULT_RELATIVE_ACCURACY = 0.005
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# Values at or below this go to the sketch's zero bucket (e.g. no wait)
+MIN_POSITIVE_VALUE = 1e-9
+
+# Metric -> (from field, to field) in JOURNEY_TIME_FIELDS
+JOURNEY_METRICS = {
+    'waiting_time': ('arrival_time', 'exam_room_assigned'),
+    'total_time': ('arrival_time', 'departure_time'),
+    'registration_wait': ('arrival_time', 'registration_start'),
+    'registration_time': ('registration_start', 'registration_end'),
+    'exam_room_wait': ('registration_end', 'exam_room_assigned'),
+    'nurse_wait': ('exam_room_assigned', 'nurse_visit_start'),
+    'nurse_visit_time': ('nurse_visit_start', 'nurse_visit_end'),
+    'doctor_wait': ('nurse_visit_end', 'doctor_visit_start'),
+    'doctor_visit_time': ('doctor_visit_start', 'doctor_visit_end')
+}
+
+class RunningStats:
+    """Welford accumulator for count, mean, variance, min and max."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_batch(self, values: np.ndarray):
+        """Add many values at once (Chan et al. pairwise update)."""
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        mean = float(values.mean())
+        self.merge_moments(len(values), mean, float(((values - mean) ** 2).sum()),
+                           float(values.min()), float(values.max()))
+
+    def merge(self, other: 'RunningStats'):
+        """Combine with another accumulator, as if its values were added here."""
+        self.merge_moments(other.count, other.mean, other.m2, other.min, other.max)
+
+    def merge_moments(self, count: int, mean: float, m2: float, minimum: float, maximum: float):
+        """Combine with the moments of a group of ``count`` values."""
+        if count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2, self.min, self.max = count, mean, m2, minimum, maximum
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (ddof=1); NaN below two values."""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative accuracy ``relative_accuracy``.
+
+    A positive value x is counted in bucket ceil(log_gamma(x)) with
+    gamma = (1 + a) / (1 - a); every quantile estimate is then within a
+    factor (1 +- a) of a true sample quantile. Values at or below
+    MIN_POSITIVE_VALUE are counted as zero. Bucket counts are a dense array
+    starting at bucket ``offset``, grown as new values arrive.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+
+    def _cover(self, low: int, high: int):
+        """Grow the bucket array to include buckets low..high."""
+        if len(self.counts) == 0:
+            self.offset, self.counts = low, np.zeros(high - low + 1, dtype=np.int64)
+            return
+        start, end = min(low, self.offset), max(high, self.offset + len(self.counts) - 1)
+        if start < self.offset or end >= self.offset + len(self.counts):
+            counts = np.zeros(end - start + 1, dtype=np.int64)
+            counts[self.offset - start:self.offset - start + len(self.counts)] = self.counts
+            self.offset, self.counts = start, counts
+
+    def add(self, value: float):
+        self.add_batch([value])
+
+    def add_batch(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        positive = values[values > MIN_POSITIVE_VALUE]
+        self.add_keys(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), len(values) - len(positive))
+
+    def add_keys(self, keys: np.ndarray, zero_count: int = 0):
+        """Count values already mapped to bucket keys, plus ``zero_count`` zeros."""
+        self.count += len(keys) + zero_count
+        self.zero_count += zero_count
+        if len(keys) == 0:
+            return
+        low, high = int(keys.min()), int(keys.max())
+        self._cover(low, high)
+        self.counts[low - self.offset:high - self.offset + 1] += np.bincount(keys - low)
+
+    def merge(self, other: 'QuantileSketch'):
+        """Add another sketch's counts; both must use the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        if len(other.counts):
+            self._cover(other.offset, other.offset + len(other.counts) - 1)
+            start = other.offset - self.offset
+            self.counts[start:start + len(other.counts)] += other.counts
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    @property
+    def buckets(self) -> Dict[int, int]:
+        """Non-empty buckets as {bucket key: count}."""
+        nonzero = np.flatnonzero(self.counts)
+        return dict(zip((nonzero + self.offset).tolist(), self.counts[nonzero].tolist()))
+
+    def quantile(self, q: float) -> float:
+        """Estimate of the q-quantile (lower nearest-rank); NaN when empty."""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        if self.count == 0:
+            return [math.nan] * len(qs)
+        cumulative = self.zero_count + np.cumsum(self.counts)
+        estimates = []
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError("quantiles must be between 0 and 1")
+            rank = q * (self.count - 1)
+            if rank < self.zero_count:
+                estimates.append(0.0)
+                continue
+            key = self.offset + int(np.searchsorted(cumulative, rank, side='right'))
+            # Midpoint (in relative terms) of bucket (gamma^(k-1), gamma^k]
+            estimates.append(float(2 * self.gamma ** key / (self.gamma + 1)))
+        return estimates
+
+class JourneyStats:
+    """Streaming statistics for every JOURNEY_METRICS entry.
+
+    ``record`` takes one discharged patient's timestamps (in
+    JOURNEY_TIME_FIELDS order). Rows are buffered and folded into the
+    accumulators ``buffer_size`` at a time with vectorized updates, which
+    keeps the per-discharge cost to a list append; reads flush the buffer
+    first, so results never lag behind the recorded patients.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, buffer_size: int = 512):
+        self.relative_accuracy = relative_accuracy
+        self.buffer_size = max(1, int(buffer_size))
+        self.moments = {name: RunningStats() for name in JOURNEY_METRICS}
+        self.sketches = {name: QuantileSketch(relative_accuracy) for name in JOURNEY_METRICS}
+        self._buffer: List[Sequence[float]] = []
+        index = {field: i for i, field in enumerate(JOURNEY_TIME_FIELDS)}
+        self._starts = [index[start] for start, _ in JOURNEY_METRICS.values()]
+        self._ends = [index[end] for _, end in JOURNEY_METRICS.values()]
+
+    def record(self, times: Sequence[float]):
+        """Record a discharged patient's timestamps."""
+        self._buffer.append(times)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def record_columns(self, columns: Dict[str, np.ndarray]):
+        """Record many patients from per-field timestamp arrays."""
+        self.flush()
+        self._fold(np.column_stack([np.asarray(columns[field], dtype=float) for field in JOURNEY_TIME_FIELDS]))
+
+    def flush(self):
+        if self._buffer:
+            rows = np.array(self._buffer, dtype=float)
+            self._buffer = []
+            self._fold(rows)
+
+    def _fold(self, rows: np.ndarray):
+        """Add a (patients x fields) block, all metrics at once."""
+        if len(rows) == 0:
+            return
+        values = rows[:, self._ends] - rows[:, self._starts]
+        means = values.mean(axis=0)
+        m2s = ((values - means) ** 2).sum(axis=0)
+        minima, maxima = values.min(axis=0), values.max(axis=0)
+        positive = values > MIN_POSITIVE_VALUE
+        keys = np.ceil(np.log(np.where(positive, values, 1.0)) / self.sketches['total_time']._log_gamma)
+        keys = keys.astype(np.int64)
+        zero_counts = len(rows) - positive.sum(axis=0)
+        for j, name in enumerate(JOURNEY_METRICS):
+            self.moments[name].merge_moments(len(rows), float(means[j]), float(m2s[j]),
+                                             float(minima[j]), float(maxima[j]))
+            self.sketches[name].add_keys(keys[positive[:, j], j], int(zero_counts[j]))
+
+    def merge(self, other: 'JourneyStats'):
+        """Pool another run's statistics into this one."""
+        self.flush()
+        other.flush()
+        for name in JOURNEY_METRICS:
+            self.moments[name].merge(other.moments[name])
+            self.sketches[name].merge(other.sketches[name])
+
+    def copy(self) -> 'JourneyStats':
+        """Independent snapshot, much cheaper than copy.deepcopy."""
+        snapshot = JourneyStats(self.relative_accuracy, self.buffer_size)
+        snapshot.merge(self)
+        return snapshot
+
+    @classmethod
+    def merged(cls, parts: Iterable['JourneyStats']) -> 'JourneyStats':
+        parts = list(parts)
+        pooled = cls(parts[0].relative_accuracy if parts else DEFAULT_RELATIVE_ACCURACY)
+        for part in parts:
+            pooled.merge(part)
+        return pooled
+
+    @property
+    def count(self) -> int:
+        self.flush()
+        return self.moments['total_time'].count
+
+    def summary(self, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Dict[str, float]]:
+        """Metric -> count, mean, std, min, max and p<q> estimates."""
+        self.flush()
+        summary = {}
+        for name in JOURNEY_METRICS:
+            moments = self.moments[name]
+            row = {
+                'count': moments.count,
+                'mean': moments.mean if moments.count else math.nan,
+                'std': moments.std,
+                'min': moments.min if moments.count else math.nan,
+                'max': moments.max if moments.count else math.nan
+            }
+            for q, value in zip(quantiles, self.sketches[name].quantiles(quantiles)):
+                # Sketch estimates can overshoot the observed range slightly
+                row[f"p{q * 100:g}"] = min(max(value, row['min']), row['max']) if moments.count else value
+            summary[name] = row
+        return summary
+
+    def state(self) -> Dict[str, object]:
+        """Plain-data view of the accumulators (for hashing and display)."""
+        self.flush()
+        return {
+            name: {
+                'moments': (self.moments[name].count, self.moments[name].mean, self.moments[name].m2,
+                            self.moments[name].min, self.moments[name].max),
+                'zero_count': self.sketches[name].zero_count,
+                'buckets': sorted(self.sketches[name].buckets.items())
+            }
+            for name in JOURNEY_METRICS
+        }
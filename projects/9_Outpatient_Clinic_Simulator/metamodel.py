@@ -0,0 +1,279 @@
+"""KPI Metamodel - Outpatient Clinic Simulation
+
+Instant KPI predictions for settings that have not been simulated yet,
+learned from the runs that have been:
+
+- RunHistory: append-only JSON-lines log of (settings -> KPIs), one line per
+  simulated run or replication, kept next to the result cache so every app
+  process adds to and learns from the same history
+- KPIMetamodel: Gaussian-process regression from the settings to each KPI,
+  with an uncertainty band. All KPIs share one kernel over the same inputs,
+  so one inverse kernel matrix serves them all; each new observation
+  updates it with a block (Schur complement) update in O(n^2), and the
+  kernel hyperparameters are re-selected by marginal likelihood whenever
+  the number of observations doubles.
+
+Inputs are offered loads (mean service time over arrival interval times
+servers) per stage, the log server counts, arrival interval and horizon; queueing
+KPIs are smooth in these, unlike in the raw slider values. Time KPIs are
+modelled on a log scale, so their bands are skewed like waits are.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from statistics import NormalDist
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from realistic_patient_journey import MODEL_VERSION
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = 'history.jsonl'
+
+# KPIs the metamodel predicts, and those modelled as log(1 + value)
+PREVIEW_KPIS = ['avg_wait_time', 'p90_wait_time', 'avg_total_time', 'throughput_per_hour', 'doctor_utilization']
+LOG_KPIS = {'avg_wait_time', 'p90_wait_time', 'avg_total_time'}
+
+# Settings recorded for each run
+SETTINGS = ['NUM_DOCTORS', 'NUM_NURSES', 'NUM_EXAM_ROOMS', 'NUM_REGISTRATION_STAFF',
+            'registration_time', 'nurse_time', 'doctor_time', 'arrival_rate', 'duration']
+
+# Kernel length scale of each input before the fitted multiplier:
+# four offered loads, four log2 server counts, log2 arrival interval and horizon
+BASE_LENGTH_SCALES = np.array([0.25, 0.25, 0.25, 0.25, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0])
+
+# Hyperparameter grid searched at each refit, and the points used for it
+LENGTH_SCALE_MULTIPLIERS = (0.5, 1.0, 2.0, 4.0, 8.0)
+NOISE_VARIANCES = (0.01, 0.05, 0.2, 0.5)
+FIT_SAMPLE_SIZE = 300
+
+MIN_OBSERVATIONS = 5
+# Batches up to this size (or a quarter of the data) are added one by one
+INCREMENTAL_BATCH = 16
+DEFAULT_MAX_OBSERVATIONS = 1000
+
+def run_settings(clinic_config: Dict[str, Any], service_time_config: Dict[str, Dict[str, float]],
+                 arrival_rate: float, duration: float) -> Dict[str, float]:
+    """The settings the metamodel learns from, as a flat dict."""
+    return {
+        **{key: float(clinic_config[key]) for key in SETTINGS[:4]},
+        'registration_time': float(service_time_config['registration']['mean']),
+        'nurse_time': float(service_time_config['nurse_visit']['mean']),
+        'doctor_time': float(service_time_config['doctor_visit']['mean']),
+        'arrival_rate': float(arrival_rate),
+        'duration': float(duration)
+    }
+
+def settings_features(settings: Dict[str, float]) -> np.ndarray:
+    """Model inputs for one set of run settings."""
+    interval = max(settings['arrival_rate'], 1e-9)
+    doctors, nurses = settings['NUM_DOCTORS'], settings['NUM_NURSES']
+    rooms, registration = settings['NUM_EXAM_ROOMS'], settings['NUM_REGISTRATION_STAFF']
+    return np.array([
+        settings['registration_time'] / (interval * registration),
+        settings['nurse_time'] / (interval * nurses),
+        settings['doctor_time'] / (interval * doctors),
+        # A room is held through the nurse and the doctor visit
+        (settings['nurse_time'] + settings['doctor_time']) / (interval * rooms),
+        math.log2(registration), math.log2(nurses), math.log2(doctors), math.log2(rooms),
+        math.log2(interval),
+        math.log2(max(settings['duration'], 1.0) / 60.0)
+    ])
+
+class RunHistory:
+    """Append-only JSON-lines file of observed (settings, KPIs).
+
+    Lines are appended with single O_APPEND writes, so concurrent writers
+    in other processes never interleave within a line; ``read_new`` returns
+    the complete lines added since its previous call, each to one caller
+    only, even across threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offset = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def append(self, settings: Dict[str, float], kpi_rows: Iterable[Dict[str, float]]):
+        """Record one line per KPI row (e.g. per replication) for ``settings``."""
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except OSError as e:
+            logger.warning(f"Could not open run history {self.path}: {e}")
+            return
+        try:
+            for kpis in kpi_rows:
+                record = {'model_version': MODEL_VERSION, 'settings': settings,
+                          'kpis': {name: float(kpis[name]) for name in PREVIEW_KPIS}}
+                os.write(fd, (json.dumps(record, allow_nan=False) + '\n').encode())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not append to run history {self.path}: {e}")
+        finally:
+            os.close(fd)
+
+    def read_new(self) -> List[Dict[str, Any]]:
+        """Records appended since the last call (all of them on the first)."""
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size < self._offset:
+                        self._offset = 0  # Replaced or truncated
+                    f.seek(self._offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return []
+            # Leave a line still being written for next time
+            complete = data[:data.rfind(b'\n') + 1]
+            self._offset += len(complete)
+        records = []
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('model_version') == MODEL_VERSION:
+                records.append(record)
+        return records
+
+class KPIMetamodel:
+    """Gaussian-process metamodel of PREVIEW_KPIS over run settings.
+
+    ``refresh`` pulls new observations from ``history``; ``predict`` gives
+    each KPI's expected value for a single run with a band covering
+    ``band`` of run outcomes. Thread-safe, so one instance can serve a
+    whole app process.
+    """
+
+    def __init__(self, history: Optional[RunHistory] = None, max_observations: int = DEFAULT_MAX_OBSERVATIONS):
+        self.history = history
+        self.max_observations = max_observations
+        self._lock = threading.Lock()
+        self._X = np.empty((0, len(BASE_LENGTH_SCALES)))
+        self._Y = np.empty((0, len(PREVIEW_KPIS)))
+        self._K_inv = np.empty((0, 0))
+        self._fitted_size = 0
+        self.length_scales = BASE_LENGTH_SCALES.copy()
+        self.noise_variance = NOISE_VARIANCES[1]
+        self._y_mean = np.zeros(len(PREVIEW_KPIS))
+        self._y_std = np.ones(len(PREVIEW_KPIS))
+
+    @property
+    def count(self) -> int:
+        return len(self._X)
+
+    def _kernel(self, A: np.ndarray, B: np.ndarray, length_scales: np.ndarray) -> np.ndarray:
+        diff = (A[:, None, :] - B[None, :, :]) / length_scales
+        return np.exp(-0.5 * (diff ** 2).sum(axis=2))
+
+    @staticmethod
+    def _transform(kpis: Dict[str, float]) -> np.ndarray:
+        return np.array([math.log1p(max(kpis[name], 0.0)) if name in LOG_KPIS else kpis[name]
+                         for name in PREVIEW_KPIS])
+
+    def refresh(self) -> int:
+        """Add observations that reached the history since the last refresh."""
+        if self.history is None:
+            return 0
+        records = self.history.read_new()
+        self.add_many((record['settings'], record['kpis']) for record in records)
+        return len(records)
+
+    def add(self, settings: Dict[str, float], kpis: Dict[str, float]):
+        self.add_many([(settings, kpis)])
+
+    def add_many(self, observations: Iterable):
+        """Add (settings, KPIs) pairs; a large batch is folded in with one refit."""
+        observations = list(observations)
+        with self._lock:
+            if len(observations) > max(INCREMENTAL_BATCH, self.count // 4):
+                X = np.array([settings_features(settings) for settings, _ in observations])
+                Y = np.array([self._transform(kpis) for _, kpis in observations])
+                self._X = np.vstack([self._X, X])[-self.max_observations:]
+                self._Y = np.vstack([self._Y, Y])[-self.max_observations:]
+                self._refit()
+                return
+            for settings, kpis in observations:
+                self._add(settings_features(settings), self._transform(kpis))
+
+    def _add(self, x: np.ndarray, y: np.ndarray):
+        self._X = np.vstack([self._X, x])
+        self._Y = np.vstack([self._Y, y])
+        n = len(self._X)
+        if n > self.max_observations:
+            # Forget the oldest quarter and refit on the rest
+            keep = self.max_observations * 3 // 4
+            self._X, self._Y = self._X[-keep:], self._Y[-keep:]
+            self._refit()
+        elif n >= max(2 * self._fitted_size, 2):
+            self._refit()
+        else:
+            # Block update of the inverse with the new row and column
+            k = self._kernel(self._X[:-1], x[None, :], self.length_scales)[:, 0]
+            b = self._K_inv @ k
+            s = 1.0 + self.noise_variance - k @ b
+            if s <= 1e-12:
+                self._refit()
+                return
+            self._K_inv = np.block([
+                [self._K_inv + np.outer(b, b) / s, -b[:, None] / s],
+                [-b[None, :] / s, np.array([[1.0 / s]])]
+            ])
+
+    def _log_likelihood(self, X: np.ndarray, Y: np.ndarray, length_scales: np.ndarray, noise: float) -> float:
+        K = self._kernel(X, X, length_scales) + noise * np.eye(len(X))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return -math.inf
+        alpha = np.linalg.solve(L, Y)
+        return float(-0.5 * (alpha ** 2).sum() - Y.shape[1] * np.log(np.diag(L)).sum())
+
+    def _refit(self):
+        """Re-standardize targets, select hyperparameters and rebuild the inverse."""
+        self._y_mean = self._Y.mean(axis=0)
+        self._y_std = np.where(self._Y.std(axis=0) > 1e-9, self._Y.std(axis=0), 1.0)
+        Y = (self._Y - self._y_mean) / self._y_std
+        sample = np.linspace(0, len(self._X) - 1, min(len(self._X), FIT_SAMPLE_SIZE)).astype(int)
+        best = max(
+            ((multiplier, noise) for multiplier in LENGTH_SCALE_MULTIPLIERS for noise in NOISE_VARIANCES),
+            key=lambda params: self._log_likelihood(self._X[sample], Y[sample],
+                                                    BASE_LENGTH_SCALES * params[0], params[1])
+        )
+        self.length_scales = BASE_LENGTH_SCALES * best[0]
+        self.noise_variance = best[1]
+        K = self._kernel(self._X, self._X, self.length_scales) + self.noise_variance * np.eye(len(self._X))
+        self._K_inv = np.linalg.inv(K)
+        self._fitted_size = len(self._X)
+
+    def predict(self, settings: Dict[str, float], band: float = 0.9) -> Optional[Dict[str, Dict[str, float]]]:
+        """KPI -> mean, lower, upper for one run, or None below MIN_OBSERVATIONS."""
+        with self._lock:
+            if self.count < MIN_OBSERVATIONS:
+                return None
+            x = settings_features(settings)[None, :]
+            k = self._kernel(self._X, x, self.length_scales)[:, 0]
+            weights = self._K_inv @ k
+            Y = (self._Y - self._y_mean) / self._y_std
+            mean = weights @ Y * self._y_std + self._y_mean
+            variance = max(1.0 + self.noise_variance - k @ weights, self.noise_variance)
+            std = math.sqrt(variance) * self._y_std
+
+        z = NormalDist().inv_cdf((1 + band) / 2)
+        prediction = {}
+        for j, name in enumerate(PREVIEW_KPIS):
+            low, mid, high = (float(v) for v in (mean[j] - z * std[j], mean[j], mean[j] + z * std[j]))
+            if name in LOG_KPIS:
+                low, mid, high = (math.expm1(v) for v in (low, mid, high))
+            floor, ceiling = 0.0, 1.0 if name.endswith('utilization') else math.inf
+            prediction[name] = {
+                'mean': min(max(mid, floor), ceiling),
+                'lower': min(max(low, floor), ceiling),
+                'upper': min(max(high, floor), ceiling)
+            }
+        return prediction
@@ -0,0 +1,119 @@
+"""Occupancy Curves - Outpatient Clinic Simulation
+
+Exact resource occupancy from journey timestamps.
+
+Each resource's busy periods are [start, end) intervals in the journey data.
+Sorting the +1/-1 events and taking a cumulative sum gives the occupancy as
+an exact right-continuous step function; its running integral gives exact
+time averages over any window. Charts at any resolution are then a
+``searchsorted`` resample of the same curve.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Chart name -> (start column, end column) of the periods a unit is busy
+RESOURCE_INTERVALS = {
+    'Registration': ('registration_start', 'registration_end'),
+    'Nurses': ('nurse_visit_start', 'nurse_visit_end'),
+    'Doctors': ('doctor_visit_start', 'doctor_visit_end'),
+    'Exam Rooms': ('exam_room_assigned', 'departure_time')
+}
+
+class OccupancyCurve:
+    """Step function: ``levels[i]`` units are busy on [times[i], times[i+1]).
+
+    ``times`` starts at 0 with level 0 and the last level holds up to the
+    horizon.
+    """
+
+    def __init__(self, times: np.ndarray, levels: np.ndarray, horizon: float):
+        self.times = times
+        self.levels = levels
+        self.horizon = horizon
+        # Area under the curve up to each breakpoint
+        self._area = np.concatenate([[0.0], np.cumsum(levels[:-1] * np.diff(times))])
+
+    @classmethod
+    def from_intervals(cls, starts: np.ndarray, ends: np.ndarray, horizon: float) -> 'OccupancyCurve':
+        """Build the curve from busy intervals.
+
+        Intervals without a start are ignored and intervals without an end
+        stay open until ``horizon``. At equal times releases are applied
+        before new starts, so back-to-back hand-offs do not overlap.
+        """
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        started = ~np.isnan(starts)
+        starts = np.clip(starts[started], 0.0, horizon)
+        ends = np.clip(np.where(np.isnan(ends[started]), horizon, ends[started]), 0.0, horizon)
+
+        times = np.concatenate([starts, ends])
+        deltas = np.concatenate([np.ones(len(starts)), -np.ones(len(ends))])
+        order = np.lexsort((deltas, times))
+        times, levels = times[order], np.cumsum(deltas[order])
+
+        # Keep the level after the last event at each distinct time
+        last = np.flatnonzero(np.append(np.diff(times) > 0, True)) if len(times) else np.empty(0, dtype=int)
+        times = np.concatenate([[0.0], times[last]])
+        levels = np.concatenate([[0.0], levels[last]])
+        if len(times) > 1 and times[1] == 0.0:
+            times, levels = times[1:], levels[1:]
+        return cls(times, levels, float(horizon))
+
+    def at(self, t) -> np.ndarray:
+        """Occupancy at each time in ``t``."""
+        index = np.searchsorted(self.times, np.asarray(t, dtype=float), side='right') - 1
+        return self.levels[np.maximum(index, 0)]
+
+    def area(self, t) -> np.ndarray:
+        """Busy unit-minutes accumulated from 0 up to each time in ``t``."""
+        t = np.asarray(t, dtype=float)
+        index = np.maximum(np.searchsorted(self.times, t, side='right') - 1, 0)
+        return self._area[index] + self.levels[index] * (t - self.times[index])
+
+    def average(self, start: float = 0.0, end: float = None) -> float:
+        """Exact time-averaged occupancy over [start, end)."""
+        end = self.horizon if end is None else end
+        if end <= start:
+            return 0.0
+        a0, a1 = self.area([start, end])
+        return float((a1 - a0) / (end - start))
+
+    def bin_averages(self, edges: np.ndarray) -> np.ndarray:
+        """Exact average occupancy over each [edges[k], edges[k+1])."""
+        edges = np.asarray(edges, dtype=float)
+        return np.diff(self.area(edges)) / np.diff(edges)
+
+def occupancy_curves(journey_df: pd.DataFrame, horizon: float,
+                     in_progress: Optional[pd.DataFrame] = None) -> Dict[str, OccupancyCurve]:
+    """Occupancy curve per resource from a journey DataFrame.
+
+    Discharged journeys alone miss whoever is still in service at the
+    horizon; pass those journeys as ``in_progress`` (their unfinished
+    intervals stay open until ``horizon``) for curves whose averages equal
+    the resources' time-weighted ``avg_in_use``.
+    """
+    if in_progress is not None and len(in_progress):
+        fields = sorted({field for interval in RESOURCE_INTERVALS.values() for field in interval})
+        journey_df = pd.concat([journey_df[fields], in_progress[fields]], ignore_index=True)
+    return {
+        name: OccupancyCurve.from_intervals(journey_df[start].to_numpy(dtype=float),
+                                            journey_df[end].to_numpy(dtype=float), horizon)
+        for name, (start, end) in RESOURCE_INTERVALS.items()
+    }
+
+def utilization_series(curves: Dict[str, OccupancyCurve], capacities: Dict[str, int],
+                       horizon: float, bin_minutes: float) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Time-averaged utilization (%) per resource in consecutive bins.
+
+    Returns the bin start times and one array per resource; the last bin is
+    cut at ``horizon``.
+    """
+    edges = np.append(np.arange(0.0, horizon, bin_minutes), horizon)
+    return edges[:-1], {
+        name: curve.bin_averages(edges) / capacities[name] * 100
+        for name, curve in curves.items()
+    }
@@ -0,0 +1,296 @@
+"""Staffing Optimizer - Outpatient Clinic Simulation
+
+Finds the cheapest staffing mix (doctors, nurses, exam rooms, registration
+staff) whose service-level KPI, e.g. mean p90 wait, stays under a threshold.
+
+The search assumes the KPI never gets worse when a resource is added:
+
+1. Bisection: for each factor, with every other factor at its maximum,
+   bisect for the smallest level that can meet the target. No mix below
+   that level can, so these bounds prune the grid before the main search.
+   The factors are bisected in lock-step, one probe each per round,
+   evaluated concurrently.
+2. Cost-ordered search: the remaining mixes are evaluated cheapest first,
+   in waves of one mix per worker. Any mix that is componentwise no larger
+   than a mix found infeasible is infeasible too and is skipped without
+   simulating. The search stops once the next candidate costs more than the
+   best feasible mix found (a costlier mix can only tie on feasibility).
+
+Every evaluation is a sequential feasibility check, as in ranking and
+selection with a constraint: ``initial_replications`` runs, then more in
+doubling batches while the confidence interval for the KPI still straddles
+the threshold, up to ``max_replications`` (then the mean decides and the
+mix is marked marginal). Replication i of every mix uses the same seed
+(common random numbers), the i-th child of ``SeedSequence(random_seed)``
+as in run_replications, so comparisons between mixes are paired.
+"""
+
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from input_streams import child_seeds
+from realistic_patient_journey import run_realistic_simulation, SimulationCancelled
+from replications import KPI_NAMES, replication_kpis, confidence_interval, parallel_map
+from sweep import STAFFING_FACTORS, staffing_grid
+
+logger = logging.getLogger(__name__)
+
+# Cost per unit and hour of each staffing factor
+DEFAULT_STAFF_COSTS = {
+    'NUM_DOCTORS': 150.0,
+    'NUM_NURSES': 60.0,
+    'NUM_EXAM_ROOMS': 25.0,
+    'NUM_REGISTRATION_STAFF': 30.0
+}
+
+# KPIs a service-level target can be set on (lower is better)
+SLA_KPIS = ['avg_wait_time', 'p90_wait_time', 'max_wait_time', 'avg_total_time', 'p90_total_time']
+
+# Evaluation outcomes
+FEASIBLE, INFEASIBLE, UNDECIDED = 'feasible', 'infeasible', 'undecided'
+
+def _run_mix(task: Tuple[Dict[str, int], Dict[str, Any], List[Tuple[int, np.random.SeedSequence]]]) -> List[Dict[str, float]]:
+    """Run the given replications of one staffing mix (executed in a worker)."""
+    cell, kwargs, seeds = task
+    rows = []
+    for replication, seed in seeds:
+        results = run_realistic_simulation(**kwargs, random_seed=seed, journey_table=False)
+        rows.append({'replication': replication, **replication_kpis(results)})
+    return rows
+
+class _Evaluation:
+    """Replications and feasibility verdict of one staffing mix."""
+
+    def __init__(self, cell: Dict[str, int], cost: float, stage: str):
+        self.cell = cell
+        self.cost = cost
+        self.stage = stage
+        self.rows: List[Dict[str, float]] = []
+        self.status = UNDECIDED
+        self.marginal = False
+
+    def classify(self, kpi: str, threshold: float, confidence: float, max_replications: int):
+        values = [row[kpi] for row in self.rows]
+        mean, half_width = confidence_interval(values, confidence)
+        if len(values) >= 2 and mean + half_width <= threshold:
+            self.status = FEASIBLE
+        elif len(values) >= 2 and mean - half_width > threshold:
+            self.status = INFEASIBLE
+        elif len(values) >= max_replications:
+            # Still straddling the threshold: let the mean decide
+            self.status = FEASIBLE if mean <= threshold else INFEASIBLE
+            self.marginal = True
+
+    def record(self, kpi: str, confidence: float) -> Dict[str, Any]:
+        mean, half_width = confidence_interval([row[kpi] for row in self.rows], confidence)
+        return {**self.cell, 'cost': self.cost, 'stage': self.stage, 'replications': len(self.rows),
+                'kpi_mean': mean, 'kpi_half_width': half_width, 'status': self.status,
+                'marginal': self.marginal}
+
+def optimize_staffing(bounds: Dict[str, Sequence[int]],
+                      sla_threshold: float = 15.0,
+                      sla_kpi: str = 'p90_wait_time',
+                      costs: Optional[Dict[str, float]] = None,
+                      clinic_config: Dict[str, Any] = None,
+                      service_time_config: Dict[str, Dict[str, float]] = None,
+                      simulation_duration: float = 480,
+                      arrival_rate: float = 5.0,
+                      random_seed: int = 42,
+                      engine: str = 'heap',
+                      initial_replications: int = 5,
+                      max_replications: int = 40,
+                      confidence: float = 0.95,
+                      max_workers: Optional[int] = None,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      cancel_event=None) -> Dict[str, Any]:
+    """Cheapest mix in ``bounds`` whose mean ``sla_kpi`` is at most ``sla_threshold``.
+
+    ``bounds`` maps STAFFING_FACTORS keys to the levels allowed (factors
+    left out keep their ``clinic_config`` value); ``costs`` gives the cost
+    per unit (default DEFAULT_STAFF_COSTS). ``progress_callback(decided,
+    total)`` counts mixes settled by simulation or pruning.
+
+    Returns ``best`` (the mix, its cost and KPI summary, or None when even
+    the largest mix misses the target), ``evaluations`` (every simulated
+    mix), the per-factor ``lower_bounds`` from bisection and pruning counts.
+    """
+    if sla_kpi not in SLA_KPIS:
+        raise ValueError(f"Unknown SLA KPI {sla_kpi!r}; expected one of {SLA_KPIS}")
+    if not 2 <= initial_replications <= max_replications:
+        raise ValueError("Need 2 <= initial_replications <= max_replications")
+    costs = {**DEFAULT_STAFF_COSTS, **(costs or {})}
+    cells = staffing_grid(bounds)
+    if not cells:
+        raise ValueError("The staffing bounds are empty")
+    factors = list(cells[0])
+    levels = {factor: sorted({cell[factor] for cell in cells}) for factor in factors}
+
+    if clinic_config is None:
+        from simulation import DEFAULT_CLINIC_CONFIG
+        clinic_config = DEFAULT_CLINIC_CONFIG
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, max_workers)
+
+    seeds = child_seeds(np.random.SeedSequence(random_seed), max_replications)
+    run_kwargs = {
+        'service_time_config': service_time_config,
+        'simulation_duration': simulation_duration,
+        'arrival_rate': arrival_rate,
+        'engine': engine
+    }
+    evaluations: Dict[Tuple[int, ...], _Evaluation] = {}
+    settled = set()
+    total = len(cells)
+
+    def key(cell: Dict[str, int]) -> Tuple[int, ...]:
+        return tuple(cell[factor] for factor in factors)
+
+    def cost_of(cell: Dict[str, int]) -> float:
+        return float(sum(costs[factor] * cell[factor] for factor in factors))
+
+    def report():
+        if progress_callback is not None:
+            progress_callback(len(settled), total)
+
+    def evaluate(batch: List[Dict[str, int]], stage: str) -> List[_Evaluation]:
+        """Settle the feasibility of every mix in ``batch``, concurrently."""
+        results = []
+        for cell in batch:
+            if key(cell) not in evaluations:
+                evaluations[key(cell)] = _Evaluation(cell, cost_of(cell), stage)
+            results.append(evaluations[key(cell)])
+        pending = [evaluation for evaluation in results if evaluation.status == UNDECIDED]
+        while pending:
+            # Each wave and doubling round is a cancellation point, however few mixes it holds
+            if cancel_event is not None and cancel_event.is_set():
+                raise SimulationCancelled(f"Staffing optimization cancelled after {len(settled)} of {total} mixes")
+            tasks = []
+            for evaluation in pending:
+                start = len(evaluation.rows)
+                count = initial_replications if start == 0 else min(start, max_replications - start)
+                tasks.append((evaluation.cell, {**run_kwargs, 'clinic_config': {**clinic_config, **evaluation.cell}},
+                              [(i, seeds[i]) for i in range(start, start + count)]))
+            outputs = parallel_map(_run_mix, tasks, max(1, min(max_workers, len(tasks))),
+                                   cancel_event=cancel_event, label='Staffing optimization')
+            for evaluation, rows in zip(pending, outputs):
+                evaluation.rows.extend(rows)
+                evaluation.classify(sla_kpi, sla_threshold, confidence, max_replications)
+            pending = [evaluation for evaluation in pending if evaluation.status == UNDECIDED]
+        settled.update(key(evaluation.cell) for evaluation in results)
+        report()
+        return results
+
+    # Stage 0: can the largest mix meet the target at all?
+    largest = {factor: levels[factor][-1] for factor in factors}
+    if evaluate([largest], 'bisection')[0].status != FEASIBLE:
+        logger.info("Even the largest staffing mix misses the service-level target")
+        return _optimizer_results(None, evaluations, {}, 0, 0, total, sla_kpi, sla_threshold, costs, confidence)
+
+    # Stage 1: lock-step bisection for each factor's smallest feasible level
+    search = {factor: [0, len(levels[factor]) - 1] for factor in factors}
+    while True:
+        probes = {factor: (low + high) // 2 for factor, (low, high) in search.items() if low < high}
+        if not probes:
+            break
+        probe_cells = [{**largest, factor: levels[factor][index]} for factor, index in probes.items()]
+        for (factor, index), evaluation in zip(probes.items(), evaluate(probe_cells, 'bisection')):
+            if evaluation.status == FEASIBLE:
+                search[factor][1] = index
+            else:
+                search[factor][0] = index + 1
+    lower_bounds = {factor: levels[factor][low] for factor, (low, _) in search.items()}
+
+    # Stage 2: cheapest-first waves over the mixes the bounds leave
+    candidates = sorted((cell for cell in cells if all(cell[f] >= lower_bounds[f] for f in factors)),
+                        key=lambda cell: (cost_of(cell), key(cell)))
+    pruned_by_bounds = total - len(candidates)
+    settled.update(key(cell) for cell in cells if key(cell) not in {key(c) for c in candidates})
+    report()
+
+    infeasible = [np.array(k) for k, evaluation in evaluations.items() if evaluation.status == INFEASIBLE]
+    best: Optional[_Evaluation] = None
+    pruned_by_dominance = 0
+    queue = list(candidates)
+    while queue:
+        wave = []
+        while queue and len(wave) < max_workers:
+            cell = queue.pop(0)
+            if best is not None and cost_of(cell) > best.cost:
+                queue = []
+                break
+            existing = evaluations.get(key(cell))
+            if existing is None and any((np.array(key(cell)) <= bad).all() for bad in infeasible):
+                pruned_by_dominance += 1
+                settled.add(key(cell))
+                continue
+            wave.append(cell)
+        if not wave:
+            continue
+        for evaluation in evaluate(wave, 'search'):
+            if evaluation.status == INFEASIBLE:
+                infeasible.append(np.array(key(evaluation.cell)))
+            elif best is None or (evaluation.cost, _kpi_mean(evaluation, sla_kpi)) < (best.cost, _kpi_mean(best, sla_kpi)):
+                best = evaluation
+
+    # Mixes above the best cost are settled by cost alone
+    settled.update(key(cell) for cell in cells)
+    report()
+
+    logger.info(f"Staffing optimizer simulated {len(evaluations)} of {total} mixes")
+    return _optimizer_results(best, evaluations, lower_bounds, pruned_by_bounds, pruned_by_dominance,
+                              total, sla_kpi, sla_threshold, costs, confidence)
+
+def _kpi_mean(evaluation: _Evaluation, kpi: str) -> float:
+    return float(np.mean([row[kpi] for row in evaluation.rows]))
+
+def _optimizer_results(best: Optional[_Evaluation], evaluations: Dict[Tuple[int, ...], _Evaluation],
+                       lower_bounds: Dict[str, int], pruned_by_bounds: int, pruned_by_dominance: int,
+                       total: int, sla_kpi: str, sla_threshold: float, costs: Dict[str, float],
+                       confidence: float) -> Dict[str, Any]:
+    table = pd.DataFrame([evaluation.record(sla_kpi, confidence) for evaluation in evaluations.values()])
+    best_result = None
+    if best is not None:
+        runs = pd.DataFrame(best.rows).set_index('replication')
+        best_result = {
+            'mix': dict(best.cell),
+            'cost': best.cost,
+            'replications': len(best.rows),
+            'marginal': best.marginal,
+            'kpis': {name: dict(zip(('mean', 'half_width'), confidence_interval(runs[name].to_numpy(), confidence)))
+                     for name in KPI_NAMES}
+        }
+    return {
+        'best': best_result,
+        'evaluations': table.sort_values('cost').reset_index(drop=True) if len(table) else table,
+        'lower_bounds': lower_bounds,
+        'candidates': total,
+        'simulated': len(evaluations),
+        'pruned_by_bounds': pruned_by_bounds,
+        'pruned_by_dominance': pruned_by_dominance,
+        'replications_run': int(sum(len(evaluation.rows) for evaluation in evaluations.values())),
+        'sla_kpi': sla_kpi,
+        'sla_threshold': sla_threshold,
+        'costs': costs,
+        'confidence': confidence
+    }
+
+if __name__ == "__main__":
+    import time
+
+    bounds = {'NUM_DOCTORS': range(1, 9), 'NUM_NURSES': range(1, 7), 'NUM_EXAM_ROOMS': range(1, 11),
+              'NUM_REGISTRATION_STAFF': range(1, 5)}
+    start = time.perf_counter()
+    result = optimize_staffing(bounds, sla_threshold=15.0, arrival_rate=3.0)
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"STAFFING OPTIMIZER ({result['simulated']} of {result['candidates']} mixes simulated, "
+          f"{result['replications_run']} runs, {elapsed:.2f}s)")
+    print("=" * 60)
+    print(f"Lower bounds: {result['lower_bounds']}")
+    print(f"Best: {result['best']}")
@@ -12,124 +12,245 @@ Implements realistic patient flow:
 import simpy
 import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Optional, Union
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from input_streams import ClinicInputs, DEFAULT_SERVICE_TIME_CONFIG, DEFAULT_BLOCK_SIZE
+from tracing import TraceSink, LoggingTraceSink, ColumnarEventLog, MultiSink, EVENT_TYPES, patient_label, patient_labels
+
 logger = logging.getLogger(__name__)
 
+# Timestamp columns kept per patient, in pathway order
+JOURNEY_TIME_FIELDS = [
+    'arrival_time',
+    'registration_start',
+    'registration_end',
+    'exam_room_assigned',
+    'nurse_visit_start',
+    'nurse_visit_end',
+    'doctor_visit_start',
+    'doctor_visit_end',
+    'departure_time'
+]
+
+# Simulation engines accepted by run_realistic_simulation
+ENGINES = ('simpy', 'heap')
+
+# Bump whenever a change alters simulated results or their shape
+# (persisted caches and the run history key on it)
+MODEL_VERSION = 2
+
+# Patient states stored in the int8 state column
+WAITING_ROOM, EXAM_ROOM, DISCHARGED = 0, 1, 2
+
+# Number of run(until=...) steps when progress or cancellation is requested
+PROGRESS_CHUNKS = 100
+
+# progress_callback(simulated_time, horizon)
+ProgressCallback = Callable[[float, float], None]
+
+class SimulationCancelled(Exception):
+    """Raised when a run is stopped through its cancel event."""
+
+def run_in_chunks(run: Callable[[float], None], horizon: float,
+                  progress_callback: Optional[ProgressCallback] = None,
+                  cancel_event=None, chunks: int = PROGRESS_CHUNKS, start: float = 0.0):
+    """Advance ``run(until)`` from ``start`` to ``horizon`` in equal steps.
+    
+    After each step ``progress_callback`` gets the simulated time reached;
+    before each step a set ``cancel_event`` (anything with ``is_set()``,
+    e.g. threading.Event) stops the run with SimulationCancelled. Both
+    engines stop strictly before ``until`` and resume where they stopped,
+    so a chunked run follows the same sample path as a single call.
+    """
+    if (progress_callback is None and cancel_event is None) or horizon <= start:
+        run(horizon)
+        return
+    reached = start
+    for step in range(1, chunks + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise SimulationCancelled(f"Simulation cancelled at time {reached:.1f}")
+        until = horizon if step == chunks else start + (horizon - start) * step / chunks
+        run(until)
+        reached = until
+        if progress_callback is not None:
+            progress_callback(until, horizon)
+
 class RealisticPatientJourney:
-    """Manages patient journey data and statistics."""
+    """Manages patient journey data and statistics.
+    
+    Journeys are stored as struct-of-arrays indexed by integer patient
+    index: one float64 column per timestamp (NaN until reached), an int16
+    room column and an int8 state column. Each patient is stored once;
+    discharge only records the patient's position in discharge order.
     
-    def __init__(self):
-        self.journey_data = []
-        self.current_patients = {}
-        self.waiting_room_patients = set()
+    An optional ``stats`` accumulator (kpi_stats.JourneyStats) receives each
+    patient's timestamps at discharge.
+    """
+    
+    def __init__(self, capacity: int = 256, stats=None):
+        capacity = max(int(capacity), 16)
+        self._times = {field: np.full(capacity, np.nan) for field in JOURNEY_TIME_FIELDS}
+        self._room_id = np.full(capacity, -1, dtype=np.int16)
+        self._state = np.full(capacity, -1, dtype=np.int8)
+        self._discharge_order = np.empty(capacity, dtype=np.int32)
+        self._discharged = 0
+        self._waiting_count = 0
         self.exam_room_patients = {}
-        self.patient_states = {}
+        self.stats = stats
     
-    def start_journey(self, patient_id: str, arrival_time: float):
-        """Start patient journey."""
-        self.current_patients[patient_id] = {
-            'patient_id': patient_id,
-            'arrival_time': arrival_time,
-            'waiting_room_start': arrival_time,
-            'registration_start': None,
-            'registration_end': None,
-            'exam_room_assigned': None,
-            'nurse_visit_start': None,
-            'nurse_visit_end': None,
-            'doctor_visit_start': None,
-            'doctor_visit_end': None,
-            'departure_time': None,
-            'room_id': None
+    @classmethod
+    def from_columns(cls, times: Dict[str, np.ndarray], room_id: np.ndarray,
+                     discharge_order: np.ndarray) -> 'RealisticPatientJourney':
+        """Wrap columns recorded elsewhere (e.g. by the heap engine)."""
+        journey = cls(capacity=len(room_id))
+        journey._times = {field: times[field] for field in JOURNEY_TIME_FIELDS}
+        journey._room_id = room_id
+        # Rows without an arrival (patient numbers start at 1) stay unused
+        journey._state = np.where(np.isnan(times['arrival_time']), -1,
+                                  np.where(np.isnan(times['departure_time']),
+                                           np.where(np.isnan(times['exam_room_assigned']), WAITING_ROOM, EXAM_ROOM),
+                                           DISCHARGED)).astype(np.int8)
+        journey._discharge_order = discharge_order
+        journey._discharged = len(discharge_order)
+        journey._waiting_count = int(np.count_nonzero(journey._state == WAITING_ROOM))
+        journey.exam_room_patients = {
+            int(room_id[i]): int(i) for i in np.flatnonzero(journey._state == EXAM_ROOM)
         }
-        self.waiting_room_patients.add(patient_id)
-        self.patient_states[patient_id] = 'waiting_room'
+        return journey
     
-    def log_event(self, patient_id: str, event: str, time: float, **kwargs):
+    def _grow(self, min_capacity: int):
+        """Grow every column to hold at least ``min_capacity`` patients."""
+        capacity = len(self._state)
+        while capacity < min_capacity:
+            capacity *= 2
+        for field, column in self._times.items():
+            self._times[field] = np.concatenate([column, np.full(capacity - len(column), np.nan)])
+        self._room_id = np.concatenate([self._room_id, np.full(capacity - len(self._room_id), -1, dtype=np.int16)])
+        self._state = np.concatenate([self._state, np.full(capacity - len(self._state), -1, dtype=np.int8)])
+        self._discharge_order = np.concatenate([self._discharge_order, np.empty(capacity - len(self._discharge_order), dtype=np.int32)])
+    
+    def start_journey(self, patient_index: int, arrival_time: float):
+        """Start patient journey."""
+        if patient_index >= len(self._state):
+            self._grow(patient_index + 1)
+        self._times['arrival_time'][patient_index] = arrival_time
+        self._state[patient_index] = WAITING_ROOM
+        self._waiting_count += 1
+    
+    def log_event(self, patient_index: int, event: str, time: float):
         """Log patient journey event."""
-        if patient_id in self.current_patients:
-            self.current_patients[patient_id][event] = time
-            for key, value in kwargs.items():
-                self.current_patients[patient_id][key] = value
+        self._times[event][patient_index] = time
     
-    def move_to_exam_room(self, patient_id: str, room_id: int, time: float):
+    def move_to_exam_room(self, patient_index: int, room_id: int, time: float):
         """Move patient to exam room."""
-        if patient_id in self.waiting_room_patients:
-            self.waiting_room_patients.remove(patient_id)
-            self.exam_room_patients[room_id] = patient_id
-            self.patient_states[patient_id] = 'exam_room'
-            self.current_patients[patient_id]['room_id'] = room_id
-            self.current_patients[patient_id]['exam_room_assigned'] = time
-    
-    def discharge_patient(self, patient_id: str, time: float):
+        if self._state[patient_index] == WAITING_ROOM:
+            self._waiting_count -= 1
+            self.exam_room_patients[room_id] = patient_index
+            self._state[patient_index] = EXAM_ROOM
+            self._room_id[patient_index] = room_id
+            self._times['exam_room_assigned'][patient_index] = time
+    
+    def discharge_patient(self, patient_index: int, time: float):
         """Discharge patient."""
-        if patient_id in self.current_patients:
-            room_id = self.current_patients[patient_id]['room_id']
-            if room_id is not None and room_id in self.exam_room_patients:
+        if self._state[patient_index] in (WAITING_ROOM, EXAM_ROOM):
+            room_id = int(self._room_id[patient_index])
+            if room_id in self.exam_room_patients:
                 del self.exam_room_patients[room_id]
             
-            self.current_patients[patient_id]['departure_time'] = time
-            self.patient_states[patient_id] = 'discharged'
-            
-            # Calculate metrics
-            journey = self.current_patients[patient_id]
-            total_time = time - journey['arrival_time']
-            waiting_time = (journey['exam_room_assigned'] - journey['arrival_time']) if journey['exam_room_assigned'] else 0
-            
-            self.journey_data.append({
-                **journey,
-                'total_time': total_time,
-                'waiting_time': waiting_time,
-                'service_completed': True
-            })
+            self._times['departure_time'][patient_index] = time
+            self._state[patient_index] = DISCHARGED
+            self._discharge_order[self._discharged] = patient_index
+            self._discharged += 1
+            if self.stats is not None:
+                self.stats.record([self._times[field][patient_index] for field in JOURNEY_TIME_FIELDS])
+    
+    @property
+    def completed_count(self) -> int:
+        """Number of discharged patients."""
+        return self._discharged
     
     def get_waiting_room_count(self):
         """Get waiting room patient count."""
-        return len(self.waiting_room_patients)
+        return self._waiting_count
     
     def get_exam_room_occupancy(self):
         """Get exam room occupancy."""
         return self.exam_room_patients.copy()
+    
+    def to_dataframe(self, start: int = 0) -> pd.DataFrame:
+        """Completed journeys in discharge order, with derived metrics.
+        
+        ``start`` skips the first discharges, so a table built earlier can be
+        extended with only the patients discharged since.
+        """
+        rows = self._discharge_order[start:self._discharged]
+        arrival = self._times['arrival_time'][rows]
+        exam_room = self._times['exam_room_assigned'][rows]
+        
+        data = {
+            'patient_id': patient_labels(rows),
+            'arrival_time': arrival,
+            'waiting_room_start': arrival.copy()
+        }
+        for field in JOURNEY_TIME_FIELDS[1:]:
+            data[field] = self._times[field][rows]
+        data['room_id'] = self._room_id[rows].astype(np.int64)
+        data['total_time'] = data['departure_time'] - arrival
+        data['waiting_time'] = np.where(np.isnan(exam_room), 0.0, exam_room - arrival)
+        data['service_completed'] = np.ones(len(rows), dtype=bool)
+        # Every column is a fresh array, so the frame can own them as they are
+        return pd.DataFrame(data, index=pd.RangeIndex(start, start + len(rows)), copy=False)
+    
+    def in_progress_dataframe(self) -> pd.DataFrame:
+        """Timestamps of patients not yet discharged (NaN for steps not reached)."""
+        rows = np.flatnonzero((self._state == WAITING_ROOM) | (self._state == EXAM_ROOM))
+        # One float block, which pandas builds faster than column by column
+        return pd.DataFrame(np.column_stack([self._times[field][rows] for field in JOURNEY_TIME_FIELDS]),
+                            columns=JOURNEY_TIME_FIELDS)
 
 def realistic_patient_process(env: simpy.Environment, patient_id: str, clinic, journey_tracker: RealisticPatientJourney, 
-                            service_time_config: Dict[str, Dict[str, float]]):
+                            patient_index: int = 0):
     """Patient journey generator function.
     
     Flow: Arrival -> Registration -> Exam Room -> Nurse -> Doctor -> Discharge
+    
+    Service times come from the clinic's pre-sampled input streams.
+    Events are only traced when the clinic has a trace sink attached.
     """
+    tracing = clinic.trace_sink is not None
     
     # STEP 1: ARRIVAL
     arrival_time = env.now
-    journey_tracker.start_journey(patient_id, arrival_time)
+    journey_tracker.start_journey(patient_index, arrival_time)
     
-    logger.info(f"Patient {patient_id} arrives and sits in waiting room at time {arrival_time:.2f}")
-    clinic.log_event('arrival', patient_id, {'time': arrival_time})
+    if tracing:
+        clinic.log_event('arrival', patient_index)
     
     # STEP 2: REGISTRATION
     with clinic.registration_staff.request() as reg_req:
         yield reg_req
         
         registration_start = env.now
-        journey_tracker.log_event(patient_id, 'registration_start', registration_start)
+        journey_tracker.log_event(patient_index, 'registration_start', registration_start)
         
-        logger.info(f"Registration nurse visits Patient {patient_id} in waiting room at time {registration_start:.2f}")
+        if tracing:
+            clinic.log_event('registration_start', patient_index)
         
         # Service time
-        reg_config = service_time_config.get('registration', {'mean': 3.0, 'std': 0.8})
-        reg_time = max(0.5, np.random.normal(loc=reg_config['mean'], scale=reg_config['std']))
+        reg_time = next(clinic.inputs.registration)
         
         yield env.timeout(reg_time)
         
         registration_end = env.now
-        journey_tracker.log_event(patient_id, 'registration_end', registration_end)
+        journey_tracker.log_event(patient_index, 'registration_end', registration_end)
         
-        logger.info(f"Registration complete for Patient {patient_id} at time {registration_end:.2f} (took {reg_time:.2f} min)")
-        clinic.log_event('registration_complete', patient_id, {'time': registration_end, 'duration': reg_time})
+        if tracing:
+            clinic.log_event('registration_complete', patient_index, duration=reg_time)
     
     # STEP 3: WAIT FOR EXAM ROOM
-    logger.info(f"Patient {patient_id} waits for exam room at time {env.now:.2f}")
+    if tracing:
+        clinic.log_event('exam_room_wait', patient_index)
     
     with clinic.exam_rooms.request() as room_req:
         yield room_req
@@ -141,115 +262,247 @@ def realistic_patient_process(env: simpy.Environment, patient_id: str, clinic, j
         available_rooms = [i for i in range(num_rooms) if i not in journey_tracker.exam_room_patients]
         room_id = available_rooms[0] if available_rooms else 0
         
-        journey_tracker.move_to_exam_room(patient_id, room_id, exam_room_time)
+        journey_tracker.move_to_exam_room(patient_index, room_id, exam_room_time)
         
-        logger.info(f"Patient {patient_id} moves to exam room {room_id} at time {exam_room_time:.2f}")
-        clinic.log_event('exam_room_assigned', patient_id, {'time': exam_room_time, 'room_id': room_id})
+        if tracing:
+            clinic.log_event('exam_room_assigned', patient_index, room_id=room_id)
         
         # STEP 4: NURSE VISIT
         with clinic.nurses.request() as nurse_req:
             yield nurse_req
             
             nurse_start = env.now
-            journey_tracker.log_event(patient_id, 'nurse_visit_start', nurse_start)
+            journey_tracker.log_event(patient_index, 'nurse_visit_start', nurse_start)
             
-            logger.info(f"Nurse visits Patient {patient_id} in room {room_id} at time {nurse_start:.2f}")
+            if tracing:
+                clinic.log_event('nurse_visit_start', patient_index, room_id=room_id)
             
             # Service time
-            nurse_config = service_time_config.get('nurse_visit', {'mean': 8.0, 'std': 2.0})
-            nurse_time = max(1.0, np.random.normal(loc=nurse_config['mean'], scale=nurse_config['std']))
+            nurse_time = next(clinic.inputs.nurse_visit)
             
             yield env.timeout(nurse_time)
             
             nurse_end = env.now
-            journey_tracker.log_event(patient_id, 'nurse_visit_end', nurse_end)
+            journey_tracker.log_event(patient_index, 'nurse_visit_end', nurse_end)
             
-            logger.info(f"Nurse completes visit with Patient {patient_id} at time {nurse_end:.2f} (took {nurse_time:.2f} min)")
-            clinic.log_event('nurse_visit_complete', patient_id, {'time': nurse_end, 'duration': nurse_time})
+            if tracing:
+                clinic.log_event('nurse_visit_complete', patient_index, room_id=room_id, duration=nurse_time)
         
         # STEP 5: DOCTOR VISIT
         with clinic.doctors.request() as doc_req:
             yield doc_req
             
             doctor_start = env.now
-            journey_tracker.log_event(patient_id, 'doctor_visit_start', doctor_start)
+            journey_tracker.log_event(patient_index, 'doctor_visit_start', doctor_start)
             
-            logger.info(f"Doctor visits Patient {patient_id} in room {room_id} at time {doctor_start:.2f}")
+            if tracing:
+                clinic.log_event('doctor_visit_start', patient_index, room_id=room_id)
             
             # Service time
-            doctor_config = service_time_config.get('doctor_visit', {'mean': 12.0, 'std': 4.0})
-            doctor_time = max(2.0, np.random.normal(loc=doctor_config['mean'], scale=doctor_config['std']))
+            doctor_time = next(clinic.inputs.doctor_visit)
             
             yield env.timeout(doctor_time)
             
             doctor_end = env.now
-            journey_tracker.log_event(patient_id, 'doctor_visit_end', doctor_end)
+            journey_tracker.log_event(patient_index, 'doctor_visit_end', doctor_end)
             
-            logger.info(f"Doctor completes visit with Patient {patient_id} at time {doctor_end:.2f} (took {doctor_time:.2f} min)")
-            clinic.log_event('doctor_visit_complete', patient_id, {'time': doctor_end, 'duration': doctor_time})
+            if tracing:
+                clinic.log_event('doctor_visit_complete', patient_index, room_id=room_id, duration=doctor_time)
         
         # STEP 6: DISCHARGE
         departure_time = env.now
-        journey_tracker.discharge_patient(patient_id, departure_time)
+        journey_tracker.discharge_patient(patient_index, departure_time)
         
-        logger.info(f"Patient {patient_id} discharged at time {departure_time:.2f}")
-        clinic.log_event('discharge', patient_id, {'time': departure_time})
+        if tracing:
+            clinic.log_event('discharge', patient_index, room_id=room_id)
+
+class SimulationRun:
+    """A clinic simulation that can be advanced to successively longer horizons.
+    
+    ``advance(until)`` simulates only the time between the current horizon
+    and ``until``; both engines resume exactly where they stopped, so a run
+    advanced 0 -> 120 -> 240 follows the same sample path as one advanced
+    straight to 240. ``results()`` extends the journey table built for the
+    previous horizon with the patients discharged since.
+    
+    See run_realistic_simulation for the arguments.
+    """
+    
+    def __init__(self, clinic_config: Dict[str, Any] = None,
+                 service_time_config: Dict[str, Dict[str, float]] = None,
+                 arrival_rate: float = 5.0,
+                 random_seed: Union[int, np.random.SeedSequence] = 42,
+                 trace_sink: Optional[TraceSink] = None,
+                 record_events: bool = False,
+                 engine: str = 'simpy',
+                 expected_duration: float = 120,
+                 sampling: Optional[Dict[str, Any]] = None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}; expected one of {ENGINES}")
+        
+        if not isinstance(random_seed, np.random.SeedSequence):
+            random_seed = np.random.SeedSequence(random_seed)
+        
+        # Default configurations
+        if clinic_config is None:
+            from simulation import DEFAULT_CLINIC_CONFIG
+            clinic_config = DEFAULT_CLINIC_CONFIG
+        
+        if service_time_config is None:
+            service_time_config = DEFAULT_SERVICE_TIME_CONFIG
+        
+        self.clinic_config = clinic_config
+        self.service_time_config = service_time_config
+        self.engine = engine
+        self.now = 0.0
+        
+        # Expected patient count, so arrays rarely need to grow and short runs
+        # do not sample far more inputs than they use (draws do not depend on
+        # the block size)
+        expected_patients = expected_duration / max(arrival_rate, 1e-9)
+        block_size = int(min(DEFAULT_BLOCK_SIZE, expected_patients * 1.2 + 16))
+        
+        inputs = ClinicInputs(random_seed, arrival_rate, service_time_config, block_size=block_size,
+                              **(sampling or {}))
+        self._inputs = inputs
+        
+        from kpi_stats import JourneyStats
+        self.journey_stats = JourneyStats()
+        
+        self.event_log = None
+        if record_events:
+            self.event_log = ColumnarEventLog(capacity=int(expected_patients * len(EVENT_TYPES) * 1.2))
+            trace_sink = MultiSink(self.event_log, trace_sink) if trace_sink is not None else self.event_log
+        
+        self._table = None
+        
+        if engine == 'heap':
+            from fast_engine import HeapClinicEngine
+            self._heap_engine = HeapClinicEngine(clinic_config, inputs, trace_sink=trace_sink, stats=self.journey_stats)
+            self._run = self._heap_engine.run
+            return
+        
+        from simulation import create_clinic_simulation
+        env, clinic = create_clinic_simulation(clinic_config, trace_sink=trace_sink, inputs=inputs)
+        journey_tracker = RealisticPatientJourney(capacity=int(expected_patients * 1.2) + 1, stats=self.journey_stats)
+        
+        def patient_arrivals():
+            patient_count = 0
+            while True:
+                # Inter-arrival time
+                inter_arrival = next(inputs.arrivals)
+                yield env.timeout(inter_arrival)
+                
+                patient_count += 1
+                patient_id = patient_label(patient_count)
+                
+                # Start process
+                env.process(realistic_patient_process(env, patient_id, clinic, journey_tracker, patient_count))
+        
+        env.process(patient_arrivals())
+        self._env, self._clinic, self._journey_tracker = env, clinic, journey_tracker
+        self._run = lambda until: env.run(until=until)
+    
+    def advance(self, until: float, progress_callback: Optional[ProgressCallback] = None, cancel_event=None):
+        """Simulate from the current horizon up to ``until``.
+        
+        A cancelled advance leaves the run consistent at the last completed
+        chunk, so it can be advanced again later.
+        """
+        if until < self.now:
+            raise ValueError(f"Cannot advance to {until}: run is already at {self.now}")
+        if until == self.now:
+            return
+        
+        def run(step_until):
+            self._run(step_until)
+            self.now = step_until
+        
+        run_in_chunks(run, until, progress_callback, cancel_event, start=self.now)
+    
+    def _journey(self) -> RealisticPatientJourney:
+        return self._heap_engine.journey() if self.engine == 'heap' else self._journey_tracker
+    
+    def results(self, journey_table: bool = True) -> Dict[str, Any]:
+        """Results at the current horizon, shaped like run_realistic_simulation's."""
+        journey_tracker = self._journey()
+        if journey_table:
+            # Discharge order only ever grows, so earlier rows never change
+            built = 0 if self._table is None else len(self._table)
+            if built < journey_tracker.completed_count or self._table is None:
+                new_rows = journey_tracker.to_dataframe(start=built)
+                self._table = new_rows if self._table is None else pd.concat([self._table, new_rows])
+        resource_statistics = (self._heap_engine.get_resource_statistics() if self.engine == 'heap'
+                               else self._clinic.get_resource_statistics())
+        return {
+            'patient_journey_summary': self._table if journey_table else None,
+            # Patients still in the clinic at the horizon, for occupancy curves
+            'in_progress_journeys': journey_tracker.in_progress_dataframe() if journey_table else None,
+            'simulation_duration': self.now,
+            'total_patients': journey_tracker.completed_count,
+            # One inter-arrival is always drawn ahead for the next arrival
+            'patients_arrived': self._inputs.arrivals.drawn - 1,
+            'resource_statistics': resource_statistics,
+            # Snapshot, so these results do not change when the run is advanced
+            'journey_stats': self.journey_stats.copy(),
+            'clinic_config': self.clinic_config,
+            'service_time_config': self.service_time_config,
+            'event_log': self.event_log
+        }
 
 def run_realistic_simulation(clinic_config: Dict[str, Any] = None,
                            service_time_config: Dict[str, Dict[str, float]] = None,
                            simulation_duration: float = 120,
                            arrival_rate: float = 5.0,
-                           random_seed: int = 42) -> Dict[str, Any]:
-    """Run realistic clinic simulation with proper patient flow."""
+                           random_seed: Union[int, np.random.SeedSequence] = 42,
+                           trace_sink: Optional[TraceSink] = None,
+                           record_events: bool = False,
+                           engine: str = 'simpy',
+                           journey_table: bool = True,
+                           progress_callback: Optional[ProgressCallback] = None,
+                           cancel_event=None,
+                           sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run realistic clinic simulation with proper patient flow.
     
-    np.random.seed(random_seed)
+    All randomness comes from streams seeded by this run's SeedSequence, so
+    concurrent runs in threads or processes never share state. Arrivals and
+    each service stage have their own stream, sampled in vectorized blocks.
+    ``random_seed`` may be an int or a SeedSequence (e.g. a child spawned
+    for a replication).
     
-    # Default configurations
-    if clinic_config is None:
-        from simulation import DEFAULT_CLINIC_CONFIG
-        clinic_config = DEFAULT_CLINIC_CONFIG
+    Patient events go to ``trace_sink`` (see tracing.py); with the default
+    of None the run is silent and skips all per-event trace work. With
+    ``record_events`` the events are also kept in a ColumnarEventLog,
+    returned as ``results['event_log']``.
     
-    if service_time_config is None:
-        service_time_config = {
-            'registration': {'mean': 3.0, 'std': 0.8},
-            'nurse_visit': {'mean': 8.0, 'std': 2.0},
-            'doctor_visit': {'mean': 12.0, 'std': 4.0}
-        }
+    ``engine='heap'`` runs the same pathway on the specialized event-heap
+    engine in fast_engine.py instead of SimPy; results have the same shape.
     
-    env = simpy.Environment()
+    Wait, total and per-stage times are also accumulated at each discharge
+    into ``results['journey_stats']`` (kpi_stats.JourneyStats: streaming
+    moments and quantile sketches). With ``journey_table=False`` the
+    per-patient DataFrame is not built and ``patient_journey_summary`` is
+    None, for long runs and replication batches that only need KPIs.
     
-    from simulation import create_clinic_simulation
-    env, clinic = create_clinic_simulation(clinic_config)
-    journey_tracker = RealisticPatientJourney()
+    With ``progress_callback`` or ``cancel_event`` the run advances in
+    PROGRESS_CHUNKS steps (see run_in_chunks) so a caller on another thread
+    can follow and stop it.
     
-    def patient_arrivals():
-        patient_count = 0
-        while True:
-            # Inter-arrival time
-            inter_arrival = np.random.exponential(arrival_rate)
-            yield env.timeout(inter_arrival)
-            
-            patient_count += 1
-            patient_id = f"Patient_{patient_count:03d}"
-            
-            # Start process
-            env.process(realistic_patient_process(env, patient_id, clinic, journey_tracker, service_time_config))
+    ``sampling`` holds input sampling options for ClinicInputs
+    (``antithetic``, ``lattice_point``), used by the variance-reduction
+    modes of run_replications.
     
-    env.process(patient_arrivals())
-    
-    env.run(until=simulation_duration)
-    
-    return {
-        'journey_data': journey_tracker.journey_data,
-        'patient_journey_summary': pd.DataFrame(journey_tracker.journey_data),
-        'simulation_duration': simulation_duration,
-        'total_patients': len(journey_tracker.journey_data),
-        'clinic_config': clinic_config,
-        'service_time_config': service_time_config
-    }
+    To extend the horizon later without starting over, use SimulationRun.
+    """
+    run = SimulationRun(clinic_config, service_time_config, arrival_rate, random_seed,
+                        trace_sink=trace_sink, record_events=record_events, engine=engine,
+                        expected_duration=simulation_duration, sampling=sampling)
+    run.advance(simulation_duration, progress_callback, cancel_event)
+    return run.results(journey_table)
 
 if __name__ == "__main__":
-    results = run_realistic_simulation(simulation_duration=60)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    results = run_realistic_simulation(simulation_duration=60, trace_sink=LoggingTraceSink(logger))
     
     print("=" * 60)
     print("REALISTIC OUTPATIENT CLINIC SIMULATION")
@@ -0,0 +1,553 @@
+"""Replication Runner - Outpatient Clinic Simulation
+
+Runs independent replications of the realistic patient journey model
+across a process pool and summarizes each KPI with a confidence interval,
+and compares two configurations with paired (common random number)
+replications.
+
+Optional variance-reduction modes for a batch (``variance_reduction``):
+
+- 'antithetic': replications in pairs sharing a seed, the second run on
+  mirrored uniforms (1 - u) for arrivals and every service stage; the
+  estimate averages the pair means
+- 'control': independent replications, each KPI regressed on the number of
+  arrivals, whose expectation (horizon / mean inter-arrival time) is known;
+  equivalent to controlling for the realized mean inter-arrival time
+- 'rqmc': ``randomizations`` independently shifted rank-1 lattices of
+  n_replications / randomizations points each; the estimate averages the
+  lattice means
+
+Each mode reports, per KPI, ``variance_reduction``: the estimated variance
+of a plain Monte Carlo mean over the same number of runs divided by that
+of the mode's estimator (above 1 means it helped).
+
+run_sequential_replications keeps adding batches until chosen KPIs reach a
+target confidence half-width.
+"""
+
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from kpi_stats import JourneyStats
+from input_streams import child_seeds
+from realistic_patient_journey import run_realistic_simulation, SimulationCancelled
+
+logger = logging.getLogger(__name__)
+
+# KPIs reported for every replication
+KPI_NAMES = [
+    'patients_served',
+    'avg_wait_time',
+    'p90_wait_time',
+    'max_wait_time',
+    'avg_total_time',
+    'p90_total_time',
+    'throughput_per_hour',
+    'doctor_utilization',
+    'room_utilization'
+]
+
+VARIANCE_REDUCTION_MODES = ('antithetic', 'control', 'rqmc')
+DEFAULT_RQMC_RANDOMIZATIONS = 5
+
+# Default precision targets of run_sequential_replications (half-width / mean)
+DEFAULT_PRECISION_TARGETS = {
+    'avg_wait_time': 0.05,
+    'p90_total_time': 0.05,
+    'throughput_per_hour': 0.05
+}
+
+def replication_kpis(results: Dict[str, Any]) -> Dict[str, float]:
+    """Reduce one simulation result to its per-replication KPIs.
+
+    Uses the streaming journey statistics, so the per-patient table is not
+    needed (replications run with ``journey_table=False``).
+    """
+    summary = results['journey_stats'].summary()
+    wait, total = summary['waiting_time'], summary['total_time']
+    hours = results['simulation_duration'] / 60.0
+    resources = results['resource_statistics']
+    utilization = {
+        'doctor_utilization': resources['doctors']['utilization'],
+        'room_utilization': resources['exam_rooms']['utilization']
+    }
+
+    if total['count'] == 0:
+        return {**{name: 0.0 for name in KPI_NAMES}, **utilization}
+
+    return {
+        'patients_served': float(total['count']),
+        'avg_wait_time': wait['mean'],
+        'p90_wait_time': wait['p90'],
+        'max_wait_time': wait['max'],
+        'avg_total_time': total['mean'],
+        'p90_total_time': total['p90'],
+        'throughput_per_hour': total['count'] / hours if hours > 0 else 0.0,
+        **utilization
+    }
+
+def t_critical(dof: int, confidence: float = 0.95) -> float:
+    """Two-sided Student t critical value.
+
+    Exact for 1 and 2 degrees of freedom, Cornish-Fisher expansion
+    (Abramowitz & Stegun 26.7.5) otherwise.
+    """
+    p = 0.5 + confidence / 2.0
+    if dof == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if dof == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+
+    z = NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    return z + g1 / dof + g2 / dof ** 2 + g3 / dof ** 3 + g4 / dof ** 4
+
+def confidence_interval(values, confidence: float = 0.95) -> Tuple[float, float]:
+    """Return (mean, half-width) of a t confidence interval."""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n == 0:
+        return 0.0, float('nan')
+    mean = float(values.mean())
+    if n < 2:
+        return mean, float('nan')
+    half_width = t_critical(n - 1, confidence) * values.std(ddof=1) / math.sqrt(n)
+    return mean, float(half_width)
+
+def control_variate_estimate(values, controls, control_mean: float,
+                             confidence: float = 0.95) -> Tuple[float, float, float]:
+    """Regression control-variate estimate of the mean of ``values``.
+
+    Returns (estimate, half-width, estimator variance); the half-width uses
+    n - 2 degrees of freedom, as one coefficient is estimated.
+    """
+    values = np.asarray(values, dtype=float)
+    controls = np.asarray(controls, dtype=float)
+    n = len(values)
+    if n < 3:
+        mean, _ = confidence_interval(values, confidence)
+        return mean, float('nan'), float('nan')
+    centered = controls - controls.mean()
+    sxx = float(centered @ centered)
+    beta = float(centered @ (values - values.mean())) / sxx if sxx > 0 else 0.0
+    estimate = float(values.mean() - beta * (controls.mean() - control_mean))
+    residuals = values - values.mean() - beta * centered
+    residual_variance = float(residuals @ residuals) / (n - 2)
+    variance = residual_variance * (1 / n + ((controls.mean() - control_mean) ** 2 / sxx if sxx > 0 else 0.0))
+    return estimate, float(t_critical(n - 2, confidence) * math.sqrt(variance)), variance
+
+def summarize_replications(replications: pd.DataFrame, confidence: float = 0.95,
+                           variance_reduction: Optional[str] = None,
+                           control_mean: Optional[float] = None) -> pd.DataFrame:
+    """Summarize per-replication KPIs as mean, std and confidence interval.
+
+    With a ``variance_reduction`` mode the mean and interval come from that
+    mode's estimator (pair or lattice means in the ``group`` column,
+    regression on ``patients_arrived`` around ``control_mean``), and a
+    ``variance_reduction`` column gives the variance ratio achieved.
+    """
+    rows = []
+    for name in KPI_NAMES:
+        values = replications[name].to_numpy(dtype=float)
+        n = len(values)
+        row = {'kpi': name}
+        if variance_reduction == 'control':
+            mean, half_width, variance = control_variate_estimate(
+                values, replications['patients_arrived'].to_numpy(), control_mean, confidence)
+        elif variance_reduction is not None:
+            group_means = replications.groupby('group')[name].mean().to_numpy()
+            mean, half_width = confidence_interval(group_means, confidence)
+            variance = (float(group_means.var(ddof=1)) / len(group_means) if len(group_means) > 1
+                        else float('nan'))
+        else:
+            mean, half_width = confidence_interval(values, confidence)
+        row.update({
+            'mean': mean,
+            'std': float(values.std(ddof=1)) if n > 1 else float('nan'),
+            'half_width': half_width,
+            'ci_lower': mean - half_width,
+            'ci_upper': mean + half_width
+        })
+        if variance_reduction is not None:
+            plain_variance = float(values.var(ddof=1)) / n if n > 1 else float('nan')
+            row['variance_reduction'] = plain_variance / variance if variance > 0 else float('nan')
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('kpi')
+
+def _run_replication(task: Tuple[int, Dict[str, Any]]) -> Tuple[Dict[str, float], JourneyStats]:
+    """Run one replication and return its KPIs and journey statistics (executed in a worker)."""
+    replication, kwargs = task
+    results = run_realistic_simulation(**kwargs, journey_table=False)
+    kpis = replication_kpis(results)
+    kpis['replication'] = replication
+    kpis['patients_arrived'] = results['patients_arrived']
+    return kpis, results['journey_stats']
+
+def _replication_plan(n_replications: int, random_seed: int, variance_reduction: Optional[str],
+                      randomizations: int, start: int = 0) -> List[Tuple[int, np.random.SeedSequence, Optional[Dict[str, Any]]]]:
+    """(group, seed, sampling options) of replications start .. start + n - 1.
+
+    Seeds are children of ``SeedSequence(random_seed)`` by index, so a batch
+    extended later gets the same replications as one planned in full.
+    """
+    root = np.random.SeedSequence(random_seed)
+    indices = range(start, start + n_replications)
+    if variance_reduction == 'antithetic':
+        if start % 2 or n_replications % 2:
+            raise ValueError("Antithetic replications come in pairs; n_replications must be even")
+        seeds = child_seeds(root, (start + n_replications) // 2)
+        return [(i // 2, seeds[i // 2], {'antithetic': i % 2 == 1}) for i in indices]
+    if variance_reduction == 'rqmc':
+        if start or randomizations < 2 or n_replications % randomizations:
+            raise ValueError(f"RQMC needs n_replications to be a multiple of randomizations "
+                             f"(at least 2); got {n_replications} and {randomizations}")
+        points = n_replications // randomizations
+        seeds = child_seeds(root, randomizations)
+        return [(i // points, seeds[i // points], {'lattice_point': (i % points, points)}) for i in indices]
+    if variance_reduction not in (None, 'control'):
+        raise ValueError(f"Unknown variance reduction {variance_reduction!r}; "
+                         f"expected one of {VARIANCE_REDUCTION_MODES}")
+    seeds = child_seeds(root, start + n_replications)
+    return [(i, seeds[i], None) for i in indices]
+
+def _run_plan(plan, start: int, run_kwargs: Dict[str, Any], max_workers: int,
+              progress_callback=None, cancel_event=None) -> Tuple[List[Dict[str, float]], List[JourneyStats]]:
+    """Run planned replications numbered from ``start``; returns KPI rows and journey statistics."""
+    tasks = [
+        (start + i, {**run_kwargs, 'random_seed': seed, 'sampling': sampling})
+        for i, (_, seed, sampling) in enumerate(plan)
+    ]
+    outputs = parallel_map(_run_replication, tasks, max_workers, progress_callback, cancel_event,
+                           label='Replications')
+    rows = [{**kpis, 'group': group} for (kpis, _), (group, _, _) in zip(outputs, plan)]
+    return rows, [stats for _, stats in outputs]
+
+def parallel_map(function: Callable[[Any], Any], tasks: List[Any], max_workers: int,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 cancel_event=None, label: str = 'Tasks') -> List[Any]:
+    """``[function(task) for task in tasks]`` across a process pool.
+
+    Results come back in task order. ``progress_callback(completed, total)``
+    is called as they arrive; a set ``cancel_event`` raises
+    SimulationCancelled before any task starts, or at the next result and
+    drops tasks not yet started.
+    """
+    outputs = []
+    total = len(tasks)
+
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            raise SimulationCancelled(f"{label} cancelled after {len(outputs)} of {total}")
+
+    def collect(output):
+        outputs.append(output)
+        if progress_callback is not None:
+            progress_callback(len(outputs), total)
+        if len(outputs) < total:
+            check_cancelled()
+
+    check_cancelled()
+    if max_workers == 1:
+        for task in tasks:
+            collect(function(task))
+        return outputs
+
+    # Several tasks per chunk keeps IPC overhead small against short runs
+    chunksize = max(1, total // (max_workers * 4))
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        for output in pool.map(function, tasks, chunksize=chunksize):
+            collect(output)
+    finally:
+        # After a cancel, do not wait for tasks nobody will read
+        pool.shutdown(wait=len(outputs) == total, cancel_futures=True)
+    return outputs
+
+def run_replications(n_replications: int = 30,
+                     clinic_config: Dict[str, Any] = None,
+                     service_time_config: Dict[str, Dict[str, float]] = None,
+                     simulation_duration: float = 120,
+                     arrival_rate: float = 5.0,
+                     random_seed: int = 42,
+                     max_workers: Optional[int] = None,
+                     confidence: float = 0.95,
+                     engine: str = 'simpy',
+                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                     cancel_event=None,
+                     variance_reduction: Optional[str] = None,
+                     randomizations: int = DEFAULT_RQMC_RANDOMIZATIONS) -> Dict[str, Any]:
+    """Run independent replications in parallel and summarize KPIs.
+
+    Replication i is seeded with the i-th child spawned from
+    ``SeedSequence(random_seed)``, so streams are statistically independent
+    and a batch is reproducible regardless of how many workers execute it.
+    ``engine`` is passed through to run_realistic_simulation.
+
+    Workers return streaming journey statistics instead of patient tables;
+    their merge is returned as ``pooled_stats`` (percentiles over every
+    patient of every replication).
+
+    ``progress_callback(completed, total)`` is called as replications
+    finish. Setting ``cancel_event`` raises SimulationCancelled at the next
+    finished replication and drops the ones not yet started.
+
+    ``variance_reduction`` selects one of VARIANCE_REDUCTION_MODES (see the
+    module docstring); 'antithetic' needs an even n_replications and 'rqmc'
+    a multiple of ``randomizations``. Without it the batch is plain Monte
+    Carlo as above.
+    """
+    if n_replications < 1:
+        raise ValueError("n_replications must be at least 1")
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, n_replications))
+
+    plan = _replication_plan(n_replications, random_seed, variance_reduction, randomizations)
+    run_kwargs = {
+        'clinic_config': clinic_config,
+        'service_time_config': service_time_config,
+        'simulation_duration': simulation_duration,
+        'arrival_rate': arrival_rate,
+        'engine': engine
+    }
+    kpi_rows, stats = _run_plan(plan, 0, run_kwargs, max_workers, progress_callback, cancel_event)
+
+    logger.info(f"Completed {n_replications} replications on {max_workers} worker(s)")
+
+    return _batch_results(kpi_rows, stats, confidence, variance_reduction, simulation_duration / arrival_rate)
+
+def _batch_results(kpi_rows: List[Dict[str, float]], stats: List[JourneyStats], confidence: float,
+                   variance_reduction: Optional[str], control_mean: float) -> Dict[str, Any]:
+    """run_replications' result for the given replications.
+
+    ``control_mean`` is the expected number of arrivals in the horizon of
+    the Poisson arrival process (horizon / mean inter-arrival time).
+    """
+    replications = pd.DataFrame(kpi_rows).set_index('replication')
+    return {
+        'replications': replications,
+        'summary': summarize_replications(replications, confidence, variance_reduction, control_mean),
+        'variance_reduction': variance_reduction,
+        'pooled_stats': JourneyStats.merged(stats),
+        'n_replications': len(replications),
+        'confidence': confidence
+    }
+
+def sequential_bounds(variance_reduction: Optional[str] = None) -> Tuple[int, int]:
+    """(step, minimum) replication counts for run_sequential_replications.
+
+    Antithetic batches grow by whole pairs, and a control-variate fit needs
+    at least three replications (two otherwise) for a confidence interval.
+    """
+    if variance_reduction == 'rqmc':
+        raise ValueError("Sequential replications do not support 'rqmc'; lattices have a fixed size")
+    if variance_reduction not in (None, *VARIANCE_REDUCTION_MODES):
+        raise ValueError(f"Unknown variance reduction {variance_reduction!r}; "
+                         f"expected one of {VARIANCE_REDUCTION_MODES}")
+    step = 2 if variance_reduction == 'antithetic' else 1
+    minimum = 3 if variance_reduction == 'control' else 2
+    return step, minimum * step
+
+def run_sequential_replications(targets: Optional[Dict[str, float]] = None,
+                                relative: bool = True,
+                                clinic_config: Dict[str, Any] = None,
+                                service_time_config: Dict[str, Dict[str, float]] = None,
+                                simulation_duration: float = 120,
+                                arrival_rate: float = 5.0,
+                                random_seed: int = 42,
+                                initial_replications: int = 10,
+                                max_replications: int = 200,
+                                max_workers: Optional[int] = None,
+                                confidence: float = 0.95,
+                                engine: str = 'simpy',
+                                progress_callback: Optional[Callable[[int, int], None]] = None,
+                                cancel_event=None,
+                                variance_reduction: Optional[str] = None) -> Dict[str, Any]:
+    """Add replication batches until every KPI in ``targets`` is precise enough.
+
+    ``targets`` maps KPI names to the confidence half-width wanted, as a
+    fraction of the KPI's mean with ``relative`` or in KPI units without
+    (default DEFAULT_PRECISION_TARGETS: 5% for mean wait, p90 total time
+    and throughput). After ``initial_replications``, each batch is sized
+    from the usual n * (half-width / target)^2 estimate of the replications
+    still needed, rounded up to a multiple of the worker count so the pool
+    stays busy, and nothing more runs once every target is met or
+    ``max_replications`` is reached.
+
+    Replication i has the same seed as in run_replications, so stopping at
+    n replications gives exactly run_replications(n)'s batch. Antithetic
+    and control-variate modes are supported ('rqmc' lattices have a fixed
+    size). ``max_replications`` is rounded down to whole antithetic pairs
+    and raised to sequential_bounds' minimum. ``progress_callback(completed,
+    max_replications)`` is called as replications finish.
+
+    Returns run_replications' result plus ``targets``, ``relative``,
+    ``converged`` and ``history`` (half-widths after every batch).
+    """
+    targets = dict(DEFAULT_PRECISION_TARGETS if targets is None else targets)
+    unknown = set(targets) - set(KPI_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown KPIs in targets: {sorted(unknown)}")
+    if max_replications < initial_replications:
+        raise ValueError(f"max_replications must be at least initial_replications ({initial_replications})")
+    # Counts in whole steps and at least the minimum, so every batch plans cleanly
+    step, minimum = sequential_bounds(variance_reduction)
+    max_replications = max(max_replications // step * step, minimum)
+    initial_replications = min(-(-max(initial_replications, minimum) // step) * step, max_replications)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, max_replications))
+
+    run_kwargs = {
+        'clinic_config': clinic_config,
+        'service_time_config': service_time_config,
+        'simulation_duration': simulation_duration,
+        'arrival_rate': arrival_rate,
+        'engine': engine
+    }
+    control_mean = simulation_duration / arrival_rate
+    kpi_rows: List[Dict[str, float]] = []
+    stats: List[JourneyStats] = []
+    history = []
+    batch = initial_replications
+
+    while True:
+        start = len(kpi_rows)
+        batch = min(batch, max_replications - start)
+        plan = _replication_plan(batch, random_seed, variance_reduction, DEFAULT_RQMC_RANDOMIZATIONS, start)
+        rows, batch_stats = _run_plan(
+            plan, start, run_kwargs, max_workers,
+            None if progress_callback is None else lambda done, _: progress_callback(start + done, max_replications),
+            cancel_event
+        )
+        kpi_rows.extend(rows)
+        stats.extend(batch_stats)
+
+        n = len(kpi_rows)
+        summary = _batch_results(kpi_rows, stats, confidence, variance_reduction, control_mean)['summary']
+        half_widths = summary.loc[list(targets), 'half_width']
+        wanted = pd.Series({name: target * abs(summary.loc[name, 'mean']) if relative else target
+                            for name, target in targets.items()})
+        history.append({'replications': n, **half_widths.to_dict()})
+        # NaN half-widths (too few runs) count as not met
+        met = bool((half_widths <= wanted).all())
+        if met or n >= max_replications:
+            break
+
+        ratios = (half_widths / wanted).replace([np.inf], np.nan)
+        if ratios.notna().any():
+            needed = math.ceil(n * float(ratios.max()) ** 2)
+        else:
+            needed = 2 * n
+        batch = max(needed - n, max_workers, step)
+        # Whole rounds of the pool, and whole antithetic pairs
+        block = math.lcm(max_workers, step)
+        batch = -(-batch // block) * block
+
+    logger.info(f"Sequential replications stopped at {n} ({'targets met' if met else 'cap reached'})")
+
+    return {
+        **_batch_results(kpi_rows, stats, confidence, variance_reduction, control_mean),
+        'targets': targets,
+        'relative': relative,
+        'converged': met,
+        'history': pd.DataFrame(history).set_index('replications')
+    }
+
+def compare_scenarios(clinic_config_a: Dict[str, Any],
+                      clinic_config_b: Dict[str, Any],
+                      n_replications: int = 10,
+                      service_time_config: Dict[str, Dict[str, float]] = None,
+                      simulation_duration: float = 120,
+                      arrival_rate: float = 5.0,
+                      random_seed: int = 42,
+                      max_workers: Optional[int] = None,
+                      confidence: float = 0.95,
+                      engine: str = 'simpy',
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      cancel_event=None) -> Dict[str, Any]:
+    """Paired comparison of two clinic configurations under common random numbers.
+
+    Replication i of both scenarios uses the same child seed. Arrivals are
+    paired by patient (patient k arrives at the same time in both) and
+    service draws by service order (the k-th nurse visit started lasts the
+    same in both, see input_streams), so the KPI differences are paired. The ``difference`` table gives, per KPI, the
+    mean of B - A with its confidence interval, and ``variance_reduction``:
+    (var A + var B) / var(B - A), i.e. roughly how many times more
+    replications independent runs would need for the same precision.
+    """
+    if n_replications < 1:
+        raise ValueError("n_replications must be at least 1")
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, 2 * n_replications))
+
+    seeds = child_seeds(np.random.SeedSequence(random_seed), n_replications)
+    common = {
+        'service_time_config': service_time_config,
+        'simulation_duration': simulation_duration,
+        'arrival_rate': arrival_rate,
+        'engine': engine
+    }
+    tasks = [
+        (i, {**common, 'clinic_config': clinic_config, 'random_seed': seeds[i]})
+        for clinic_config in (clinic_config_a, clinic_config_b)
+        for i in range(n_replications)
+    ]
+
+    outputs = parallel_map(_run_replication, tasks, max_workers, progress_callback, cancel_event,
+                           label='Scenario comparison')
+    runs_a = pd.DataFrame([kpis for kpis, _ in outputs[:n_replications]]).set_index('replication')
+    runs_b = pd.DataFrame([kpis for kpis, _ in outputs[n_replications:]]).set_index('replication')
+
+    rows = []
+    for name in KPI_NAMES:
+        a, b = runs_a[name].to_numpy(), runs_b[name].to_numpy()
+        difference, half_width = confidence_interval(b - a, confidence)
+        paired_variance = float((b - a).var(ddof=1)) if n_replications > 1 else float('nan')
+        independent_variance = (float(a.var(ddof=1) + b.var(ddof=1)) if n_replications > 1
+                                else float('nan'))
+        rows.append({
+            'kpi': name,
+            'mean_a': float(a.mean()),
+            'mean_b': float(b.mean()),
+            'difference': difference,
+            'half_width': half_width,
+            'ci_lower': difference - half_width,
+            'ci_upper': difference + half_width,
+            'variance_reduction': (independent_variance / paired_variance if paired_variance > 0
+                                   else float('nan'))
+        })
+
+    return {
+        'replications_a': runs_a,
+        'replications_b': runs_b,
+        'difference': pd.DataFrame(rows).set_index('kpi'),
+        'n_replications': n_replications,
+        'confidence': confidence
+    }
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    batch = run_replications(n_replications=20, simulation_duration=480)
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"REPLICATION SUMMARY ({batch['n_replications']} runs, {elapsed:.2f}s)")
+    print("=" * 60)
+    print(batch['summary'].round(2).to_string())
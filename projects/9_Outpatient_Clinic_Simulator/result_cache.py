@@ -0,0 +1,225 @@
+"""Result Cache - Outpatient Clinic Simulation
+
+On-disk cache of simulation results shared by every app process that points
+at the same directory (e.g. a volume mounted into each replica).
+
+- Keys are SHA-256 hashes of a canonical JSON encoding of everything that
+  determines a run: clinic config, service-time config, seed, horizon,
+  arrival rate, engine and MODEL_VERSION. Equal settings hash equal however
+  they were built (key order, 3 vs 3.0, numpy scalars).
+- Entries are pickles written to a temporary file and moved into place with
+  os.replace, so readers in other processes see either the whole entry or
+  none of it. A reader that loses a race with eviction just gets a miss.
+- Entries older than ``ttl_seconds`` are misses and are removed; after each
+  write the least recently used entries are removed until the directory is
+  under ``max_bytes``. A hit refreshes the entry's modification time.
+
+Only point the cache at a directory the app controls: entries are pickles.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from realistic_patient_journey import MODEL_VERSION
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'results')
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# Environment overrides used by ResultCache.from_environment
+CACHE_DIR_ENV = 'CLINIC_RESULT_CACHE_DIR'
+MAX_MB_ENV = 'CLINIC_RESULT_CACHE_MAX_MB'
+TTL_HOURS_ENV = 'CLINIC_RESULT_CACHE_TTL_HOURS'
+
+ENTRY_SUFFIX = '.pkl'
+TEMP_SUFFIX = '.tmp'
+
+def _canonical(value):
+    """JSON-ready form of a key part in which equal settings compare equal."""
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        # 3, 3.0 and np.float64(3) are the same setting; -0.0 is 0.0
+        return float(value) + 0.0
+    if value is None or isinstance(value, str):
+        return value
+    raise TypeError(f"Cannot build a cache key from {type(value).__name__}")
+
+def cache_key(**parts) -> str:
+    """SHA-256 of the canonical JSON encoding of ``parts`` plus MODEL_VERSION."""
+    payload = json.dumps(_canonical({**parts, 'model_version': MODEL_VERSION}),
+                         sort_keys=True, separators=(',', ':'), allow_nan=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def simulation_key(clinic_config: Dict[str, Any], service_time_config: Dict[str, Dict[str, float]],
+                   random_seed: int, simulation_duration: float, arrival_rate: float,
+                   engine: str = 'simpy', **extra) -> str:
+    """Cache key for run_realistic_simulation (``extra`` for other run kinds)."""
+    return cache_key(clinic_config=clinic_config, service_time_config=service_time_config,
+                     random_seed=random_seed, simulation_duration=simulation_duration,
+                     arrival_rate=arrival_rate, engine=engine, **extra)
+
+class ResultCache:
+    """Directory of pickled results with TTL and total-size eviction."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_environment(cls) -> 'ResultCache':
+        """Cache configured by CLINIC_RESULT_CACHE_DIR / _MAX_MB / _TTL_HOURS."""
+        return cls(
+            directory=os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR),
+            max_bytes=int(float(os.environ.get(MAX_MB_ENV, DEFAULT_MAX_BYTES / 1024 ** 2)) * 1024 ** 2),
+            ttl_seconds=float(os.environ.get(TTL_HOURS_ENV, DEFAULT_TTL_SECONDS / 3600)) * 3600
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value for ``key``, or None on a miss."""
+        path = self._path(key)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.ttl_seconds:
+                self._remove(path)
+                self._count('misses')
+                return None
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            # Unreadable or written by an incompatible version of the code
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self._remove(path)
+            self._count('misses')
+            return None
+        if entry.get('key') != key:
+            self._count('misses')
+            return None
+        try:
+            os.utime(path)  # Most recently used
+        except OSError:
+            pass
+        self._count('hits')
+        return entry['value']
+
+    def put(self, key: str, value: Any) -> bool:
+        """Store ``value`` atomically, then evict down to the size limit.
+
+        A failed write (disk full, read-only volume) is logged and skipped;
+        the cache is an optimization, so it never fails the run.
+        """
+        entry = {'key': key, 'created': time.time(), 'model_version': MODEL_VERSION, 'value': value}
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=key[:16] + '-', suffix=TEMP_SUFFIX)
+            os.fchmod(fd, 0o644)  # mkstemp creates 0600; replicas may run as other users
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {key}: {e}")
+            if temp_path is not None:
+                self._remove(temp_path)
+            return False
+        self._count('writes')
+        self.evict()
+        return True
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _entries(self):
+        """(path, size, mtime) of every entry; temp files of crashed writers are removed."""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(TEMP_SUFFIX):
+                if now - stat.st_mtime > 3600:
+                    self._remove(path)
+            elif name.endswith(ENTRY_SUFFIX):
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self) -> int:
+        """Remove expired entries, then least recently used ones over max_bytes."""
+        now = time.time()
+        removed = 0
+        live = []
+        for path, size, mtime in self._entries():
+            if now - mtime > self.ttl_seconds:
+                removed += self._remove(path)
+            else:
+                live.append((mtime, size, path))
+        total = sum(size for _, size, _ in live)
+        for mtime, size, path in sorted(live):
+            if total <= self.max_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+        if removed:
+            self._count('evictions', removed)
+        return removed
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            self._remove(path)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def __len__(self):
+        return len(self._entries())
+
+    def stats(self) -> Dict[str, float]:
+        entries = self._entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses,
+                'writes': self.writes, 'evictions': self.evictions}
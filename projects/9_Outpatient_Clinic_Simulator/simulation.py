@@ -4,21 +4,90 @@ Defines clinic resources and patient flow management.
 """
 
 import simpy
-import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from tracing import TraceSink
+from input_streams import ClinicInputs, DEFAULT_SERVICE_TIME_CONFIG
+
 logger = logging.getLogger(__name__)
 
+class MonitoredResource(simpy.Resource):
+    """SimPy Resource that keeps exact time-weighted usage statistics.
+    
+    Busy servers and queue length only change when a request or release is
+    made (grants from the queue happen at the same simulated instant), so
+    integrating both at those calls gives exact time averages in O(1) per
+    call with no sampling.
+    """
+    
+    def __init__(self, env: simpy.Environment, capacity: int = 1):
+        super().__init__(env, capacity)
+        self.start_time = env.now
+        self._last_time = env.now
+        self.busy_area = 0.0   # integral of busy servers over time
+        self.queue_area = 0.0  # integral of queue length over time
+        self.max_in_use = 0
+        self.max_queue_length = 0
+    
+    def _accumulate(self):
+        """Add the current state's contribution up to now."""
+        now = self._env.now
+        elapsed = now - self._last_time
+        if elapsed > 0:
+            self.busy_area += len(self.users) * elapsed
+            self.queue_area += len(self.queue) * elapsed
+            self._last_time = now
+    
+    def request(self) -> simpy.resources.resource.Request:
+        self._accumulate()
+        req = super().request()
+        if len(self.users) > self.max_in_use:
+            self.max_in_use = len(self.users)
+        if len(self.queue) > self.max_queue_length:
+            self.max_queue_length = len(self.queue)
+        return req
+    
+    def release(self, request: simpy.resources.resource.Request) -> simpy.resources.resource.Release:
+        self._accumulate()
+        return super().release(request)
+    
+    def get_statistics(self) -> Dict[str, float]:
+        """Time-weighted statistics from the start of the run until now."""
+        self._accumulate()
+        elapsed = self._env.now - self.start_time
+        if elapsed <= 0:
+            return {'utilization': 0.0, 'avg_in_use': 0.0, 'avg_queue_length': 0.0,
+                    'max_utilization': 0.0, 'max_queue_length': 0, 'busy_time': 0.0}
+        return {
+            'utilization': self.busy_area / (self.capacity * elapsed),
+            'avg_in_use': self.busy_area / elapsed,
+            'avg_queue_length': self.queue_area / elapsed,
+            'max_utilization': self.max_in_use / self.capacity,
+            'max_queue_length': self.max_queue_length,
+            'busy_time': self.busy_area
+        }
+
 class ClinicModel:
     """Outpatient clinic simulation model with configurable resources."""
     
-    def __init__(self, env: simpy.Environment, config: Dict[str, Any]):
-        """Initialize clinic model with resources."""
+    def __init__(self, env: simpy.Environment, config: Dict[str, Any],
+                 trace_sink: Optional[TraceSink] = None,
+                 inputs: Optional[ClinicInputs] = None):
+        """Initialize clinic model with resources.
+        
+        ``inputs`` holds the buffered arrival and service-time streams
+        patient processes draw from; it defaults to ones seeded from
+        RANDOM_SEED.
+        ``trace_sink`` receives patient events; None disables tracing.
+        """
         self.env = env
         self.config = config
+        self.inputs = inputs if inputs is not None else ClinicInputs(
+            config.get('RANDOM_SEED'), 5.0, DEFAULT_SERVICE_TIME_CONFIG
+        )
+        self.trace_sink = trace_sink
         
         self._initialize_resources()
         
@@ -31,27 +100,27 @@ class ClinicModel:
     def _initialize_resources(self):
         """Initialize clinic resources."""
         
-        self.doctors = simpy.Resource(
+        self.doctors = MonitoredResource(
             self.env, 
             capacity=self.config.get('NUM_DOCTORS', 3)
         )
         
-        self.nurses = simpy.Resource(
+        self.nurses = MonitoredResource(
             self.env,
             capacity=self.config.get('NUM_NURSES', 2)
         )
         
-        self.registration_staff = simpy.Resource(
+        self.registration_staff = MonitoredResource(
             self.env,
             capacity=self.config.get('NUM_REGISTRATION_STAFF', 1)
         )
         
-        self.lab_technicians = simpy.Resource(
+        self.lab_technicians = MonitoredResource(
             self.env,
             capacity=self.config.get('NUM_LAB_TECHNICIANS', 1)
         )
         
-        self.exam_rooms = simpy.Resource(
+        self.exam_rooms = MonitoredResource(
             self.env,
             capacity=self.config.get('NUM_EXAM_ROOMS', 4)
         )
@@ -62,12 +131,12 @@ class ClinicModel:
             init=self.config.get('WAITING_ROOM_CAPACITY', 50)
         )
         
-        self.lab_equipment = simpy.Resource(
+        self.lab_equipment = MonitoredResource(
             self.env,
             capacity=self.config.get('NUM_LAB_EQUIPMENT', 2)
         )
         
-        self.pharmacy_counter = simpy.Resource(
+        self.pharmacy_counter = MonitoredResource(
             self.env,
             capacity=self.config.get('NUM_PHARMACY_COUNTERS', 1)
         )
@@ -86,7 +155,6 @@ class ClinicModel:
         """Initialize data collection."""
         self.patient_log = []
         self.resource_utilization_log = []
-        self.event_log = []
         
         self.resource_utilization = {
             'doctors': [],
@@ -105,11 +173,9 @@ class ClinicModel:
         self.patients_balked = 0
         self.patients_in_system = 0
     
-    def get_resource_status(self) -> Dict[str, Dict[str, Any]]:
-        """Get current status of all resources."""
-        status = {}
-        
-        resources = {
+    def _resources(self) -> Dict[str, MonitoredResource]:
+        """Clinic resources by name."""
+        return {
             'doctors': self.doctors,
             'nurses': self.nurses,
             'registration_staff': self.registration_staff,
@@ -118,8 +184,12 @@ class ClinicModel:
             'lab_equipment': self.lab_equipment,
             'pharmacy_counter': self.pharmacy_counter
         }
+    
+    def get_resource_status(self) -> Dict[str, Dict[str, Any]]:
+        """Get current status of all resources."""
+        status = {}
         
-        for name, resource in resources.items():
+        for name, resource in self._resources().items():
             status[name] = {
                 'capacity': resource.capacity,
                 'in_use': len(resource.users),
@@ -137,15 +207,11 @@ class ClinicModel:
         
         return status
     
-    def log_event(self, event_type: str, patient_id: str, details: Dict[str, Any]):
-        """Log simulation events."""
-        event = {
-            'timestamp': self.env.now,
-            'event_type': event_type,
-            'patient_id': patient_id,
-            'details': details
-        }
-        self.event_log.append(event)
+    def log_event(self, event_type: str, patient_index: int, room_id: int = -1,
+                  duration: float = float('nan')):
+        """Forward a simulation event to the trace sink, if one is attached."""
+        if self.trace_sink is not None:
+            self.trace_sink(self.env.now, event_type, patient_index, room_id, duration)
     
     def log_resource_utilization(self):
         """Log resource utilization."""
@@ -189,22 +255,28 @@ class ClinicModel:
             'current_time': self.env.now
         }
         
-        # Add utilization stats
+        # Add exact time-weighted utilization stats
         resource_stats = {}
-        for resource_name, utilization_data in self.resource_utilization.items():
-            if utilization_data:
-                resource_stats[f'{resource_name}_avg_utilization'] = np.mean([u['utilization'] for u in utilization_data])
-                resource_stats[f'{resource_name}_max_utilization'] = np.max([u['utilization'] for u in utilization_data])
+        for resource_name, resource_data in self.get_resource_statistics().items():
+            resource_stats[f'{resource_name}_avg_utilization'] = resource_data['utilization']
+            resource_stats[f'{resource_name}_max_utilization'] = resource_data['max_utilization']
+            resource_stats[f'{resource_name}_avg_queue_length'] = resource_data['avg_queue_length']
         
         stats.update(resource_stats)
         
         return stats
+    
+    def get_resource_statistics(self) -> Dict[str, Dict[str, float]]:
+        """Get time-weighted utilization and queue statistics per resource."""
+        return {name: resource.get_statistics() for name, resource in self._resources().items()}
 
-def create_clinic_simulation(config: Dict[str, Any]) -> tuple[simpy.Environment, ClinicModel]:
+def create_clinic_simulation(config: Dict[str, Any],
+                             trace_sink: Optional[TraceSink] = None,
+                             inputs: Optional[ClinicInputs] = None) -> tuple[simpy.Environment, ClinicModel]:
     """Create a clinic simulation environment."""
     env = simpy.Environment()
     
-    clinic = ClinicModel(env, config)
+    clinic = ClinicModel(env, config, trace_sink=trace_sink, inputs=inputs)
     
     logger.info("Clinic simulation environment created successfully")
     
@@ -229,6 +301,8 @@ DEFAULT_CLINIC_CONFIG = {
 
 def main():
     """Demonstrate clinic model setup."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
     print("=" * 60)
     print("OUTPATIENT CLINIC SIMULATION - STEP 1.2")
     print("Clinic Model and Resources Definition")
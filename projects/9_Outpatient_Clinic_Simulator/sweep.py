@@ -0,0 +1,169 @@
+"""Staffing Sweep - Outpatient Clinic Simulation
+
+Evaluates every combination of doctors, nurses, exam rooms and registration
+staff on a grid, with several replications per cell, across a process pool.
+
+Common random numbers: replication r of every cell uses the same child seed
+(the r-th spawned from ``SeedSequence(random_seed)``, as in
+run_replications), so all cells see the same arrival and service-time
+streams. Differences between cells then come from staffing rather than from
+sampling noise, which makes neighbouring cells directly comparable with few
+replications.
+
+With ``skip_hopeless``, cells the queueing approximation shows overloaded
+(see queueing.is_hopeless) are not simulated; they are listed in the
+result's ``skipped`` and left out of the summary.
+"""
+
+import itertools
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from queueing import estimate_clinic, is_hopeless
+from realistic_patient_journey import run_realistic_simulation
+from replications import KPI_NAMES, replication_kpis, confidence_interval, parallel_map
+
+logger = logging.getLogger(__name__)
+
+# Clinic config keys a sweep can vary
+STAFFING_FACTORS = ['NUM_DOCTORS', 'NUM_NURSES', 'NUM_EXAM_ROOMS', 'NUM_REGISTRATION_STAFF']
+
+def staffing_grid(grid: Dict[str, Sequence[int]]) -> List[Dict[str, int]]:
+    """Every combination of the factor values in ``grid``, in STAFFING_FACTORS order."""
+    unknown = set(grid) - set(STAFFING_FACTORS)
+    if unknown:
+        raise ValueError(f"Unknown staffing factors: {sorted(unknown)}")
+    factors = [factor for factor in STAFFING_FACTORS if factor in grid]
+    return [dict(zip(factors, values))
+            for values in itertools.product(*(sorted(set(int(v) for v in grid[f])) for f in factors))]
+
+def _run_cell(task: Tuple[Dict[str, int], Dict[str, Any], List[np.random.SeedSequence]]) -> List[Dict[str, float]]:
+    """Run every replication of one grid cell (executed in a worker)."""
+    cell, kwargs, seeds = task
+    rows = []
+    for replication, seed in enumerate(seeds):
+        results = run_realistic_simulation(**kwargs, random_seed=seed, journey_table=False)
+        rows.append({**cell, 'replication': replication, **replication_kpis(results)})
+    return rows
+
+def summarize_sweep(runs: pd.DataFrame, confidence: float = 0.95) -> pd.DataFrame:
+    """Per-cell mean and confidence half-width (``<kpi>_hw``) of every KPI."""
+    factors = [factor for factor in STAFFING_FACTORS if factor in runs.columns]
+    rows = []
+    for cell, group in runs.groupby(factors, sort=True):
+        row = dict(zip(factors, cell if isinstance(cell, tuple) else (cell,)))
+        for name in KPI_NAMES:
+            row[name], row[f"{name}_hw"] = confidence_interval(group[name].to_numpy(), confidence)
+        rows.append(row)
+    return pd.DataFrame(rows).set_index(factors)
+
+def run_staffing_sweep(grid: Dict[str, Sequence[int]],
+                       n_replications: int = 5,
+                       clinic_config: Dict[str, Any] = None,
+                       service_time_config: Dict[str, Dict[str, float]] = None,
+                       simulation_duration: float = 480,
+                       arrival_rate: float = 5.0,
+                       random_seed: int = 42,
+                       engine: str = 'heap',
+                       max_workers: Optional[int] = None,
+                       confidence: float = 0.95,
+                       progress_callback: Optional[Callable[[int, int], None]] = None,
+                       cancel_event=None,
+                       skip_hopeless: bool = False) -> Dict[str, Any]:
+    """Run ``n_replications`` of every staffing cell in ``grid``.
+
+    ``grid`` maps STAFFING_FACTORS keys to the values to try; factors left
+    out keep their ``clinic_config`` value. Each cell is one pool task, so
+    progress is reported per finished cell.
+
+    Returns per-replication KPIs (``runs``), the per-cell ``summary``, the
+    grid itself and the ``skipped`` cells (each with the bottleneck
+    ``load``).
+    """
+    if n_replications < 1:
+        raise ValueError("n_replications must be at least 1")
+    cells = staffing_grid(grid)
+    if not cells:
+        raise ValueError("The staffing grid is empty")
+
+    if clinic_config is None:
+        from simulation import DEFAULT_CLINIC_CONFIG
+        clinic_config = DEFAULT_CLINIC_CONFIG
+
+    skipped = []
+    if skip_hopeless:
+        simulated = []
+        for cell in cells:
+            estimate = estimate_clinic({**clinic_config, **cell}, service_time_config, arrival_rate,
+                                       simulation_duration)
+            if is_hopeless(estimate):
+                skipped.append({**cell, 'load': estimate['load']})
+            else:
+                simulated.append(cell)
+        if not simulated:
+            raise ValueError("Every staffing cell in the grid is overloaded")
+        cells = simulated
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(cells)))
+
+    # The same seeds in every cell: common random numbers across the grid
+    seeds = np.random.SeedSequence(random_seed).spawn(n_replications)
+    tasks = [
+        (cell, {
+            'clinic_config': {**clinic_config, **cell},
+            'service_time_config': service_time_config,
+            'simulation_duration': simulation_duration,
+            'arrival_rate': arrival_rate,
+            'engine': engine
+        }, seeds)
+        for cell in cells
+    ]
+
+    outputs = parallel_map(_run_cell, tasks, max_workers, progress_callback, cancel_event, label='Sweep')
+    runs = pd.DataFrame([row for rows in outputs for row in rows])
+
+    logger.info(f"Swept {len(cells)} staffing cells x {n_replications} replications on {max_workers} worker(s)"
+                f" ({len(skipped)} overloaded cells skipped)")
+
+    return {
+        'runs': runs,
+        'summary': summarize_sweep(runs, confidence),
+        'grid': {factor: sorted(set(int(v) for v in values)) for factor, values in grid.items()},
+        'skipped': skipped,
+        'n_replications': n_replications,
+        'confidence': confidence
+    }
+
+def heatmap_table(summary: pd.DataFrame, kpi: str, x: str, y: str,
+                  fixed: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    """``kpi`` over the ``y`` x ``x`` grid (rows y, columns x).
+
+    Other swept factors are held at their ``fixed`` value, or averaged over
+    when not given.
+    """
+    table = summary[[kpi]].reset_index()
+    for factor, value in (fixed or {}).items():
+        if factor not in (x, y) and factor in table.columns:
+            table = table[table[factor] == value]
+    return table.pivot_table(index=y, columns=x, values=kpi, aggfunc='mean').sort_index(ascending=False)
+
+if __name__ == "__main__":
+    import time
+
+    grid = {'NUM_DOCTORS': range(2, 6), 'NUM_NURSES': range(1, 5), 'NUM_EXAM_ROOMS': range(3, 9),
+            'NUM_REGISTRATION_STAFF': [1, 2]}
+    start = time.perf_counter()
+    sweep = run_staffing_sweep(grid, n_replications=5, simulation_duration=480, arrival_rate=3.0)
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"STAFFING SWEEP ({len(sweep['summary'])} cells x {sweep['n_replications']} runs, {elapsed:.2f}s)")
+    print("=" * 60)
+    print(heatmap_table(sweep['summary'], 'avg_wait_time', 'NUM_DOCTORS', 'NUM_NURSES',
+                        {'NUM_EXAM_ROOMS': 6, 'NUM_REGISTRATION_STAFF': 1}).round(1).to_string())
@@ -0,0 +1,212 @@
+"""Event Tracing - Outpatient Clinic Simulation
+
+Structured trace sinks for patient flow events.
+
+A trace sink is any callable ``sink(time, event_type, patient_index, room_id,
+duration)``. Patient processes only call it when a sink is attached, so a run
+without a sink does no per-event formatting or I/O at all.
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# sink(time, event_type, patient_index, room_id, duration)
+TraceSink = Callable[[float, str, int, int, float], None]
+
+# Event types emitted by the patient process, in pathway order
+EVENT_TYPES = [
+    'arrival',
+    'registration_start',
+    'registration_complete',
+    'exam_room_wait',
+    'exam_room_assigned',
+    'nurse_visit_start',
+    'nurse_visit_complete',
+    'doctor_visit_start',
+    'doctor_visit_complete',
+    'discharge'
+]
+
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+EVENT_TYPE_DTYPE = pd.CategoricalDtype(EVENT_TYPES)
+
+# Message templates used by LoggingTraceSink (%-style, formatted lazily)
+_MESSAGES = {
+    'arrival': "%s arrives and sits in waiting room at time %.2f",
+    'registration_start': "Registration nurse visits %s in waiting room at time %.2f",
+    'registration_complete': "Registration complete for %s at time %.2f",
+    'exam_room_wait': "%s waits for exam room at time %.2f",
+    'exam_room_assigned': "%s moves to exam room at time %.2f",
+    'nurse_visit_start': "Nurse visits %s at time %.2f",
+    'nurse_visit_complete': "Nurse completes visit with %s at time %.2f",
+    'doctor_visit_start': "Doctor visits %s at time %.2f",
+    'doctor_visit_complete': "Doctor completes visit with %s at time %.2f",
+    'discharge': "%s discharged at time %.2f"
+}
+
+PATIENT_LABEL_FORMAT = "Patient_%03d"
+
+def patient_label(patient_index: int) -> str:
+    """Display id for a patient index (matches journey patient_id)."""
+    return PATIENT_LABEL_FORMAT % patient_index
+
+# Labels formatted so far, by patient index; shared by all runs and only
+# ever replaced by a longer copy, so concurrent readers stay safe
+_labels = np.empty(0, dtype=object)
+
+def patient_labels(patient_indices) -> np.ndarray:
+    """patient_label of every index in an array, as an object array."""
+    global _labels
+    patient_indices = np.asarray(patient_indices)
+    labels = _labels
+    needed = int(patient_indices.max()) + 1 if len(patient_indices) else 0
+    if needed > len(labels):
+        size = max(needed, 2 * len(labels))
+        labels = np.concatenate([labels, np.array([PATIENT_LABEL_FORMAT % i for i in range(len(labels), size)],
+                                                  dtype=object)])
+        _labels = labels
+    return labels[patient_indices]
+
+class LoggingTraceSink:
+    """Trace sink that writes human-readable lines to a logger."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger('realistic_patient_journey')
+        self.level = level
+
+    def __call__(self, time: float, event_type: str, patient_index: int,
+                 room_id: int = -1, duration: float = float('nan')):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        message = _MESSAGES.get(event_type, event_type + " for %s at time %.2f")
+        args = [patient_label(patient_index), time]
+        if room_id >= 0:
+            message += " (room %d)"
+            args.append(room_id)
+        if duration == duration:  # not NaN
+            message += " (took %.2f min)"
+            args.append(duration)
+        self.logger.log(self.level, message, *args)
+
+class EventListSink:
+    """Trace sink that keeps every event as a record in memory."""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+
+    def __call__(self, time: float, event_type: str, patient_index: int,
+                 room_id: int = -1, duration: float = float('nan')):
+        self.records.append({
+            'timestamp': time,
+            'event_type': event_type,
+            'patient_id': patient_label(patient_index),
+            'room_id': room_id,
+            'duration': duration
+        })
+
+    def __len__(self):
+        return len(self.records)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Return the recorded events as a DataFrame."""
+        return pd.DataFrame(self.records, columns=['timestamp', 'event_type', 'patient_id', 'room_id', 'duration'])
+
+class MultiSink:
+    """Trace sink that fans each event out to several sinks."""
+
+    def __init__(self, *sinks: TraceSink):
+        self.sinks = [sink for sink in sinks if sink is not None]
+
+    def __call__(self, time: float, event_type: str, patient_index: int,
+                 room_id: int = -1, duration: float = float('nan')):
+        for sink in self.sinks:
+            sink(time, event_type, patient_index, room_id, duration)
+
+class ColumnarEventLog:
+    """Array-backed event store with one typed column per field.
+
+    Columns are preallocated numpy arrays that double in size when full, so
+    recording an event writes five scalars instead of allocating a dict.
+    ``columns()``, ``to_dataframe()`` and ``to_arrow()`` return views of the
+    filled prefix without copying.
+    """
+
+    # Column name -> dtype
+    SCHEMA = {
+        'timestamp': np.float64,
+        'event_type': np.int8,
+        'patient_index': np.int32,
+        'room_id': np.int16,
+        'duration': np.float64
+    }
+
+    def __init__(self, capacity: int = 4096):
+        capacity = max(int(capacity), 16)
+        self._timestamp = np.empty(capacity, dtype=np.float64)
+        self._event_type = np.empty(capacity, dtype=np.int8)
+        self._patient_index = np.empty(capacity, dtype=np.int32)
+        self._room_id = np.empty(capacity, dtype=np.int16)
+        self._duration = np.empty(capacity, dtype=np.float64)
+        self._size = 0
+
+    def __call__(self, time: float, event_type: str, patient_index: int,
+                 room_id: int = -1, duration: float = float('nan')):
+        n = self._size
+        if n == len(self._timestamp):
+            self._grow()
+        self._timestamp[n] = time
+        self._event_type[n] = EVENT_CODES[event_type]
+        self._patient_index[n] = patient_index
+        self._room_id[n] = room_id
+        self._duration[n] = duration
+        self._size = n + 1
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._timestamp)
+
+    def _grow(self):
+        """Double every column, keeping recorded events."""
+        new_capacity = 2 * len(self._timestamp)
+        for name in self.SCHEMA:
+            old = getattr(self, '_' + name)
+            new = np.empty(new_capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, '_' + name, new)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Views of the recorded prefix of every column (no copy)."""
+        n = self._size
+        return {name: getattr(self, '_' + name)[:n] for name in self.SCHEMA}
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Export as a DataFrame backed by the column arrays.
+
+        ``event_type`` becomes a Categorical over EVENT_TYPES whose codes
+        are the stored int8 column.
+        """
+        columns = self.columns()
+        columns['event_type'] = pd.Categorical.from_codes(
+            columns['event_type'], dtype=EVENT_TYPE_DTYPE, validate=False
+        )
+        return pd.DataFrame(columns, copy=False)
+
+    def to_arrow(self):
+        """Export as a pyarrow Table (requires the optional pyarrow package)."""
+        try:
+            import pyarrow as pa
+        except ImportError as exc:
+            raise ImportError("ColumnarEventLog.to_arrow() requires pyarrow (pip install pyarrow)") from exc
+
+        columns = self.columns()
+        arrays = {name: pa.array(values) for name, values in columns.items() if name != 'event_type'}
+        arrays['event_type'] = pa.DictionaryArray.from_arrays(
+            pa.array(columns['event_type']), pa.array(EVENT_TYPES)
+        )
+        return pa.table({name: arrays[name] for name in self.SCHEMA})